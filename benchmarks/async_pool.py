@@ -0,0 +1,79 @@
+"""
+Compares collecting steps from n_envs MultiAgentOlympia environments stepped one after the other in the learner's
+process with the subprocess pool of make_async_pool, which returns observations through shared
+memory, both alone and with one replay of a RAM agent between sending the actions and collecting the step, the work
+an async pool can overlap with stepping when there are cores to spare.
+Run from the repository root with: python -m benchmarks.async_pool
+"""
+
+import os
+from functools import partial
+import gym
+from olympia.envs import OlympiaRAM
+from olympia.envs.multi_agent import MultiAgentOlympia, make_async_pool
+from olympia.envs.policy import fill_memory
+from benchmarks.timing import time_per_call
+
+LEVEL = 'two_v_two'
+SHAPE = (31, 21)
+
+
+def learner():
+    env = OlympiaRAM(shape=SHAPE, training_level=LEVEL, seed=0, memory_size=1000)
+    agent = env.get_agents()[0]
+    fill_memory(env, agent, 1000, seed=0)
+    agent.replay(32)
+    return agent
+
+
+class SequentialPool:
+    """The environments of a pool stepped one after the other, gym 0.26's SyncVectorEnv takes one reward per step."""
+
+    def __init__(self, env_fns):
+        self.envs = [env_fn() for env_fn in env_fns]
+        self.num_envs = len(self.envs)
+        self.action_space = gym.vector.utils.batch_space(self.envs[0].action_space, self.num_envs)
+        self._actions = None
+
+    def reset(self, seed=None):
+        return [env.reset(seed=None if seed is None else seed + i) for i, env in enumerate(self.envs)]
+
+    def step_async(self, actions):
+        self._actions = actions
+
+    def step_wait(self):
+        results = []
+        for env, actions in zip(self.envs, self._actions):
+            observation, rewards, terminated, truncated, info = env.step(actions)
+            if terminated or truncated:
+                observation, info = env.reset()
+            results.append((observation, rewards, terminated, truncated, info))
+        return results
+
+
+def steps_per_second(pool, number, agent=None):
+    pool.reset(seed=0)
+    actions = iter([pool.action_space.sample() for _ in range(number)])
+
+    def step():
+        pool.step_async(next(actions))
+        if agent is not None:
+            agent.replay(32)
+        pool.step_wait()
+    return pool.num_envs * 1e6 / time_per_call(step, number)
+
+
+if __name__ == "__main__":
+    agent = learner()
+    print('{} cores'.format(os.cpu_count()))
+    print('{:>7} {:>8} {:>14} {:>14} {:>20} {:>20}'.format(
+        'n_envs', 'obs', 'sync steps/s', 'async steps/s', 'sync+replay steps/s', 'async+replay steps/s'))
+    for n_envs in [2, 4, 8]:
+        for observation in ['coordinates', 'normalized']:
+            kwargs = dict(shape=SHAPE, training_level=LEVEL, max_episode_steps=200, observation=observation)
+            sync_pool = SequentialPool([partial(MultiAgentOlympia, 'RAM', **kwargs)] * n_envs)
+            async_pool = make_async_pool(n_envs, 'RAM', copy=False, **kwargs)
+            results = [steps_per_second(sync_pool, 2000), steps_per_second(async_pool, 2000),
+                       steps_per_second(sync_pool, 200, agent), steps_per_second(async_pool, 200, agent)]
+            async_pool.close()
+            print('{:>7} {:>8} {:>14.0f} {:>14.0f} {:>20.0f} {:>20.0f}'.format(n_envs, observation[:8], *results))
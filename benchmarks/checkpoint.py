@@ -0,0 +1,65 @@
+"""
+Measures how long saving blocks the training loop: the h5 weights file per agent Agent.save writes, a synchronous
+save_checkpoint of the whole run, and Checkpointer.save, which only copies the run before writing it in a background
+thread. Every agent has a full replay memory and its optimizer slots. Then reports how long Checkpointer.save
+stalls the training thread for replay memories of growing capacity: the first save copies the whole memory, the later
+ones only the slots written since the previous save.
+Run from the repository root with: python -m benchmarks.checkpoint
+"""
+
+import os
+import tempfile
+from olympia.envs import OlympiaRAM, OlympiaRGB
+from olympia.envs.checkpoint import Checkpointer, load_checkpoint, save_checkpoint
+from olympia.envs.policy import fill_memory
+from benchmarks.timing import time_per_call
+
+
+def filled_env(env_class, level, memory_size):
+    env = env_class(shape=(15, 9), training_level=level, seed=0, memory_size=memory_size)
+    for agent in env.get_agents():
+        fill_memory(env, agent, memory_size, seed=0)
+        agent.replay(32)  # creates the optimizer slots
+    return env
+
+
+def best_time(fn, repeats=5):
+    """Best time of repeats calls of fn, in milliseconds."""
+    return time_per_call(fn, 1, repeats) / 1e3
+
+
+if __name__ == "__main__":
+    print('{:>5} {:>12} {:>10} {:>10} {:>12} {:>12} {:>10}'.format(
+        'type', 'level', 'h5 ms', 'sync ms', 'async ms', 'load ms', 'size MB'))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for env_class in [OlympiaRAM, OlympiaRGB]:
+            for level in ['one_player', 'two_v_two']:
+                env = filled_env(env_class, level, 2000)
+                path = os.path.join(tmp_dir, 'run.ckpt')
+                h5 = best_time(lambda: [agent.save(0, os.path.join(tmp_dir, env.agent_type), level)
+                                        for agent in env.get_agents()])
+                sync = best_time(lambda: save_checkpoint(env, path))
+                checkpointer = Checkpointer(env, path)
+                for _ in range(5):
+                    checkpointer.save()
+                    checkpointer.wait()  # the write would otherwise overlap the next training steps
+                load = best_time(lambda: load_checkpoint(env, path))
+                print('{:>5} {:>12} {:>10.1f} {:>10.1f} {:>12.1f} {:>12.1f} {:>10.2f}'.format(
+                    env.agent_type, level, h5, sync, min(checkpointer.stall_times) * 1e3, load,
+                    os.path.getsize(path) / 1e6))
+
+        print()
+        print('{:>10} {:>10} {:>16} {:>22}'.format('capacity', 'memory MB', 'first stall ms', 'stall ms, 1000 steps'))
+        for capacity in [1000, 10000, 100000]:
+            env = filled_env(OlympiaRGB, 'one_player', capacity)
+            agent = env.get_agents()[0]
+            checkpointer = Checkpointer(env, os.path.join(tmp_dir, 'run.ckpt'))
+            checkpointer.save()
+            for seed in range(5):
+                fill_memory(env, agent, 1000, seed=seed)
+                checkpointer.wait()  # a slow disk would otherwise add the rest of the previous write to the stall
+                checkpointer.save()
+            checkpointer.wait()
+            print('{:>10} {:>10.1f} {:>16.1f} {:>22.1f}'.format(
+                capacity, agent.memory.nbytes / 1e6, checkpointer.stall_times[0] * 1e3,
+                min(checkpointer.stall_times[1:]) * 1e3))
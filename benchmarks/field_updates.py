@@ -0,0 +1,70 @@
+"""
+Compares the cost of a step of OlympiaRGB when only the cells that changed are redrawn and the observation is a
+view of the field, against rebuilding and copying the whole field on every step, for growing field sizes.
+Run from the repository root with: python -m benchmarks.field_updates
+"""
+
+import numpy as np
+from olympia.envs import OlympiaRGB, VectorOlympiaRGB
+from olympia.envs.cells import COLORS
+from benchmarks.timing import time_per_call
+
+
+class FullRedrawOlympiaRGB(OlympiaRGB):
+    """OlympiaRGB without incremental updates: the grid is rebuilt and the frame drawn from it on every step."""
+
+    def _add_to_field(self):
+        self.grid[...] = self._static_grid
+        self._last_player[...] = -1
+        self._dirty_cells = []
+        super(FullRedrawOlympiaRGB, self)._add_to_field()
+
+    def output(self, out=None):
+        return COLORS[self.grid][np.newaxis]
+
+
+class FullRedrawVectorOlympiaRGB(VectorOlympiaRGB):
+    def _add_to_field(self, envs):
+        self.grids[envs] = self._static_grid
+        self.fields[envs] = self._static_field
+        super(FullRedrawVectorOlympiaRGB, self)._add_to_field(envs)
+
+
+def step_time(env, steps, max_timesteps):
+    """Returns the mean time of a step in microseconds."""
+    actions = enumerate(np.random.default_rng(0).integers(0, 17, size=(steps, env.n_agents)))
+    env.reset()
+
+    def step():
+        t, step_actions = next(actions)
+        _, _, done, _ = env.step(*step_actions)
+        if done or (t + 1) % max_timesteps == 0:
+            env.reset()
+    return time_per_call(step, steps)
+
+
+def vector_step_time(env, steps):
+    actions = iter(np.random.default_rng(0).integers(0, 17, size=(steps, env.n_envs, env.n_agents)))
+    return time_per_call(lambda: env.step(next(actions)), steps)
+
+
+if __name__ == "__main__":
+    training_level = 'two_v_two'
+    steps = 2000
+    max_timesteps = 200
+    n_envs = 16
+    print('{:>10} {:>14} {:>14} {:>8} {:>16} {:>16} {:>8}'.format(
+        'shape', 'full us/st', 'incr. us/st', 'speedup', 'vec full us/st', 'vec incr. us/st', 'speedup'))
+    for shape in [(15, 9), (31, 21), (63, 45), (127, 91), (255, 255)]:
+        # the agents only need the shape of the field, the Keras models are not used here
+        full = step_time(FullRedrawOlympiaRGB(shape=shape, training_level=training_level, seed=0, memory_size=1),
+                         steps, max_timesteps)
+        incremental = step_time(OlympiaRGB(shape=shape, training_level=training_level, seed=0, memory_size=1),
+                                steps, max_timesteps)
+        vec_full = vector_step_time(FullRedrawVectorOlympiaRGB(n_envs, shape=shape, training_level=training_level,
+                                                               seeds=0, max_timesteps=max_timesteps), steps // 10)
+        vec_incremental = vector_step_time(VectorOlympiaRGB(n_envs, shape=shape, training_level=training_level,
+                                                            seeds=0, max_timesteps=max_timesteps), steps // 10)
+        print('{:>10} {:>14.1f} {:>14.1f} {:>7.1f}x {:>16.1f} {:>16.1f} {:>7.1f}x'.format(
+            '{}x{}'.format(*shape), full, incremental, full / incremental, vec_full, vec_incremental,
+            vec_full / vec_incremental))
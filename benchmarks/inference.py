@@ -0,0 +1,53 @@
+"""
+Compares the cost of acting, per environment step with epsilon 0 so that every action needs the network, for RAM
+agents evaluated by Keras predict, by a direct Keras call and by the NumPy backend, together with the cost of a
+replay of a 64 transition minibatch with the Keras and the NumPy backend.
+Run from the repository root with: python -m benchmarks.inference
+"""
+
+import numpy as np
+from olympia.envs import OlympiaRAM
+from olympia.envs.policy import fill_memory
+from olympia.envs.training_schemes import scheme
+from benchmarks.timing import time_per_call
+
+
+def act_time(agents, state, backend, repeats):
+    """Mean time in microseconds of choosing the actions of every agent for one state."""
+    for agent in agents:
+        agent.backend = backend
+
+    def choose(agent):
+        if backend == 'predict':
+            return np.argmax(agent.model.predict(state, verbose=0)[0])
+        return agent.choose_action(state)
+
+    [choose(agent) for agent in agents]  # warm up
+    return time_per_call(lambda: [choose(agent) for agent in agents], repeats)
+
+
+def replay_time(agent, backend, batch_size, repeats):
+    agent.backend = backend
+    agent.replay(batch_size)  # warm up
+    return time_per_call(lambda: agent.replay(batch_size), repeats)
+
+
+if __name__ == "__main__":
+    shape = (15, 9)
+    print('acting, us per step')
+    print('{:>12} {:>14} {:>14} {:>14} {:>8}'.format('level', 'keras predict', 'keras call', 'numpy', 'speedup'))
+    for level in scheme:
+        env = OlympiaRAM(shape=shape, training_level=level, seed=0, memory_size=256)
+        agents = env.get_agents()
+        for agent in agents:
+            agent.epsilon = 0.0
+        state = env.reset()
+        times = [act_time(agents, state, backend, repeats) for backend, repeats in
+                 [('predict', 20), ('keras', 200), ('numpy', 2000)]]
+        print('{:>12} {:>14.1f} {:>14.1f} {:>14.1f} {:>7.0f}x'.format(level, *times, times[0] / times[2]))
+
+    env = OlympiaRAM(shape=shape, training_level='one_player', seed=0, memory_size=256)
+    agent = env.get_agents()[0]
+    fill_memory(env, agent, 256, seed=0)
+    keras, numpy = [replay_time(agent, backend, 64, 20) for backend in ['keras', 'numpy']]
+    print('replay of 64 transitions: keras {:.1f} us, numpy {:.1f} us'.format(keras, numpy))
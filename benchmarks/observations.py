@@ -0,0 +1,38 @@
+"""
+Compares the observation modes of FieldEnv on two_v_two: the bytes the replay memory stores a state in, the time
+output() takes after a step, the time of a forward pass of the agent's network on a batch of 32 states and the bytes
+of a replay memory of 2000 transitions.
+Run from the repository root with: python -m benchmarks.observations
+"""
+
+import numpy as np
+from olympia.envs import OlympiaRAM, OlympiaRGB
+from benchmarks.timing import time_per_call
+
+MODES = [(OlympiaRAM, 'coordinates', 1), (OlympiaRAM, 'normalized', 1), (OlympiaRAM, 'normalized', 4),
+         (OlympiaRGB, 'rgb', 1), (OlympiaRGB, 'codes', 1), (OlympiaRGB, 'egocentric', 1),
+         (OlympiaRGB, 'egocentric', 4)]
+
+
+if __name__ == "__main__":
+    print('{:>5} {:>12} {:>6} {:>12} {:>10} {:>10} {:>12} {:>12}'.format(
+        'type', 'observation', 'stack', 'state size', 'state B', 'output us', 'forward us', 'memory MB'))
+    for env_class, observation, frame_stack in MODES:
+        env = env_class(shape=(31, 21), training_level='two_v_two', seed=0, memory_size=2000,
+                        observation=observation, frame_stack=frame_stack)
+        agent = env.get_agents()[0]
+        rng = np.random.default_rng(0)
+        out = env.output().copy()
+        for actions in rng.integers(0, 17, size=(2000, env.n_agents)):
+            next_out, _, done, _ = env.step(*actions)
+            state = env.agent_observation(out, 0)
+            out = (env.reset() if done else next_out).copy()
+            agent.remember(state, 0, -1, env.agent_observation(out, 0), done)
+        env.output(out=out)  # warm up
+        output = time_per_call(lambda: env.output(out=out), 2000)
+        states = agent.memory.states[:32]
+        agent.q_values(states)
+        forward = time_per_call(lambda: agent.q_values(states), 200)
+        print('{:>5} {:>12} {:>6} {:>12} {:>10} {:>10.2f} {:>12.1f} {:>12.2f}'.format(
+            env.agent_type, observation, frame_stack, 'x'.join(map(str, env.state_size)),
+            agent.memory.states[0].nbytes, output, forward, agent.memory.nbytes / 1e6))
@@ -0,0 +1,69 @@
+"""
+Measures the offline dataset of dataset.py: what streaming every step to disk adds to a step, the size of the
+dataset, and drawing n-step minibatches from its memory maps against drawing them from a ReplayMemory in RAM.
+Run from the repository root with: python -m benchmarks.offline
+"""
+
+import os
+import tempfile
+import numpy as np
+from olympia.envs import OlympiaRAM, OlympiaRGB
+from olympia.envs.dataset import DatasetWriter, OfflineDataset
+from benchmarks.timing import time_per_call
+
+STEPS = 50000
+
+
+def collect(env, writer=None):
+    """Microseconds per step of random play, streamed to writer if there is one."""
+    rng = np.random.default_rng(0)
+    actions = enumerate(rng.integers(0, 17, size=(STEPS, env.n_agents)).tolist())
+    out = env.output().copy()
+
+    def play():
+        state = env.reset(out=out)
+        if writer is not None:
+            writer.start_episode(state)
+        for t, step_actions in actions:
+            state, rewards, done, _ = env.step(*step_actions, out=out)
+            if writer is not None:
+                writer.add(step_actions, rewards, state, done)
+            if done or t % 200 == 199:
+                state = env.reset(out=out)
+                if writer is not None:
+                    writer.start_episode(state)
+        if writer is not None:
+            writer.flush()
+    return time_per_call(play) / STEPS
+
+
+def memory_from_dataset(env, dataset):
+    """The ReplayMemory of agent 0 of env, holding the transitions of the dataset."""
+    memory = env.get_agents()[0].memory
+    states, actions, rewards, next_states, dones = dataset.memory(0).transitions(np.arange(len(dataset)))
+    memory.extend(states, actions, rewards, next_states, dones, dataset.gather('starts', dataset.transition_rows))
+    return memory
+
+
+def sample_time(memory, number=2000, batch_size=32, n_step=3):
+    return time_per_call(lambda: memory.n_step_transitions(memory.sample_indices(batch_size), n_step, 0.99), number)
+
+
+if __name__ == "__main__":
+    print('{:>5} {:>12} {:>10} {:>10} {:>11} {:>14} {:>14}'.format(
+        'type', 'observation', 'step us', 'stream us', 'disk MB', 'RAM sample us', 'disk sample us'))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for env_class, observation in [(OlympiaRAM, 'coordinates'), (OlympiaRGB, 'rgb'), (OlympiaRGB, 'codes')]:
+            env = env_class(shape=(21, 15), training_level='two_v_two', seed=0, memory_size=STEPS,
+                            observation=observation)
+            path = os.path.join(tmp_dir, observation)
+            step = collect(env)
+            streamed = collect(env, DatasetWriter(path, env))
+            dataset = OfflineDataset(path)
+            # the chunks are sparse files, only the blocks written take up space
+            size = sum(os.stat(os.path.join(path, name)).st_blocks * 512 for name in os.listdir(path))
+            memory = memory_from_dataset(env, dataset)
+            print('{:>5} {:>12} {:>10.2f} {:>10.2f} {:>11.2f} {:>14.1f} {:>14.1f}'.format(
+                env.agent_type, observation, step, streamed - step, size / 1e6, sample_time(memory),
+                sample_time(dataset.memory(0))))
+            del dataset
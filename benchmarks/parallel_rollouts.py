@@ -0,0 +1,26 @@
+"""
+Reports how many transitions/sec ParallelTrainer collects for several numbers of rollout workers, and how many
+transitions and updates/sec it gets through when it also learns, with one update per collected transition.
+Run from the repository root with: python -m benchmarks.parallel_rollouts
+"""
+
+import multiprocessing as mp
+from olympia.envs import OlympiaRAM
+from olympia.envs.parallel import ParallelTrainer
+
+
+if __name__ == "__main__":
+    transitions = 5000
+    worker_counts = sorted({1, 2, 4, 8, mp.cpu_count()})
+    print('{:>8} {:>14} {:>20} {:>14} {:>16}'.format(
+        'workers', 'collect st/s', 'collect st/s/worker', 'learn st/s', 'learn updates/s'))
+    for n_workers in worker_counts:
+        env = OlympiaRAM(shape=(15, 9), training_level='two_v_two', seed=0)
+        with ParallelTrainer(env, n_workers, seed=1) as trainer:
+            trainer.train(100 * n_workers, learn=False)  # wait for every worker to start up
+            trainer.collect()
+            collect, _ = trainer.train(transitions, learn=False)
+            trainer.collect()
+            learn, updates = trainer.train(transitions // 10, batch_size=32, replay_ratio=1.0)
+        print('{:>8} {:>14.0f} {:>20.0f} {:>14.0f} {:>16.0f}'.format(
+            n_workers, collect, collect / n_workers, learn, updates))
@@ -0,0 +1,42 @@
+"""
+Compares choosing the actions of every agent with one Agent.choose_action call per agent against BatchedPolicy,
+for a single environment and for many environments at once. Epsilon is 0 so that every action needs the network.
+Run from the repository root with: python -m benchmarks.policy
+"""
+
+from olympia.envs import OlympiaRAM, OlympiaRGB, VectorOlympiaRAM, VectorOlympiaRGB
+from olympia.envs.policy import BatchedPolicy
+from olympia.envs.training_schemes import scheme
+from benchmarks.timing import time_per_call
+
+
+def per_agent_rate(agents, states, repeats):
+    """Agent.choose_action for every agent and every state, returns states/sec."""
+    def choose_actions():
+        for k in range(len(states)):
+            [agent.choose_action(states[k:k + 1]) for agent in agents]
+    return len(states) * 1e6 / time_per_call(choose_actions, repeats)
+
+
+def batched_rate(policy, states, repeats):
+    policy.choose_actions(states)  # builds the graph for this batch size
+    return len(states) * 1e6 / time_per_call(lambda: policy.choose_actions(states), repeats)
+
+
+if __name__ == "__main__":
+    shape = (15, 9)
+    print('{:>5} {:>12} {:>7} {:>18} {:>18} {:>8}'.format('type', 'level', 'n_envs', 'per-agent states/s',
+                                                          'batched states/s', 'speedup'))
+    for env_class, vector_class in [(OlympiaRAM, VectorOlympiaRAM), (OlympiaRGB, VectorOlympiaRGB)]:
+        for level in scheme:
+            env = env_class(shape=shape, training_level=level, seed=0, memory_size=1)
+            agents = env.get_agents()
+            for agent in agents:
+                agent.epsilon = 0.0
+            policy = BatchedPolicy(agents)
+            for n_envs in [1, 64]:
+                states = vector_class(n_envs, shape=shape, training_level=level, seeds=0).output()
+                per_agent = per_agent_rate(agents, states[:8], repeats=1)  # its rate per state does not depend on N
+                batched = batched_rate(policy, states, repeats=20)
+                print('{:>5} {:>12} {:>7} {:>18.1f} {:>18.1f} {:>7.1f}x'.format(
+                    env.agent_type, level, n_envs, per_agent, batched, batched / per_agent))
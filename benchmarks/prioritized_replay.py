@@ -0,0 +1,37 @@
+"""
+Measures sample and priority update latency of PrioritizedReplayMemory against uniform sampling.
+Run from the repository root with: python -m benchmarks.prioritized_replay
+"""
+
+import numpy as np
+from olympia.envs.replay_memory import ReplayMemory, PrioritizedReplayMemory
+from benchmarks.timing import time_per_call
+
+
+def fill(memory, state_size):
+    state = np.zeros((1, *state_size), dtype=np.int16)
+    for _ in range(memory.capacity):
+        memory.append(state, 0, -1, state, False)
+    if isinstance(memory, PrioritizedReplayMemory):
+        indices = np.arange(memory.capacity)
+        memory.update_priorities(indices, np.random.default_rng(0).exponential(size=memory.capacity))
+
+
+if __name__ == "__main__":
+    state_size = (10,)
+    print('{:>9} {:>6} {:>14} {:>18} {:>18}'.format(
+        'capacity', 'batch', 'uniform (us)', 'prioritized (us)', 'update (us)'))
+    for capacity in [100000, 1000000]:
+        uniform = ReplayMemory(capacity, state_size, np.int16)
+        prioritized = PrioritizedReplayMemory(capacity, state_size, np.int16)
+        fill(uniform, state_size)
+        fill(prioritized, state_size)
+        for batch_size in [32, 128, 512]:
+            td_errors = np.random.default_rng(1).normal(size=batch_size)
+            uniform_sample = time_per_call(lambda: uniform.sample(batch_size), 500)
+            prioritized_sample = time_per_call(
+                lambda: prioritized.transitions(prioritized.sample_indices(batch_size)), 500)
+            indices = prioritized.sample_indices(batch_size)
+            update = time_per_call(lambda: prioritized.update_priorities(indices, td_errors), 500)
+            print('{:>9} {:>6} {:>14.1f} {:>18.1f} {:>18.1f}'.format(
+                capacity, batch_size, uniform_sample, prioritized_sample, update))
@@ -0,0 +1,37 @@
+"""
+Measures what the phase timers of profiling.py cost: the time of a step with random actions before a Profiler is
+attached, while it is attached and after it is detached again.
+Run from the repository root with: python -m benchmarks.profiling
+"""
+
+import numpy as np
+from olympia.envs import OlympiaRAM, OlympiaRGB
+from olympia.envs.profiling import Profiler
+from benchmarks.timing import time_per_call
+
+
+def step_time(env, actions):
+    out = env.output().copy()
+    steps = iter(actions)
+
+    def step():
+        _, _, done, _ = env.step(*next(steps), out=out)
+        if done:
+            env.reset(out=out)
+    return time_per_call(step, len(actions))
+
+
+if __name__ == "__main__":
+    print('{:>5} {:>12} {:>12} {:>12} {:>12}'.format('type', 'level', 'before us', 'attached us', 'detached us'))
+    for env_class in [OlympiaRAM, OlympiaRGB]:
+        for level in ['one_player', 'two_v_two', '5_v_5']:
+            env = env_class(shape=(31, 21), training_level=level, seed=0, memory_size=1)
+            actions = np.random.default_rng(0).integers(0, 17, size=(20000, env.n_agents)).tolist()
+            before = step_time(env, actions)
+            profiler = Profiler()
+            profiler.attach(env)
+            attached = step_time(env, actions)
+            profiler.detach()
+            detached = step_time(env, actions)
+            print('{:>5} {:>12} {:>12.2f} {:>12.2f} {:>12.2f}'.format(
+                env.agent_type, level, before, attached, detached))
@@ -0,0 +1,47 @@
+"""
+Compares rendering a frame with the per-cell loop FieldEnv.render used to run, comparing every pixel with up to six
+colours, against the lookup table of rendering.py, and recording a step with EpisodeRecorder against keeping a copy
+of the field, for growing field sizes.
+Run from the repository root with: python -m benchmarks.rendering
+"""
+
+import numpy as np
+from olympia.envs import OlympiaRGB
+from olympia.envs.rendering import EpisodeRecorder
+from benchmarks.timing import time_per_call
+
+
+def loop_render(env):
+    """The text FieldEnv.render built before the lookup table, one comparison per pixel and colour."""
+    field = env.field
+    string = '\n'
+    for y in range(field.shape[1] - 1, -1, -1):
+        for x in range(field.shape[0]):
+            val = field[x, y]
+            for color, text in [(env.FIELD, '   '), (env.TEAM1, ' 1 '), (env.TEAM2, ' 2 '), (env.BALL, ' o '),
+                                (env.WALL, ' x '), (env.GOAL, ' | ')]:
+                if env._same_pixel(val, color):
+                    string += text
+                    break
+            else:
+                raise ValueError()
+        string += '\n'
+    return string + '\n'
+
+
+if __name__ == "__main__":
+    print('{:>9} {:>14} {:>14} {:>8} {:>16} {:>16} {:>10} {:>10}'.format(
+        'shape', 'loop us', 'table us', 'speedup', 'field copy us', 'record us', 'copy B', 'record B'))
+    for shape in [(15, 9), (63, 45), (255, 255)]:
+        env = OlympiaRGB(shape=shape, training_level='two_v_two', seed=0, memory_size=1)
+        assert loop_render(env) == env.render(mode='ansi')  # also warms both up
+        number = max(1, 20000 // (shape[0] * shape[1]))
+        loop = time_per_call(lambda: loop_render(env), number)
+        table = time_per_call(lambda: env.render(mode='ansi'), 10 * number)
+        recorder = EpisodeRecorder(env)
+        recorder.record(env)
+        copy = time_per_call(lambda: env.field.copy(), 1000)
+        record = time_per_call(lambda: recorder.record(env), 1000)
+        print('{:>9} {:>14.1f} {:>14.1f} {:>7.0f}x {:>16.2f} {:>16.2f} {:>10} {:>10}'.format(
+            '{}x{}'.format(*shape), loop, table, loop / table, copy, record, env.field.nbytes,
+            np.array(recorder.positions[-1]).nbytes))
@@ -0,0 +1,38 @@
+"""
+Measures Agent.replay throughput for several minibatch sizes, against the previous per-sample replay loop.
+Run from the repository root with: python -m benchmarks.replay
+"""
+
+import numpy as np
+from olympia.envs import OlympiaRAM
+from olympia.envs.policy import fill_memory
+from benchmarks.timing import time_per_call
+
+
+def per_sample_replay(agent, batch_size):
+    """Agent.replay as it was before minibatches were batched: three framework calls per sample."""
+    for state, action, reward, next_state, done in zip(*agent.memory.sample(batch_size)):
+        state, next_state = state[None], next_state[None]
+        target = reward
+        if not done:
+            target = (reward + agent.gamma *
+                      np.amax(agent.model.predict(next_state, verbose=0)[0]))
+        target_f = agent.model.predict(state, verbose=0)
+        target_f[0][action] = target
+        agent.model.fit(state, target_f, epochs=1, verbose=0)
+
+
+def replay_rate(replay, agent, batch_size, repeats):
+    replay(agent, batch_size)  # warm up the compiled functions for this batch size
+    return 1e6 / time_per_call(lambda: replay(agent, batch_size), repeats)
+
+
+if __name__ == "__main__":
+    env = OlympiaRAM(shape=(15, 9), training_level='one_player', seed=0)
+    agent = env.get_agents()[0]
+    fill_memory(env, agent, agent.memory.capacity, seed=0)
+    print('{:>10} {:>20} {:>20} {:>8}'.format('batch', 'per-sample steps/s', 'batched steps/s', 'speedup'))
+    for batch_size in [10, 32, 128, 512]:
+        per_sample = replay_rate(per_sample_replay, agent, batch_size, repeats=max(1, 100 // batch_size))
+        batched = replay_rate(lambda agent, batch_size: agent.replay(batch_size), agent, batch_size, repeats=50)
+        print('{:>10} {:>20.2f} {:>20.2f} {:>7.1f}x'.format(batch_size, per_sample, batched, batched / per_sample))
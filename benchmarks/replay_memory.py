@@ -0,0 +1,56 @@
+"""
+Compares the memory use and sample latency of ReplayMemory against the deque of transition tuples that
+Agent used to keep. Run from the repository root with: python -m benchmarks.replay_memory
+"""
+
+import random
+import tracemalloc
+from collections import deque
+import numpy as np
+from olympia.envs.replay_memory import ReplayMemory
+from benchmarks.timing import time_per_call
+
+
+def random_episode(length, state_size, dtype, rng):
+    frames = [rng.integers(0, 255, size=(1, *state_size)).astype(dtype) for _ in range(length + 1)]
+    return [(frames[t], int(rng.integers(17)), -1, frames[t + 1], False) for t in range(length)]
+
+
+def fill(memory, append, transitions):
+    tracemalloc.start()
+    for transition in transitions:
+        append(memory, transition)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size
+
+
+def deque_sample(memory, batch_size):
+    states, actions, rewards, next_states, dones = zip(*random.sample(memory, batch_size))
+    return np.concatenate(states), actions, rewards, np.concatenate(next_states), dones
+
+
+if __name__ == "__main__":
+    batch_size = 32
+    rng = np.random.default_rng(0)
+    print('{:>4} {:>9} {:>20} {:>12} {:>14}'.format('obs', 'capacity', 'memory', 'MB', 'sample (us)'))
+    for name, state_size, env_dtype, dtype in [('RAM', (10,), np.int64, np.int16),
+                                               ('RGB', (21, 15, 3), np.uint8, np.uint8)]:
+        for capacity in [2000, 100000, 1000000]:
+            # the same few thousand transitions are cycled through so that only the memories are measured
+            transitions = random_episode(2000, state_size, env_dtype, rng)
+            transitions = [transitions[i % 2000] for i in range(capacity)]
+            memories = [('ReplayMemory', ReplayMemory(capacity, state_size, dtype)),
+                        ('ReplayMemory shared', ReplayMemory(capacity, state_size, dtype, share_frames=True))]
+            if capacity <= 100000:  # a million tuples of arrays does not fit in memory on most machines
+                memories.insert(0, ('deque', deque(maxlen=capacity)))
+            for memory_name, memory in memories:
+                if isinstance(memory, deque):
+                    size = fill(memory, lambda m, t: m.append((t[0].copy(), t[1], t[2], t[3].copy(), t[4])),
+                                transitions)
+                    latency = time_per_call(lambda: deque_sample(memory, batch_size), 200)
+                else:
+                    fill(memory, lambda m, t: m.append(*t), transitions)
+                    size = memory.nbytes
+                    latency = time_per_call(lambda: memory.sample(batch_size), 200)
+                print('{:>4} {:>9} {:>20} {:>12.1f} {:>14.1f}'.format(name, capacity, memory_name, size / 1e6, latency))
@@ -0,0 +1,64 @@
+"""
+Counts the environment steps FieldEnv.train needs on each training level until team 0 wins a fixed share of the
+recent episodes, for the plain DQN targets and for the target network, Double DQN and n-step options of train.
+An episode is won when it ends with the ball in the goal team 0 attacks, at x == 0. Every run has a budget of
+environment steps and is reported as not reached when the budget runs out first.
+Run from the repository root with: python -m benchmarks.sample_efficiency --levels one_player --budget 20000
+"""
+
+import argparse
+import contextlib
+import io
+from olympia.envs import OlympiaRAM
+from olympia.envs.environment import scoring_team
+from olympia.envs.training_schemes import scheme
+
+CONFIGS = {
+    'dqn': {},
+    'target': {'target_sync_every': 100},
+    'polyak+double': {'target_sync_every': 1, 'target_tau': 0.01, 'double_dqn': True},
+    '3-step+target+double': {'n_step': 3, 'target_sync_every': 100, 'double_dqn': True},
+}
+
+
+def steps_to_win_rate(level, config, shape, target, window, budget, max_timesteps, batch_size, seed):
+    """Returns the environment steps taken when the win rate over the last window episodes first reached target,
+    or None if it did not within budget steps, and the number of episodes played."""
+    env = OlympiaRAM(shape=shape, training_level=level, seed=seed)
+    lengths = []
+    wins = []
+
+    def reached():
+        return len(wins) >= window and sum(wins[-window:]) >= target * window
+
+    def end_episode(episode, length, reward):
+        lengths.append(length)
+        wins.append(scoring_team(env, reward) == 0)
+        return reached() or sum(lengths) >= budget
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        # every episode takes at least a step, so the budget of steps runs out before that of episodes
+        env.train(budget, batch_size=batch_size, max_timesteps=max_timesteps, episode_callback=end_episode, **config)
+    return (sum(lengths) if reached() else None), len(wins)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--levels', nargs='+', default=list(scheme), choices=list(scheme))
+    parser.add_argument('--configs', nargs='+', default=list(CONFIGS), choices=list(CONFIGS))
+    parser.add_argument('--target', type=float, default=0.5, help='win rate to reach (default 0.5)')
+    parser.add_argument('--window', type=int, default=20, help='episodes the win rate is taken over (default 20)')
+    parser.add_argument('--budget', type=int, default=50000, help='environment steps per run (default 50000)')
+    parser.add_argument('--max-timesteps', type=int, default=200, help='steps before an episode is cut short')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0])
+    args = parser.parse_args()
+
+    print('{:>12} {:>22} {:>6} {:>10} {:>9}'.format('level', 'config', 'seed', 'steps', 'episodes'))
+    for level in args.levels:
+        for name in args.configs:
+            for seed in args.seeds:
+                steps, episodes = steps_to_win_rate(level, CONFIGS[name], (15, 9), args.target, args.window,
+                                                    args.budget, args.max_timesteps, args.batch_size, seed)
+                print('{:>12} {:>22} {:>6} {:>10} {:>9}'.format(
+                    level, name, seed, 'not reached' if steps is None else steps, episodes))
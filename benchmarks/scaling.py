@@ -0,0 +1,41 @@
+"""
+Measures how the time of a step grows with the number of players and the area of the field, for generated 'N_v_N'
+levels up to 11 players a side on fields up to 101x65, with random actions. A step that scales linearly in the
+players keeps its time per player flat as N grows.
+Run from the repository root with: python -m benchmarks.scaling
+"""
+
+import numpy as np
+from olympia.envs import OlympiaRAM, OlympiaRGB
+from benchmarks.timing import time_per_call
+
+SHAPES = [(31, 21), (61, 41), (101, 65)]
+TEAM_SIZES = [1, 2, 5, 8, 11]
+
+
+def step_time(env, number=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    actions = iter(rng.integers(0, 17, size=(number, env.n_agents)).tolist())
+    out = env.output().copy()
+
+    def step():
+        _, _, done, _ = env.step(*next(actions), out=out)
+        if done:
+            env.reset(out=out)
+    return time_per_call(step, number)
+
+
+if __name__ == "__main__":
+    print('{:>5} {:>9} {:>8} {:>8} {:>12} {:>16}'.format(
+        'type', 'shape', 'level', 'players', 'step us', 'us per player'))
+    for env_class in [OlympiaRAM, OlympiaRGB]:
+        for shape in SHAPES:
+            for n in TEAM_SIZES:
+                level = '{0}_v_{0}'.format(n)
+                try:
+                    env = env_class(shape=shape, training_level=level, seed=0, memory_size=1)
+                except ValueError:  # the formation does not fit on the field
+                    continue
+                step = step_time(env)
+                print('{:>5} {:>9} {:>8} {:>8} {:>12.1f} {:>16.2f}'.format(
+                    env.agent_type, '{}x{}'.format(*shape), level, env.n_agents, step, step / env.n_agents))
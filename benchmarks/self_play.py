@@ -0,0 +1,44 @@
+"""
+Compares the cost of a training step when both teams of a level learn at once in FieldEnv.train with self-play,
+where only the learning team is trained and the other plays frozen snapshots with forward passes alone, and the time
+League.evaluate takes to play the matches between snapshots in this process and in worker processes.
+Run from the repository root with: python -m benchmarks.self_play
+"""
+
+import contextlib
+import io
+import os
+from olympia.envs import OlympiaRAM
+from olympia.envs.league import League
+from benchmarks.timing import time_per_call
+
+EPISODES = 6
+KWARGS = dict(batch_size=32, max_timesteps=100)
+
+
+def ms_per_step(train):
+    steps = []
+    with contextlib.redirect_stdout(io.StringIO()):  # FieldEnv.train prints every episode
+        train_time = time_per_call(lambda: steps.append(train()))
+    return train_time / steps[0] / 1e3
+
+
+def self_play_steps(league):
+    league.train(EPISODES, **KWARGS)
+    return sum(episode['length'] for episode in league.history)
+
+
+if __name__ == "__main__":
+    print('{} cores'.format(os.cpu_count()))
+    print('{:>10} {:>18} {:>18} {:>14} {:>16} {:>16}'.format(
+        'level', 'both teams ms', 'self-play ms', 'snapshots', 'eval in-proc s', 'eval 2 workers s'))
+    for level in ['one_v_one', 'two_v_two']:
+        env = OlympiaRAM(shape=(15, 9), training_level=level, seed=0, memory_size=2000)
+        both = ms_per_step(lambda: sum(env.train(EPISODES, **KWARGS)[0]))
+        env = OlympiaRAM(shape=(15, 9), training_level=level, seed=0, memory_size=2000)
+        league = League(env, snapshot_every=2, seed=0)
+        self_play = ms_per_step(lambda: self_play_steps(league))
+        evaluations = [time_per_call(lambda: league.evaluate(games=4, n_workers=n_workers, max_timesteps=100)) / 1e6
+                       for n_workers in [0, 2]]
+        print('{:>10} {:>18.2f} {:>18.2f} {:>14} {:>16.2f} {:>16.2f}'.format(
+            level, both, self_play, len(league.snapshots), *evaluations))
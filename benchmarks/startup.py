@@ -0,0 +1,38 @@
+"""
+Measures the startup cost of the package in fresh interpreters: importing olympia, creating an OlympiaRAM and
+creating an OlympiaRAM and building the networks of its agents, and whether TensorFlow got loaded along the way.
+Run from the repository root with: python -m benchmarks.startup
+"""
+
+import os
+import subprocess
+import sys
+from benchmarks.timing import time_per_call
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CASES = {
+    'import olympia': 'import olympia',
+    'OlympiaRAM()': 'from olympia.envs import OlympiaRAM; env = OlympiaRAM()',
+    'OlympiaRAM() + models': 'from olympia.envs import OlympiaRAM; env = OlympiaRAM(); '
+                             '[agent.model for agent in env.get_agents()]',
+}
+REPORT = "; import sys; print('tensorflow' in sys.modules)"
+
+
+def startup_time(code, repeats=3):
+    """Returns the best wall-clock time of running code in a new interpreter and whether it loaded TensorFlow."""
+    env = dict(os.environ, TF_CPP_MIN_LOG_LEVEL='3')
+    results = []
+    best = time_per_call(lambda: results.append(subprocess.run(
+        [sys.executable, '-c', code + REPORT], cwd=ROOT, env=env, capture_output=True, text=True, check=True)),
+        1, repeats)
+    return best / 1e6, results[-1].stdout.split()[-1] == 'True'
+
+
+if __name__ == "__main__":
+    baseline, _ = startup_time('pass')
+    print('{:>24} {:>10} {:>12}'.format('case', 'seconds', 'tensorflow'))
+    print('{:>24} {:>10.3f} {:>12}'.format('empty interpreter', baseline, 'no'))
+    for name, code in CASES.items():
+        seconds, tensorflow = startup_time(code)
+        print('{:>24} {:>10.3f} {:>12}'.format(name, seconds, 'yes' if tensorflow else 'no'))
@@ -0,0 +1,155 @@
+"""
+Benchmark suite for the hot paths of the environment and the agents. Every metric is a time (lower is better):
+step(), reset() and output() for RAM and RGB environments on every training level and several field shapes,
+Agent.choose_action, BatchedPolicy.choose_actions, Agent.replay per minibatch size, and whole train() episodes.
+
+Results are written as JSON so that runs on different commits can be compared, --compare exits with status 1 when
+a metric got slower than the baseline by more than --threshold.
+Run from the repository root with:
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --output new.json --compare results.json --threshold 0.2
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+from olympia.envs.environment import ENV_CLASSES
+from olympia.envs.policy import BatchedPolicy
+from olympia.envs.training_schemes import scheme
+from benchmarks.timing import time_per_call
+
+SHAPES = [(15, 9), (21, 15), (63, 45)]
+BATCH_SIZES = [16, 64, 256]
+
+
+def random_stepper(env, seed=0):
+    """Returns a function that steps env with random actions and resets it when an episode ends."""
+    rng = np.random.default_rng(seed)
+    out = env.output().copy()
+
+    def step():
+        _, _, done, _ = env.step(*rng.integers(0, len(env.get_agents()[0].actions), size=env.n_agents), out=out)
+        if done:
+            env.reset(out=out)
+    return step
+
+
+def env_metrics(agent_type, level, shape, number, repeats):
+    env = ENV_CLASSES[agent_type](shape=shape, training_level=level, seed=0, memory_size=1)
+    name = '{}/{}/{}x{}'.format(agent_type, level, *shape)
+    return {
+        'step/' + name: time_per_call(random_stepper(env), number, repeats),
+        'reset/' + name: time_per_call(env.reset, number, repeats),
+        'output/' + name: time_per_call(env.output, number, repeats),
+    }
+
+
+def agent_metrics(agent_type, shape, number, repeats):
+    env = ENV_CLASSES[agent_type](shape=shape, training_level='one_player', seed=0,
+                                  memory_size=10 * max(BATCH_SIZES))
+    agent = env.get_agents()[0]
+    name = '{}/{}x{}'.format(agent_type, *shape)
+    state = env.reset().copy()
+    step = random_stepper(env)
+    for _ in range(agent.memory.capacity):
+        step()
+        agent.remember(state, 0, -1, env.output(), False)
+        state = env.output().copy()
+    metrics = {}
+    agent.epsilon = 0.0  # always ask the network
+    agent.choose_action(state)
+    metrics['choose_action/' + name] = time_per_call(lambda: agent.choose_action(state), number, repeats)
+    policy = BatchedPolicy([agent])
+    policy.choose_actions(state)
+    metrics['batched_policy/' + name] = time_per_call(lambda: policy.choose_actions(state), number, repeats)
+    for batch_size in BATCH_SIZES:
+        agent.replay(batch_size)  # builds the compiled function for this batch size
+        metrics['replay/{}/batch{}'.format(name, batch_size)] = time_per_call(
+            lambda: agent.replay(batch_size), max(3, number // 10), repeats)
+    return metrics
+
+
+def train_metrics(agent_type, level, shape, episodes, max_timesteps):
+    env = ENV_CLASSES[agent_type](shape=shape, training_level=level, seed=0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        env.train(1, max_timesteps=max_timesteps)  # warm up
+        train = time_per_call(lambda: env.train(episodes, max_timesteps=max_timesteps))
+    return {'train/{}/{}/{}x{}'.format(agent_type, level, *shape): train / episodes}
+
+
+def run_suite(quick=False, name_filter=''):
+    number, repeats = (50, 2) if quick else (500, 5)
+    shapes = SHAPES[:1] if quick else SHAPES
+    jobs = []
+    for agent_type in ENV_CLASSES:
+        for level in scheme:
+            for shape in shapes:
+                jobs.append(('env/{}/{}/{}x{}'.format(agent_type, level, *shape), env_metrics,
+                             (agent_type, level, shape, number, repeats)))
+        for shape in shapes:
+            jobs.append(('agent/{}/{}x{}'.format(agent_type, *shape), agent_metrics,
+                         (agent_type, shape, number // 10, repeats)))
+        for level in scheme:
+            jobs.append(('train/{}/{}/{}x{}'.format(agent_type, level, *SHAPES[0]), train_metrics,
+                         (agent_type, level, SHAPES[0], 1 if quick else 3, 50)))
+    metrics = {}
+    for name, job, args in jobs:
+        if name_filter in name:
+            results = job(*args)
+            for metric, value in results.items():
+                print('{:<45} {:>14.1f} us'.format(metric, value))
+            metrics.update(results)
+    return metrics
+
+
+def environment_info():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {'commit': commit or None, 'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.machine(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def compare(metrics, baseline, threshold):
+    """Prints every metric against the baseline and returns the names of those slower by more than threshold."""
+    regressions = []
+    print('{:<45} {:>12} {:>12} {:>8}'.format('metric', 'baseline us', 'current us', 'ratio'))
+    for metric in sorted(set(metrics) & set(baseline)):
+        ratio = metrics[metric] / baseline[metric]
+        regressed = ratio > 1 + threshold
+        if regressed:
+            regressions.append(metric)
+        print('{:<45} {:>12.1f} {:>12.1f} {:>7.2f}x{}'.format(metric, baseline[metric], metrics[metric], ratio,
+                                                              '  REGRESSION' if regressed else ''))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='file to write the results to as JSON')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative slowdown above which a metric counts as a regression (default 0.2)')
+    parser.add_argument('--filter', default='',
+                        help='only run the groups (env/..., agent/..., train/...) whose name contains this text')
+    parser.add_argument('--quick', action='store_true', help='fewer repeats and only the smallest field shape')
+    args = parser.parse_args()
+
+    metrics = run_suite(quick=args.quick, name_filter=args.filter)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'info': environment_info(), 'unit': 'us', 'metrics': metrics}, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['metrics']
+        regressions = compare(metrics, baseline, args.threshold)
+        if regressions:
+            print('{} metric(s) regressed by more than {:.0%}.'.format(len(regressions), args.threshold))
+            sys.exit(1)
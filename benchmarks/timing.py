@@ -0,0 +1,16 @@
+"""
+The timing every benchmark measures with, so that the numbers of different scripts can be compared.
+"""
+
+import time
+
+
+def time_per_call(fn, number=1, repeats=1):
+    """Returns the best over repeats of the mean time of number calls of fn, in microseconds."""
+    best = float('inf')
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start_time) / number)
+    return best * 1e6
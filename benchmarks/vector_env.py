@@ -0,0 +1,41 @@
+"""
+Compares the throughput of N separate OlympiaRAM environments against one VectorOlympiaRAM holding N games.
+Run from the repository root with: python -m benchmarks.vector_env
+"""
+
+import numpy as np
+from olympia.envs import OlympiaRAM, VectorOlympiaRAM
+from benchmarks.timing import time_per_call
+
+
+def separate_envs_rate(n_envs, steps, max_timesteps, **kwargs):
+    envs = [OlympiaRAM(seed=i, **kwargs) for i in range(n_envs)]
+    actions = enumerate(np.random.default_rng(0).integers(0, 17, size=(steps, n_envs, envs[0].n_agents)))
+
+    def step():
+        t, step_actions = next(actions)
+        for env, env_actions in zip(envs, step_actions):
+            _, _, done, _ = env.step(*env_actions)
+            if done or (t + 1) % max_timesteps == 0:
+                env.reset()
+    return n_envs * 1e6 / time_per_call(step, steps)
+
+
+def vector_env_rate(n_envs, steps, max_timesteps, **kwargs):
+    env = VectorOlympiaRAM(n_envs, seeds=0, max_timesteps=max_timesteps, **kwargs)
+    actions = iter(np.random.default_rng(0).integers(0, 17, size=(steps, n_envs, env.n_agents)))
+    return n_envs * 1e6 / time_per_call(lambda: env.step(next(actions)), steps)
+
+
+if __name__ == "__main__":
+    shape = (15, 9)
+    training_level = 'two_v_two'
+    steps = 200
+    max_timesteps = 100
+    print('{:>8} {:>16} {:>16} {:>8}'.format('n_envs', 'separate st/s', 'vector st/s', 'speedup'))
+    for n_envs in [1, 8, 64, 512]:
+        # the separate environments are capped at 64 instances, their rate per game does not depend on N
+        separate = separate_envs_rate(min(n_envs, 64), steps, max_timesteps, shape=shape,
+                                      training_level=training_level)
+        vector = vector_env_rate(n_envs, steps, max_timesteps, shape=shape, training_level=training_level)
+        print('{:>8} {:>16.0f} {:>16.0f} {:>7.1f}x'.format(n_envs, separate, vector, vector / separate))
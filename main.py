@@ -1,4 +1,4 @@
-from olympia.envs import OlympiaRGB, OlympiaRAM
+from olympia.envs.curriculum import Curriculum
 from olympia.envs.training_schemes import scheme
 
 if __name__ == "__main__":
@@ -6,17 +6,15 @@ if __name__ == "__main__":
     shape = (15, 9)
     training_levels = list(scheme.keys())
     batch_size = 10
-    train_episodes = 3
-    run_episodes = 3
+    train_episodes = 3  # most episodes per level, fewer if win_rate is reached first
+    win_rate = 0.5
+    window = 3
 
     # Choose either 'RAM' or 'RGB' for olympia_type
     olympia_type = 'RAM'
 
-    for level in training_levels:
-        if olympia_type == 'RAM':
-            env = OlympiaRAM(shape=shape, training_level=level)
-        elif olympia_type == 'RGB':
-            env = OlympiaRGB(shape=shape, training_level=level)
-        else:
-            raise NotImplementedError('Type not implemented!')
-        times, rewards = env.train(episodes=train_episodes, batch_size=batch_size, render=True, load_saved=False, save_models=False)
+    # the agents of each level start from those of the previous one
+    curriculum = Curriculum(agent_type=olympia_type, shape=shape, levels=training_levels, win_rate=win_rate,
+                            window=window, max_episodes=train_episodes, batch_size=batch_size, render=True,
+                            load_saved=False, save_models=False)
+    curriculum.run()
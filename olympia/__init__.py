@@ -9,3 +9,18 @@ register(
     id='olympia-ram-v0',
     entry_point='olympia.envs:OlympiaRAM',
 )
+
+# the Gymnasium interface, with a reward per agent, see olympia/envs/multi_agent.py
+register(
+    id='olympia-rgb-v1',
+    entry_point='olympia.envs.multi_agent:MultiAgentOlympia',
+    kwargs={'agent_type': 'RGB'},
+    disable_env_checker=True,
+)
+
+register(
+    id='olympia-ram-v1',
+    entry_point='olympia.envs.multi_agent:MultiAgentOlympia',
+    kwargs={'agent_type': 'RAM'},
+    disable_env_checker=True,
+)
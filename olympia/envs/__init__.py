@@ -1 +1,3 @@
 from olympia.envs.environment import OlympiaRGB, OlympiaRAM
+from olympia.envs.vector_environment import VectorOlympiaRGB, VectorOlympiaRAM
+from olympia.envs.multi_agent import MultiAgentOlympia
@@ -0,0 +1,32 @@
+"""
+This file contains the codes of the occupancy grid that FieldEnv keeps for every cell of the field and the
+colours each code is drawn with in the RGB field state.
+
+A cell holds one of the static codes (empty, wall, goal) or the ball, and the bit of every team with a player
+standing on it is added on top, so every pixel the RGB field state can contain has exactly one code.
+"""
+
+import numpy as np
+from numpy import zeros
+
+CELL_EMPTY = 0
+CELL_WALL = 1
+CELL_GOAL = 2
+CELL_BALL = 3
+CELL_TEAM1 = 4
+CELL_TEAM2 = 8
+CELL_TEAMS = (CELL_TEAM1, CELL_TEAM2)  # indexed by team number
+CELL_PLAYERS = CELL_TEAM1 | CELL_TEAM2
+
+
+def _cell_colors():
+    colors = zeros((16, 3), dtype=np.uint8)
+    for code in range(len(colors)):
+        colors[code] = [(0, 0, 0), (255, 255, 255), (250, 250, 250), (0, 0, 255)][code & 3]
+        for team, bit in enumerate(CELL_TEAMS):
+            if code & bit:
+                colors[code, team] = 255  # teams are red and green
+    return colors
+
+
+COLORS = _cell_colors()  # COLORS[grid] is the RGB field state of an occupancy grid
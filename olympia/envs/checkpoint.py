@@ -0,0 +1,257 @@
+"""
+Checkpoints hold everything a training run needs to continue exactly where it stopped in one file: the network,
+target network and optimizer weights of every agent, their exploration schedules and replay memories, and the state
+of every random generator and of the ball.
+
+The file starts with MAGIC, the format version and the length of a JSON header describing the run, followed by the
+arrays as raw blobs aligned to ALIGNMENT bytes, which load_checkpoint maps into memory instead of parsing.
+Checkpointer writes checkpoints in a background thread. It keeps a copy of every replay memory that each checkpoint
+brings up to date with the slots written since the previous one, so the training loop only waits for those and the
+networks to be copied, not for the whole memory.
+"""
+
+import json
+import os
+import struct
+import threading
+import time
+import numpy as np
+from .replay_memory import PrioritizedReplayMemory
+
+MAGIC = b'OLYCKPT\x00'
+VERSION = 1
+ALIGNMENT = 64
+_PREFIX = struct.Struct('<8sIxxxxQ')  # magic, version, header length
+_MEMORY_SCALARS = ['capacity', 'share_frames', '_index', '_size']
+_SLOT_ARRAYS = ['states', 'next_states', 'actions', 'rewards', 'dones', '_continues', '_valid']  # a row per slot
+_PRIORITIZED_SCALARS = ['alpha', 'beta', 'beta_increment', 'epsilon', '_max_priority']
+_AGENT_SCALARS = ['epsilon', 'epsilon_min', 'epsilon_decay', 'gamma', 'backend', 'n_step', 'double_dqn',
+                  'target_sync_every', 'target_tau', '_replays']
+
+
+def _env_config(env):
+    return {'class': type(env).__name__, 'agent_type': env.agent_type, 'shape': list(env.shape),
+            'training_level': env._training_level, 'memory_size': env.memory_size, 'share_frames': env.share_frames,
+            'observation': env.observation, 'frame_stack': env.frame_stack, 'view_radius': env.view_radius}
+
+
+class _Blobs:
+    """Collects the arrays of a snapshot, the header refers to each by its position."""
+
+    def __init__(self):
+        self.arrays = []
+
+    def add(self, array, copy=True):
+        self.arrays.append(np.array(array, copy=copy))
+        return len(self.arrays) - 1
+
+    def add_all(self, arrays):
+        return [self.add(array, copy=False) for array in arrays]  # fresh arrays of Keras, nothing to copy
+
+
+class _MemoryCopy:
+    """Copy of the arrays of a replay memory, update copies the slots written since the last update."""
+
+    def __init__(self, memory):
+        self.memory = memory
+        self.arrays = {name: np.array(value) for name, value in vars(memory).items() if isinstance(value, np.ndarray)}
+        self._written = memory._written
+
+    def update(self):
+        memory = self.memory
+        new = memory._written - self._written
+        slots = None  # every slot
+        if 0 <= new < memory.capacity - 1:
+            # the slot before the new ones is written too, it learns whether the next one continues its episode
+            slots = (memory._index - new - 1 + np.arange(new + 1)) % memory.capacity
+        for name, array in self.arrays.items():
+            if slots is None or name not in _SLOT_ARRAYS:
+                array[...] = getattr(memory, name)
+            else:
+                array[slots] = getattr(memory, name)[slots]
+        self._written = memory._written
+
+
+def _memory_state(memory, blobs, memory_copy=None):
+    state = {name: getattr(memory, name) for name in _MEMORY_SCALARS}
+    if memory_copy is None:
+        state['arrays'] = {name: blobs.add(value) for name, value in vars(memory).items()
+                           if isinstance(value, np.ndarray)}
+    else:
+        memory_copy.update()
+        state['arrays'] = {name: blobs.add(value, copy=False) for name, value in memory_copy.arrays.items()}
+    if isinstance(memory, PrioritizedReplayMemory):
+        state['prioritized'] = {name: float(getattr(memory, name)) for name in _PRIORITIZED_SCALARS}
+        state['arrays']['_tree._tree'] = blobs.add(memory._tree._tree)
+    return state
+
+
+def _agent_state(agent, blobs, memory_copy=None):
+    state = {name: getattr(agent, name) for name in _AGENT_SCALARS}
+    state.update(team=agent.team, number=agent.number, rng=agent.np_random.bit_generator.state,
+                 memory=_memory_state(agent.memory, blobs, memory_copy))
+    if agent._model is not None:  # an agent whose network was never needed has nothing to save
+        state['weights'] = blobs.add_all(agent.model.get_weights())
+        state['optimizer'] = blobs.add_all([v.numpy() for v in agent.model.optimizer.variables])
+    if agent._target_model is not None:
+        state['target_weights'] = blobs.add_all(agent._target_model.get_weights())
+    return state
+
+
+def snapshot(env, episode=0, extra=None, memory_copies=None):
+    """Returns the header and the arrays of a checkpoint of env after episode episodes, copied so that training can
+    go on while they are written. extra is JSON data stored in the header as it is, such as the progress of a
+    Curriculum. memory_copies: a _MemoryCopy of the memory of each agent to bring up to date and write the memory
+    from, instead of copying all of it."""
+    blobs = _Blobs()
+    ball = env.ball
+    header = {'version': VERSION, 'episode': episode, 'env': _env_config(env),
+              'rng': env.np_random.bit_generator.state,
+              'ball': {'position': ball.position.tolist(), 'moving': bool(ball.moving),
+                       'movement': [m.tolist() for m in ball.movement]},
+              'agents': [_agent_state(agent, blobs, None if memory_copies is None else memory_copies[i])
+                         for i, agent in enumerate(env.get_agents())]}
+    if extra is not None:
+        header['extra'] = extra
+    return header, blobs.arrays
+
+
+def _align(n):
+    return -(-n // ALIGNMENT) * ALIGNMENT
+
+
+def write_checkpoint(path, header, arrays):
+    """Writes a snapshot to path, replacing an older checkpoint only once the new one is complete."""
+    header = dict(header, blobs=[])
+    offset = 0
+    for array in arrays:
+        header['blobs'].append({'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)})
+        offset = _align(offset + array.nbytes)
+    encoded = json.dumps(header).encode()
+    data_start = _align(_PREFIX.size + len(encoded))
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREFIX.pack(MAGIC, VERSION, len(encoded)))
+        f.write(encoded)
+        for array, blob in zip(arrays, header['blobs']):
+            f.seek(data_start + blob['offset'])
+            f.write(np.ascontiguousarray(array).data)
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def read_checkpoint(path):
+    """Returns the header of the checkpoint at path and its arrays, memory-mapped read-only."""
+    with open(path, 'rb') as f:
+        magic, version, header_size = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError('{} is not a checkpoint.'.format(path))
+        if version > VERSION:
+            raise ValueError('Checkpoint version {} is newer than the supported {}.'.format(version, VERSION))
+        header = json.loads(f.read(header_size))
+    data_start = _align(_PREFIX.size + header_size)
+    arrays = []
+    for blob in header['blobs']:
+        dtype, shape = np.dtype(blob['dtype']), tuple(blob['shape'])
+        if np.prod(shape) == 0:
+            arrays.append(np.empty(shape, dtype=dtype))
+        else:
+            arrays.append(np.memmap(path, dtype=dtype, mode='r', offset=data_start + blob['offset'], shape=shape))
+    return header, arrays
+
+
+def _restore_memory(agent, state, arrays):
+    if 'prioritized' in state:
+        agent.prioritize_replay()
+    memory = agent.memory
+    for name in _MEMORY_SCALARS:
+        setattr(memory, name, state[name])
+    for name, value in state.get('prioritized', {}).items():
+        setattr(memory, name, value)
+    for name, index in state['arrays'].items():
+        target = memory._tree._tree if name == '_tree._tree' else getattr(memory, name)
+        target[...] = arrays[index]
+
+
+def _restore_agent(agent, state, arrays):
+    for name in _AGENT_SCALARS:
+        setattr(agent, name, state[name])
+    agent.np_random.bit_generator.state = state['rng']  # in place, the memory draws from the same generator
+    _restore_memory(agent, state['memory'], arrays)
+    if 'weights' in state:
+        agent.set_weights([arrays[i] for i in state['weights']])
+        optimizer = agent.model.optimizer
+        values = [arrays[i] for i in state['optimizer']]
+        if len(values) > len(optimizer.variables):  # slots are only created by the first update
+            optimizer.build(agent.model.trainable_variables)
+        for variable, value in zip(optimizer.variables, values):
+            variable.assign(value)
+    agent._target_model = None
+    if 'target_weights' in state:
+        agent._target_model = agent._build_target_model()
+        agent._target_model.set_weights([np.array(arrays[i]) for i in state['target_weights']])
+
+
+def load_checkpoint(env, path):
+    """Restores a checkpoint written for the same kind of env and returns the number of episodes it was taken after."""
+    header, arrays = read_checkpoint(path)
+    if header['env'] != _env_config(env):
+        raise ValueError('The checkpoint was written for {}, not {}.'.format(header['env'], _env_config(env)))
+    env.np_random.bit_generator.state = header['rng']
+    ball = env.ball
+    ball.position = np.array(header['ball']['position'])
+    ball.moving = header['ball']['moving']
+    ball.movement = [np.array(m) for m in header['ball']['movement']]
+    agents = {(agent.team, agent.number): agent for agent in env.get_agents()}
+    for state in header['agents']:
+        _restore_agent(agents[(state['team'], state['number'])], state, arrays)
+    return header['episode']
+
+
+def save_checkpoint(env, path, episode=0, extra=None):
+    write_checkpoint(path, *snapshot(env, episode, extra))
+
+
+class Checkpointer:
+    """
+    Saves checkpoints of env to path in a background thread. save only blocks the caller while the snapshot is
+    copied, or while an earlier save is still being written, the time it took is appended to stall_times. The
+    replay memories are written from copies only the slots written since the previous save are copied into.
+    extra: called at every save for the extra data of the snapshot, None to store none.
+    """
+
+    def __init__(self, env, path, extra=None):
+        self.env = env
+        self.path = path
+        self.extra = extra
+        self._memory_copies = []
+        self.stall_times = []
+        self._thread = None
+        self._error = None
+
+    def save(self, episode=0):
+        start_time = time.perf_counter()
+        self.wait()
+        agents = self.env.get_agents()
+        if [copy.memory for copy in self._memory_copies] != [agent.memory for agent in agents]:
+            self._memory_copies = [_MemoryCopy(agent.memory) for agent in agents]  # new or replaced memories
+        header, arrays = snapshot(self.env, episode, None if self.extra is None else self.extra(),
+                                  self._memory_copies)
+        self._thread = threading.Thread(target=self._write, args=(header, arrays), daemon=True)
+        self._thread.start()
+        self.stall_times.append(time.perf_counter() - start_time)
+
+    def _write(self, header, arrays):
+        try:
+            write_checkpoint(self.path, header, arrays)
+        except Exception as error:
+            self._error = error
+
+    def wait(self):
+        """Waits for the checkpoint being written, raising the error writing it if it failed."""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
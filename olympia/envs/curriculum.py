@@ -0,0 +1,195 @@
+"""
+Curriculum trains the agents through the training_schemes levels in order, carrying what they learned from one level
+to the next instead of starting every level with fresh agents. An agent of a level takes the network weights, the
+replay memory and the exploration schedule of the agent with the same team and number in the previous level, and a
+level ends when team 0 wins often enough, when episodes get short enough or after max_episodes.
+"""
+
+import os
+import numpy as np
+from .checkpoint import load_checkpoint, read_checkpoint, save_checkpoint
+from .environment import ENV_CLASSES, scoring_team
+from .replay_memory import PrioritizedReplayMemory
+from .training_schemes import scheme
+
+
+def _ram_columns(env):
+    """
+    Columns of the RAM state of env holding the ball and each player, keyed by None and by (team, number), in every
+    stacked frame.
+    """
+    frames = [k * env.frame_size[0] for k in range(env.frame_stack)]
+    columns = {None: [offset + c for offset in frames for c in (0, 1)]}
+    for i, agent in enumerate(env.get_agents()):
+        columns[(agent.team, agent.number)] = [offset + c for offset in frames for c in (2 + 2 * i, 3 + 2 * i)]
+    return columns
+
+
+def _state_mapping(source_env, target_env):
+    """Returns the columns of source_env's states and where they go in target_env's, for RAM states."""
+    source_columns = _ram_columns(source_env)
+    target_columns = _ram_columns(target_env)
+    keys = [key for key in target_columns if key in source_columns]
+    return sum((source_columns[key] for key in keys), []), sum((target_columns[key] for key in keys), [])
+
+
+def _map_states(states, target_env, mapping):
+    if mapping is None:
+        return states
+    source, target = mapping
+    mapped = np.zeros((len(states), *target_env.state_size), dtype=states.dtype)
+    mapped[:, target] = states[:, source]
+    return mapped
+
+
+def transfer_agents(source_env, target_env):
+    """
+    Gives every agent of target_env the weights, replay memory and epsilon of the agent of source_env with the same
+    team and number. RAM states of the two levels differ in the players they hold, the ball and the players found in
+    both are moved to their new columns and the first layer gets zero weights for the new players' coordinates, so
+    a carried network values the states of the new level as it valued the old ones.
+    """
+    mapping = _state_mapping(source_env, target_env) if target_env.agent_type == 'RAM' else None
+    sources = {(agent.team, agent.number): agent for agent in source_env.get_agents()}
+    for agent in target_env.get_agents():
+        source = sources.get((agent.team, agent.number))
+        if source is None:
+            continue
+        weights = source.model.get_weights()
+        if mapping is not None:
+            kernel = np.zeros((target_env.state_size[0], weights[0].shape[1]), dtype=weights[0].dtype)
+            kernel[mapping[1]] = weights[0][mapping[0]]
+            weights[0] = kernel
+        agent.set_weights(weights)
+        agent.epsilon = source.epsilon
+        agent.epsilon_min = source.epsilon_min
+        agent.epsilon_decay = source.epsilon_decay
+        _transfer_memory(source.memory, agent.memory, target_env, mapping)
+
+
+def _transfer_memory(source, target, target_env, mapping):
+    # oldest first, skipping the transitions whose next state is not stored
+    order = (source._index - len(source) + np.arange(len(source))) % source.capacity
+    if source.share_frames:
+        order = order[source._valid[order]]
+    order = order[-target.capacity:]
+    states, actions, rewards, next_states, dones = source.transitions(order)
+    states = _map_states(states, target_env, mapping)
+    next_states = _map_states(next_states, target_env, mapping)
+    starts = np.ones(len(order), dtype=bool)
+    starts[1:] = ~source._continues[order[:-1]]
+    if isinstance(target, PrioritizedReplayMemory):  # every transition gets its priority as it is appended
+        for k in range(len(order)):
+            target.append(states[k:k + 1], actions[k], rewards[k], next_states[k:k + 1], dones[k], start=starts[k])
+    else:
+        target.extend(states, actions, rewards, next_states, dones, starts)
+
+
+class Curriculum:
+    def __init__(self, agent_type='RAM', shape=(15, 9), levels=None, win_rate=0.5, episode_length=None, window=20,
+                 max_episodes=1000, checkpoint_dir=None, seed=None, env_kwargs=None, **train_kwargs):
+        """
+        levels: training_schemes levels in the order they are trained, all of them by default.
+        win_rate: share of the last window episodes team 0 has to win to advance, None to not advance on wins.
+        episode_length: mean length of the last window episodes at or below which to advance, None to not advance
+            on length.
+        max_episodes: episodes after which a level ends whether or not a threshold was reached.
+        checkpoint_dir: directory a checkpoint of every level is saved to when it ends, None to not save.
+        train_kwargs: passed on to FieldEnv.train, such as batch_size, max_timesteps or n_step. Every level is
+            trained by one FieldEnv.train, so save_models and load_saved checkpoint and resume each level, in
+            checkpoint_dir or, without one, in the working directory. A level without a checkpoint starts afresh.
+        """
+        if agent_type not in ENV_CLASSES:
+            raise ValueError('Invalid agent type supplied!')
+        if 'checkpoint_path' in train_kwargs:
+            raise ValueError('Every level has a checkpoint of its own, set checkpoint_dir instead of checkpoint_path.')
+        self.agent_type = agent_type
+        self.shape = shape
+        self.levels = list(scheme) if levels is None else list(levels)
+        self.win_rate = win_rate
+        self.episode_length = episode_length
+        self.window = window
+        self.max_episodes = max_episodes
+        self.checkpoint_dir = checkpoint_dir
+        self.seed = seed
+        self.env_kwargs = {} if env_kwargs is None else env_kwargs
+        self.train_kwargs = train_kwargs
+        self.env = None
+        self.history = []
+
+    def run(self):
+        """Trains every level in turn and returns a summary of each."""
+        if self.checkpoint_dir is not None:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+        for k, level in enumerate(self.levels):
+            seed = None if self.seed is None else self.seed + k
+            env = ENV_CLASSES[self.agent_type](shape=self.shape, training_level=level, seed=seed, **self.env_kwargs)
+            if self.env is not None:
+                transfer_agents(self.env, env)
+            self.env = env
+            summary = self.train_level(env)
+            self.history.append(summary)
+            print('Level {} finished after {} episodes ({} steps), win rate {:.2f}, mean length {:.1f}{}.'.format(
+                level, summary['episodes'], summary['steps'], summary['win_rate'], summary['mean_length'],
+                '' if summary['advanced'] else ', no threshold reached'))
+        return self.history
+
+    def train_level(self, env):
+        """
+        Trains the level of env until a threshold is reached or it was trained for max_episodes, counting those of
+        the checkpoint it resumed from. Checkpoints hold the progress of the level, a level that already advanced is
+        restored rather than trained again, and the window of a resumed level spans the episodes from before.
+        """
+        path = self.checkpoint_path(env)
+        resume = self.train_kwargs.get('load_saved', False) and os.path.exists(path)
+        progress = {'episodes': 0, 'steps': 0, 'wins': [], 'lengths': [], 'advanced': False}
+        if resume:
+            progress.update(read_checkpoint(path)[0].get('extra', {}).get('curriculum', {}))
+        wins = progress['wins']
+        lengths = progress['lengths']
+
+        def end_episode(episode, length, reward):
+            progress['episodes'] = episode + 1
+            progress['steps'] += length
+            lengths.append(length)
+            wins.append(bool(scoring_team(env, reward) == 0))
+            progress['advanced'] = bool(self._threshold_reached(wins, lengths))
+            return progress['advanced']
+
+        start_episode = progress['episodes']
+        if progress['advanced']:
+            load_checkpoint(env, path)
+        else:
+            train_kwargs = dict(self.train_kwargs, checkpoint_path=path, load_saved=resume,
+                                checkpoint_extra=lambda: self._checkpoint_extra(progress))
+            env.train(self.max_episodes, episode_callback=end_episode, **train_kwargs)
+        # with save_models the level was checkpointed by FieldEnv.train, nothing is saved for a level not trained
+        if (self.checkpoint_dir is not None and progress['episodes'] > start_episode
+                and not self.train_kwargs.get('save_models')):
+            self.checkpoint(env, progress)
+        if progress['episodes'] == 0 and resume:  # a checkpoint without progress, or nothing was left to train
+            progress['episodes'] = self.max_episodes
+        recent = slice(-self.window, None)
+        return {'level': env._training_level, 'episodes': progress['episodes'], 'steps': int(progress['steps']),
+                'win_rate': float(np.mean(wins[recent])) if wins else float('nan'),
+                'mean_length': float(np.mean(lengths[recent])) if lengths else float('nan'),
+                'advanced': progress['advanced']}
+
+    def _checkpoint_extra(self, progress):
+        recent = slice(-self.window, None)
+        return {'curriculum': dict(progress, wins=progress['wins'][recent], lengths=progress['lengths'][recent])}
+
+    def _threshold_reached(self, wins, lengths):
+        if len(lengths) < self.window:
+            return False
+        if self.win_rate is not None and np.mean(wins[-self.window:]) >= self.win_rate:
+            return True
+        return self.episode_length is not None and np.mean(lengths[-self.window:]) <= self.episode_length
+
+    def checkpoint_path(self, env):
+        """Checkpoint of the level of env, named like the default of FieldEnv.train."""
+        name = '{}_{}.ckpt'.format(self.agent_type, env._training_level)
+        return name if self.checkpoint_dir is None else os.path.join(self.checkpoint_dir, name)
+
+    def checkpoint(self, env, progress):
+        save_checkpoint(env, self.checkpoint_path(env), progress['episodes'], self._checkpoint_extra(progress))
@@ -0,0 +1,245 @@
+"""
+Offline datasets: the transitions of FieldEnv.train or FieldEnv.run streamed to disk, to train agents from again
+without simulating the environment.
+
+A dataset is a directory of chunks of chunk_size rows, one .npy file per array and chunk, and meta.json. A row holds
+an observation of the environment, the state FieldEnv.output returns, and, if the step after it was recorded, the
+actions, rewards and done of that step, whose next state is the observation of the following row. The last
+observation of every episode has a row of its own without a transition, so next states are never stored twice and
+an episode cut short by max_timesteps does not look finished.
+
+OfflineDataset opens the chunks as memory maps, so minibatches are read from the files as they are sampled and any
+number of processes can train from one dataset, sharing the pages the operating system caches. OfflineMemory shows
+the transitions of one agent with the sampling interface of ReplayMemory, which Agent.replay draws from in
+train_offline.
+"""
+
+import json
+import os
+import numpy as np
+from numpy.lib.format import open_memmap
+
+VERSION = 1
+
+
+def _env_config(env):
+    return {'agent_type': env.agent_type, 'shape': list(env.shape), 'training_level': env._training_level,
+            'observation': env.observation, 'frame_stack': env.frame_stack, 'view_radius': env.view_radius}
+
+
+def _layout(env):
+    """Shape and type of the arrays of a row of a dataset of env."""
+    observation_shape = (env.n_agents, *env.state_size) if env.per_agent_observation else env.state_size
+    return {'observations': (observation_shape, np.dtype(env.state_dtype).str),
+            'actions': ((env.n_agents,), '|u1'),
+            'rewards': ((env.n_agents,), '<f4'),
+            'dones': ((), '|b1'),
+            'valid': ((), '|b1'),  # the row holds a transition, the following row holds its next state
+            'starts': ((), '|b1')}  # the row holds the first observation of an episode
+
+
+def _chunk_path(path, name, chunk):
+    return os.path.join(path, '{}_{:05d}.npy'.format(name, chunk))
+
+
+class DatasetWriter:
+    def __init__(self, path, env, chunk_size=65536):
+        """Writes a dataset of env to the directory path, adding to the dataset already there."""
+        self.path = path
+        self.config = _env_config(env)
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta['env'] != self.config:
+                raise ValueError('The dataset was recorded in {}, not {}.'.format(meta['env'], self.config))
+            chunk_size = meta['chunk_size']
+            self.rows = meta['rows']
+            self.transitions = meta['transitions']
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.rows = 0
+            self.transitions = 0
+        self.chunk_size = chunk_size
+        self.per_agent = env.per_agent_observation
+        self.layout = _layout(env)
+        self._chunk = None
+        self._arrays = None
+        if self.rows % chunk_size:
+            self._open_chunk(self.rows // chunk_size, mode='r+')
+
+    def _open_chunk(self, chunk, mode='w+'):
+        if self._arrays is not None:
+            self.flush()
+        self._chunk = chunk
+        self._arrays = {name: open_memmap(_chunk_path(self.path, name, chunk), mode=mode, dtype=dtype,
+                                          shape=(self.chunk_size, *shape))
+                        for name, (shape, dtype) in self.layout.items()}
+
+    def _append(self, state, start):
+        chunk, row = divmod(self.rows, self.chunk_size)
+        if chunk != self._chunk:
+            self._open_chunk(chunk)
+        arrays = self._arrays
+        arrays['observations'][row] = state if self.per_agent else state[0]
+        arrays['valid'][row] = False
+        arrays['starts'][row] = start
+        self.rows += 1
+
+    def start_episode(self, state):
+        """Records the state an episode starts in, a state from FieldEnv.reset."""
+        self._append(state, start=True)
+
+    def add(self, actions, rewards, next_state, done):
+        """Records a step of every agent from the last recorded state."""
+        if self.rows == 0:
+            raise ValueError('start_episode has to record the first state of an episode first.')
+        row = (self.rows - 1) % self.chunk_size
+        arrays = self._arrays
+        arrays['actions'][row] = actions
+        arrays['rewards'][row] = rewards
+        arrays['dones'][row] = done
+        arrays['valid'][row] = True
+        self.transitions += 1
+        self._append(next_state, start=False)
+
+    def flush(self):
+        """Writes the recorded rows and meta.json to disk, the dataset can be read from then on."""
+        if self._arrays is not None:
+            for array in self._arrays.values():
+                array.flush()
+        meta = {'version': VERSION, 'env': self.config, 'chunk_size': self.chunk_size, 'rows': self.rows,
+                'transitions': self.transitions,
+                'layout': {name: [list(shape), dtype] for name, (shape, dtype) in self.layout.items()}}
+        tmp_path = os.path.join(self.path, 'meta.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f, indent=1)
+        os.replace(tmp_path, os.path.join(self.path, 'meta.json'))
+
+    close = flush
+
+
+class OfflineDataset:
+    def __init__(self, path):
+        """Opens the dataset written to the directory path, as read-only memory maps."""
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta['version'] != VERSION:
+            raise ValueError('Unsupported dataset version {}.'.format(meta['version']))
+        self.path = path
+        self.config = meta['env']
+        self.chunk_size = meta['chunk_size']
+        self.rows = meta['rows']
+        self.per_agent = self.config['observation'] == 'egocentric'  # an observation row per agent
+        n_chunks = -(-self.rows // self.chunk_size)
+        self.chunks = [{name: np.load(_chunk_path(path, name, chunk), mmap_mode='r') for name in meta['layout']}
+                       for chunk in range(n_chunks)]
+        self.valid = self._column('valid')
+        self.dones = self._column('dones')
+        self.transition_rows = np.flatnonzero(self.valid)  # the row of every transition, in recorded order
+
+    def __len__(self):
+        return len(self.transition_rows)
+
+    def _column(self, name):
+        """A whole per-row array, small enough to keep in memory for the flags."""
+        return np.concatenate([chunk[name] for chunk in self.chunks])[:self.rows]
+
+    def gather(self, name, rows):
+        """Reads the rows of one of the arrays, from as many chunks as they fall in."""
+        chunks, offsets = np.divmod(rows, self.chunk_size)
+        if len(rows) > 0 and chunks.min() == chunks.max():
+            return self.chunks[chunks[0]][name][offsets]
+        first = self.chunks[0][name]
+        out = np.empty((len(rows), *first.shape[1:]), dtype=first.dtype)
+        for chunk in np.unique(chunks):
+            mask = chunks == chunk
+            out[mask] = self.chunks[chunk][name][offsets[mask]]
+        return out
+
+    def check_env(self, env):
+        if self.config != _env_config(env):
+            raise ValueError('The dataset was recorded in {}, not {}.'.format(self.config, _env_config(env)))
+
+    def memory(self, agent_index, np_random=None):
+        return OfflineMemory(self, agent_index, np_random)
+
+
+class OfflineMemory:
+    """The transitions of one agent of an OfflineDataset, sampled like a ReplayMemory."""
+
+    def __init__(self, dataset, agent_index, np_random=None):
+        self.dataset = dataset
+        self.agent_index = agent_index
+        self.np_random = np.random.default_rng() if np_random is None else np_random
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def sample_indices(self, batch_size):
+        if len(self) == 0:
+            raise ValueError('The dataset holds no transition.')
+        return self.np_random.integers(len(self), size=batch_size)
+
+    def sample(self, batch_size):
+        return self.transitions(self.sample_indices(batch_size))
+
+    def _states(self, rows):
+        states = self.dataset.gather('observations', rows)
+        return states[:, self.agent_index] if self.dataset.per_agent else states
+
+    def _rewards(self, rows):
+        return self.dataset.gather('rewards', rows)[:, self.agent_index]
+
+    def transitions(self, indices):
+        rows = self.dataset.transition_rows[indices]
+        return (self._states(rows), self.dataset.gather('actions', rows)[:, self.agent_index], self._rewards(rows),
+                self._states(rows + 1), self.dataset.dones[rows])
+
+    def n_step_transitions(self, indices, n_step, gamma):
+        """See ReplayMemory.n_step_transitions, windows end with the episode or its recorded steps."""
+        dataset = self.dataset
+        rows = dataset.transition_rows[indices]
+        last = rows.copy()
+        returns = self._rewards(rows).astype(np.float64)
+        discounts = np.full(len(rows), gamma, dtype=np.float64)
+        open_ = ~dataset.dones[last]
+        for _ in range(n_step - 1):
+            # the following row always continues the episode of a transition, if it holds a transition itself
+            grow = open_ & dataset.valid[last + 1]
+            if not grow.any():
+                break
+            last[grow] += 1
+            returns[grow] += discounts[grow] * self._rewards(last[grow])
+            discounts[grow] *= gamma
+            open_ = grow & ~dataset.dones[last]
+        return (self._states(rows), dataset.gather('actions', rows)[:, self.agent_index], returns.astype(np.float32),
+                self._states(last + 1), dataset.dones[last], discounts.astype(np.float32))
+
+
+def train_offline(env, dataset, updates, batch_size=32, agents=None, n_step=1, double_dqn=False,
+                  target_sync_every=None, target_tau=1.0):
+    """
+    Trains the agents of env, all of them unless given the indices of some, with updates replays each on
+    minibatches of dataset, an OfflineDataset recorded in the same configuration of env. Their replay memories are
+    left as they were.
+    """
+    dataset.check_env(env)
+    all_agents = env.get_agents()
+    indices = range(len(all_agents)) if agents is None else agents
+    memories = {}
+    for i in indices:
+        agent = all_agents[i]
+        memories[i] = agent.memory
+        agent.memory = dataset.memory(i, agent.np_random)
+        agent.n_step = n_step
+        agent.double_dqn = double_dqn
+        agent.target_sync_every = target_sync_every
+        agent.target_tau = target_tau
+    try:
+        for _ in range(updates):
+            for i in indices:
+                all_agents[i].replay(batch_size)
+    finally:
+        for i, memory in memories.items():
+            all_agents[i].memory = memory
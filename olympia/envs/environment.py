@@ -9,20 +9,41 @@ In the field state:
 - GREEN (0,1,0) represents players on team 2
 - GREY (.9,.9,.9) represents a goal
 - WHITE (1,1,1) represents a wall
+The field state is drawn from an integer occupancy grid (see cells.py), which is what the game rules look at.
 """
 
 import sys
-from contextlib import closing
 import numpy as np
 from numpy import zeros, array
+from .checkpoint import Checkpointer, load_checkpoint
+from .cells import CELL_EMPTY, CELL_WALL, CELL_GOAL, CELL_BALL, CELL_TEAMS, CELL_PLAYERS, COLORS
 from .grid_objects import Agent, Ball
-from .training_schemes import scheme
-import random
+from .policy import BatchedPolicy
+from .rendering import field_to_grid, grid_to_text, play
+from .training_schemes import initial_positions
 import gym
-import curses
 import time
 
 
+def static_grid(shape):
+    """Returns the occupancy grid of an empty field of the given shape with its walls and goals."""
+    grid = zeros(shape=shape, dtype=np.int8)
+    grid[0, :] = CELL_WALL  # left wall
+    grid[:, 0] = CELL_WALL  # bottom wall
+    grid[shape[0] - 1, :] = CELL_WALL  # right wall
+    grid[:, shape[1] - 1] = CELL_WALL  # top wall
+    bot = int(shape[1] / 4) + 1
+    top = int(shape[1] / 4 + shape[1] / 2)
+    grid[0, bot:top] = CELL_GOAL  # left goal
+    grid[shape[0] - 1, bot:top] = CELL_GOAL  # right goal
+    return grid
+
+
+def static_field(shape):
+    """Returns an empty field of the given shape with its walls and goals drawn."""
+    return COLORS[static_grid(shape)]
+
+
 class FieldEnv(gym.Env):
     FIELD = array([0, 0, 0])
     TEAM1 = array([255, 0, 0])
@@ -31,36 +52,81 @@ class FieldEnv(gym.Env):
     WALL = array([255, 255, 255])
     GOAL = array([250, 250, 250])
 
-    def __init__(self, agent_type='RAM', shape=(21, 15), training_level='one_player'):
+    # observation modes of each agent type, the first is the default
+    OBSERVATIONS = {'RAM': ('coordinates', 'normalized'), 'RGB': ('rgb', 'codes', 'egocentric')}
+
+    def __init__(self, agent_type='RAM', shape=(21, 15), training_level='one_player', seed=None, memory_size=2000,
+                 share_frames=False, observation=None, frame_stack=1, view_radius=3):
+        """
+        observation: what output() returns, one of OBSERVATIONS[agent_type]:
+            'coordinates': ball and player positions.
+            'normalized': the same positions as float32 in [0, 1], written into a preallocated buffer.
+            'rgb': the RGB field state.
+            'codes': the occupancy grid as a single channel, one byte per cell instead of three.
+            'egocentric': for every agent the codes of the cells at most view_radius away from it, off the field
+                cells are walls. output() then has a row per agent, see agent_observation.
+        frame_stack: number of consecutive observations output() concatenates along the last axis, oldest first.
+        """
+        if agent_type in self.OBSERVATIONS and observation is None:
+            observation = self.OBSERVATIONS[agent_type][0]
+        if observation not in self.OBSERVATIONS.get(agent_type, (observation,)):
+            raise ValueError('Unknown observation {!r} for {} agents.'.format(observation, agent_type))
+        if observation == 'egocentric' and view_radius < 3:
+            raise ValueError('The RGB network needs a view radius of at least 3.')
         self.agent_type = agent_type
+        self.memory_size = memory_size
+        self.share_frames = share_frames
         self.shape = shape
+        self.observation = observation
+        self.frame_stack = frame_stack
+        self.view_radius = view_radius
+        self.per_agent_observation = observation == 'egocentric'
         self._training_level = training_level
-        self.n_teams = len(scheme[self._training_level])
-        n_agents = 0
-        for team in scheme[self._training_level]:
-            n_agents += len(team)
-        self.n_agents = n_agents
+        self._initial_positions = initial_positions(training_level, shape)
+        self.n_teams = len(self._initial_positions)
+        self.n_agents = sum(len(team) for team in self._initial_positions)
         self.n_agents_team = self.n_agents // self.n_teams
-        if agent_type == 'RGB':
-            self.state_size = (*self.shape, 3)
+        if observation == 'rgb':
+            frame_size, self.state_dtype = (*self.shape, 3), np.uint8
+        elif observation == 'codes':
+            frame_size, self.state_dtype = (*self.shape, 1), np.uint8
+        elif observation == 'egocentric':
+            frame_size, self.state_dtype = (2 * view_radius + 1, 2 * view_radius + 1, 1), np.uint8
+        elif observation == 'normalized':
+            frame_size, self.state_dtype = (self.n_agents * 2 + 2,), np.float32
         else:
-            self.state_size = (self.n_agents * 2 + 2,)
+            frame_size, self.state_dtype = (self.n_agents * 2 + 2,), np.int16
+        self.frame_size = frame_size
+        self.state_size = (*frame_size[:-1], frame_size[-1] * frame_stack)
         self.ball = Ball(self, (int(shape[0]/2), int(shape[1]/2)))
+        self.__init_observation__()
         self.__init_static_field__()
         self.__init_agents__()
+        self.seed(seed)
         self.reset()
 
     def __init_static_field__(self):
-        self.field = zeros(shape=(*self.shape, 3), dtype=np.uint8)
-        self.field[0, :, :] = 255  # left wall
-        self.field[:, 0, :] = 255  # bottom wall
-        self.field[self.shape[0] - 1, :] = 255  # right wall
-        self.field[:, self.shape[1] - 1, :] = 255  # top wall
-        bot = int(self.shape[1] / 4) + 1
-        top = int(self.shape[1] / 4 + self.shape[1] / 2)
-        self.field[0, bot:top, :] = 250  # left goal
-        self.field[self.shape[0] - 1, bot:top, :] = 250  # right goal
-        self._static_field = self.field.copy()  # never add objects to this field
+        self._static_grid = static_grid(self.shape)  # never add objects to this grid
+        self.grid = self._static_grid.copy()
+        self._last_player = np.full(self.shape, -1, dtype=np.int16)  # last player in order on each cell
+        self._dirty_cells = []  # cells of self.grid objects were drawn on
+        self._players_on = None  # indices of the players on each cell, while _add_to_field needs them
+        self._field = static_field(self.shape)
+        self._field_cells = []  # cells of self._field objects were drawn on
+        self._field_synced = True
+
+    def __init_observation__(self):
+        rows = self.n_agents if self.per_agent_observation else 1
+        # the last frame_stack observations, _frames[_frame_index] is the newest
+        self._frames = zeros((self.frame_stack, rows, *self.frame_size), dtype=self.state_dtype)
+        self._frame_index = 0
+        if self.observation == 'normalized':
+            self._observation = zeros((1, *self.frame_size), dtype=np.float32)
+            self._scale = np.tile(1 / (np.array(self.shape, dtype=np.float32) - 1), self.n_agents + 1)
+        elif self.observation == 'egocentric':
+            r = self.view_radius
+            self._padded_grid = np.full((self.shape[0] + 2 * r, self.shape[1] + 2 * r), CELL_WALL, dtype=np.uint8)
+            self._padded_cells = None  # cells of self._padded_grid objects were drawn on, None before the first copy
 
     def __init_agents__(self):
         self.teams = [[] for _ in range(self.n_teams)]
@@ -68,42 +134,107 @@ class FieldEnv(gym.Env):
             raise ValueError('Teams should be the same size.')
         for i, team in enumerate(self.teams):
             for player in range(self.n_agents_team):
-                init_pos = tuple(int(a * b) for a, b in zip(self.shape, scheme[self._training_level][i][player]))
                 team.append(Agent(env=self, agent_type=self.agent_type, 
                                   team=i, number=player, 
-                                  initial_position=init_pos))
-
-    def reset(self):
-        """Reset environment to original state."""
-        self.field = self._static_field.copy()
+                                  initial_position=self._initial_positions[i][player],
+                                  memory_size=self.memory_size,
+                                  share_frames=self.share_frames))
+        self._agents = [player for team in self.teams for player in team]
+
+    def seed(self, seed=None):
+        """Seeds the environment and, with streams spawned from the same seed, every agent."""
+        seed_sequence = np.random.SeedSequence(seed)
+        self.np_random = np.random.default_rng(seed_sequence)  # drives spawn offsets and collision tie-breaks
+        for agent, agent_seed in zip(self.get_agents(), seed_sequence.spawn(self.n_agents)):
+            agent.seed(agent_seed)
+        return [seed_sequence.entropy]
+
+    def reset(self, seed=None, out=None):
+        """Reset environment to original state, seeding it first if a seed is given."""
+        if seed is not None:
+            self.seed(seed)
+            self.ball.moving = False  # a seeded episode starts like the first one of a new environment
+            self.ball.movement = []
         self.ball.reset_position()
         for team in self.teams:
             for player in team:
                 player.reset_position()
         self._add_to_field()
-        return self.output()
-
-    def train(self, episodes, batch_size=10, max_timesteps=1000, render=False, load_saved=False, save_models=False):
-        """Trains agents in the environment."""
+        if self.frame_stack > 1:
+            self.observe(out=self._frames[0])
+            self._frames[1:] = self._frames[0]  # the first observation of an episode stands in for the older ones
+            self._frame_index = 0
+        return self.output(out)
+
+    def train(self, episodes, batch_size=10, max_timesteps=1000, render=False, load_saved=False, save_models=False,
+              prioritized_replay=False, policy=None, n_step=1, double_dqn=False, target_sync_every=None,
+              target_tau=1.0, checkpoint_path=None, checkpoint_every=100, recorder=None, profiler=None,
+              learning_team=None, dataset=None, episode_callback=None, checkpoint_extra=None):
+        """
+        Trains agents in the environment, choosing their actions with a BatchedPolicy unless given a policy.
+        load_saved: resume from the checkpoint at checkpoint_path, continuing until episodes episodes were trained.
+        save_models: checkpoint every checkpoint_every episodes and at the end, in a background thread.
+        checkpoint_path: defaults to '<agent_type>_<training_level>.ckpt', see checkpoint.py.
+        recorder: EpisodeRecorder every step is recorded with.
+        profiler: Profiler timing the phases of every episode, see profiling.py.
+        learning_team: the only team whose agents remember transitions and are trained, None to train every team.
+        dataset: DatasetWriter every step is streamed to, see dataset.py.
+        episode_callback: called after every episode with the episode, its length and the reward of the first agent
+            on its last step, training stops once it returns True.
+        checkpoint_extra: called at every checkpoint for JSON data stored in its header, see Curriculum.
+        n_step: number of rewards summed before bootstrapping.
+        double_dqn: bootstrap from the target network's value of the action the online network prefers.
+        target_sync_every: number of replays between updates of a separate target network, None bootstraps from the
+            online network itself.
+        target_tau: fraction of the way the target network moves to the online one on each update, 1.0 for a hard
+            copy and small values with target_sync_every=1 for Polyak averaging.
+        """
         agents = self.get_agents()
-        if load_saved:
+        policy = BatchedPolicy(agents) if policy is None else policy
+        if checkpoint_path is None:
+            checkpoint_path = '{}_{}.ckpt'.format(self.agent_type, self._training_level)
+        start_episode = load_checkpoint(self, checkpoint_path) if load_saved else 0
+        checkpointer = Checkpointer(self, checkpoint_path, checkpoint_extra) if save_models else None
+        for agent in agents:
+            agent.n_step = n_step
+            agent.double_dqn = double_dqn
+            agent.target_sync_every = target_sync_every
+            agent.target_tau = target_tau
+        if prioritized_replay:
             for agent in agents:
-                agent.load(self.agent_type, self._training_level)
+                agent.prioritize_replay()
+        if profiler is not None:
+            profiler.attach(self, policy)
         start_time = time.time()
         time_done = []
         rewards_done = []
-        for e in range(episodes):
+        # states are written into two alternating buffers so that state still holds the previous observation
+        state_buffer, next_state_buffer = self.output().copy(), self.output().copy()
+        for e in range(start_episode, episodes):
+            if profiler is not None:
+                profiler.start_episode(e)
             done = False
-            state = self.reset()
+            state = self.reset(out=state_buffer)
+            if recorder is not None:
+                recorder.record(self)
+            if dataset is not None:
+                dataset.start_episode(state)
             t = 0
             while not done:
                 t += 1
                 if render:
                     self.render()
-                actions = [agent.choose_action(state) for agent in agents]
-                next_state, rewards, done, _ = self.step(*actions)
-                for agent, action, reward in zip(agents, actions, rewards):       
-                    agent.remember(state, action, reward, next_state, done)
+                actions = policy.choose_actions(self._policy_states(state))[0].tolist()
+                next_state, rewards, done, _ = self.step(*actions, out=next_state_buffer)
+                if recorder is not None:
+                    recorder.record(self, done)
+                if dataset is not None:
+                    dataset.add(actions, rewards, next_state, done)
+                for i, (agent, action, reward) in enumerate(zip(agents, actions, rewards)):
+                    if learning_team is not None and agent.team != learning_team:
+                        continue
+                    agent.remember(self.agent_observation(state, i), action, reward,
+                                   self.agent_observation(next_state, i), done, start=t == 1)
                     if len(agent.memory) > batch_size and not done:
                         agent.replay(batch_size)
                 if t == max_timesteps:
@@ -113,41 +244,110 @@ class FieldEnv(gym.Env):
                     rewards_done.append(rewards[0])
                     print("Episode {}/{} complete. Training steps: {}".format(e+1, episodes, t))
                 state = next_state
-            if e % 100 == 0 and save_models:
-                for agent in agents:
-                    agent.save(e, self.agent_type, self._training_level)
+                state_buffer, next_state_buffer = next_state_buffer, state_buffer
+            if profiler is not None:
+                profiler.end_episode(e, t)
+            stop = episode_callback is not None and episode_callback(e, t, rewards[0])
+            if checkpointer is not None and ((e + 1) % checkpoint_every == 0 or e + 1 == episodes or stop):
+                checkpointer.save(e + 1)
+            if stop:
+                break
+        if checkpointer is not None:
+            checkpointer.wait()
+        if dataset is not None:
+            dataset.flush()
+        if profiler is not None:
+            profiler.detach()
         print("Total training time: {}".format(time.time() - start_time))
         return (time_done, rewards_done)
 
-    def run(self, episodes=3, render=True):
-        """Runs environment with trained agents."""
-        agents = self.get_agents()        
+    def run(self, episodes=3, render=True, policy=None, recorder=None, profiler=None, dataset=None):
+        """
+        Runs environment with trained agents, recording every step with recorder, timing the phases with profiler
+        and streaming the steps to the DatasetWriter dataset if they are given.
+        """
+        policy = BatchedPolicy(self.get_agents()) if policy is None else policy
+        if profiler is not None:
+            profiler.attach(self, policy)
         start_time = time.time()
         for e in range(episodes):
+            if profiler is not None:
+                profiler.start_episode(e)
             done = False
+            t = 0
             state = self.reset()
+            if recorder is not None:
+                recorder.record(self)
+            if dataset is not None:
+                dataset.start_episode(state)
             while not done:
+                t += 1
                 if render:
                     self.render()
-                actions = [agent.choose_action(state) for agent in agents]
-                state, _, done, _ = self.step(*actions)
+                actions = policy.choose_actions(self._policy_states(state))[0].tolist()
+                state, rewards, done, _ = self.step(*actions)
+                if recorder is not None:
+                    recorder.record(self, done)
+                if dataset is not None:
+                    dataset.add(actions, rewards, state, done)
                 if done:
                     print("Episode {}/{} complete. Running time: {}"
                         .format(e, episodes, time.time() - start_time))
-
-    def output(self):
-        raise NotImplementedError('output() not implemented in child class!')
+            if profiler is not None:
+                profiler.end_episode(e, t)
+        if profiler is not None:
+            profiler.detach()
+
+    def output(self, out=None):
+        """Returns the state of the environment, the last frame_stack observations, or writes it into out."""
+        if self.frame_stack == 1:
+            return self.observe(out)
+        if out is None:
+            out = zeros(self._frames.shape[1:-1] + self.state_size[-1:], dtype=self.state_dtype)
+        channels = self.frame_size[-1]
+        for k in range(self.frame_stack):
+            frame = self._frames[(self._frame_index + 1 + k) % self.frame_stack]
+            out[..., k * channels:(k + 1) * channels] = frame
+        return out
+
+    def observe(self, out=None):
+        raise NotImplementedError('observe() not implemented in child class!')
+
+    def agent_observation(self, state, i):
+        """The part of a state from output() agent i acts on, its own row of an egocentric state."""
+        return state[i:i + 1] if self.per_agent_observation else state
+
+    def _policy_states(self, state):
+        """A state from output() as the batch of one state a Policy takes."""
+        return state[np.newaxis] if self.per_agent_observation else state
 
     def get_agents(self):
-        return [player for team in self.teams for player in team ]
+        """All players, team by team, the order actions and states list them in."""
+        return self._agents
+
+    @property
+    def field(self):
+        """RGB field state, drawn from the occupancy grid when it is read."""
+        if not self._field_synced:
+            for x, y in self._field_cells:
+                self._field[x, y] = COLORS[self._static_grid[x, y]]
+            for x, y in self._dirty_cells:
+                self._field[x, y] = COLORS[self.grid[x, y]]
+            self._field_cells = list(self._dirty_cells)
+            self._field_synced = True
+        return self._field
+
+    def _cell(self, pos):
+        """Returns the grid code at pos, positions off the field wrap around."""
+        x, y = pos.tolist()
+        return self.grid.item(x % self.shape[0], y % self.shape[1])
 
     def _player_at(self, pos):
-        return bool(self._same_pixel(self.field[pos[0], pos[1]], self.TEAM1) or
-                    self._same_pixel(self.field[pos[0], pos[1]], self.TEAM2))
+        return self._cell(pos) in CELL_TEAMS
 
     def _wall_beside(self, position):
-        x = self._same_pixel(self.field[position[0], self.ball.position[1]], self.WALL)
-        y = self._same_pixel(self.field[self.ball.position[0], position[1]], self.WALL)
+        x = bool(self.grid[position[0], self.ball.position[1]] == CELL_WALL)
+        y = bool(self.grid[self.ball.position[0], position[1]] == CELL_WALL)
         return x, y
 
     def _same_position(self, pos1, pos2):
@@ -160,9 +360,11 @@ class FieldEnv(gym.Env):
     def check_walls(self, move): 
         new_pos = self.ball.position + move
         inter_pos = self.ball.position + move // 2
-        wall_close = self._same_pixel(self.field[inter_pos[0], inter_pos[1]], self.WALL)
-        goal_close = self._same_pixel(self.field[inter_pos[0], inter_pos[1]], self.GOAL)
-        wall_far = self._same_pixel(self.field[new_pos[0], new_pos[1]], self.WALL) if not (wall_close or goal_close) else True
+        # a ball knocked into a wall can be thrown off the field from there, _cell wraps such positions around
+        inter_cell = self._cell(inter_pos)
+        wall_close = inter_cell == CELL_WALL
+        goal_close = inter_cell == CELL_GOAL
+        wall_far = self._cell(new_pos) == CELL_WALL if not (wall_close or goal_close) else True
 
         if wall_close:
             new_pos = self.ball.position.copy()
@@ -174,13 +376,13 @@ class FieldEnv(gym.Env):
         return inter_pos, new_pos
 
     def _interception(self, pos):
-        for team in self.teams:
-            for player in team:
-                if self._same_position(player.position, pos):
-                    player.has_ball = True
-                    player.move_counter = 3
-                    self.ball.moving = False
-                    self.ball.position = player.position.copy()
+        pos = pos.tolist()
+        for player in self._agents:
+            if player.position.tolist() == pos:
+                player.has_ball = True
+                player.move_counter = 3
+                self.ball.moving = False
+                self.ball.position = player.position.copy()
 
     def move_ball(self):
         move = self.ball.movement.pop()
@@ -199,19 +401,18 @@ class FieldEnv(gym.Env):
             new_pos[0] = self.shape[0]-1 if new_pos[0] >= self.shape[0] else new_pos[0]
             self.ball.position = new_pos.copy()
 
-    def step(self, *actions):
+    def step(self, *actions, out=None):
         winning_team = None
         done = False
         # move players
-        for i, team in enumerate(self.teams):
-            for j, player in enumerate(team):
-                player_ndx = int(i * len(team) + j)
-                player.act(actions[player_ndx])
+        for player, action in zip(self._agents, actions):
+            player.act(action)
         # move ball
         if self.ball.moving:
             self.move_ball()
         # check for ball in net
-        if self._same_pixel(self._static_field[self.ball.position[0], self.ball.position[1]], self.GOAL):
+        ball_x, ball_y = self.ball.position % self.shape
+        if self._static_grid.item(ball_x, ball_y) == CELL_GOAL:
             done = True
             if self.ball.position[0] == 0:
                 winning_team = 0
@@ -229,31 +430,64 @@ class FieldEnv(gym.Env):
                     for _ in range(self.n_agents_team):
                         rewards.append(-100)
         self._add_to_field()
-        return self.output(), rewards, done, None
-
-    def _check_overlapping_players(self, player):
-        if (self.field[player.position[0], player.position[1], :] == 255).any():  # player occupying same pos.
-            other_player = None
-            for j, position in enumerate(self.get_player_positions()):
-                if self._same_position(position, player.position):
-                    other_player = self.teams[j // self.n_agents_team][j % self.n_agents_team]
-            moved_player = random.choice((player, other_player))  # choose one of them to move
+        if self.frame_stack > 1:
+            self._frame_index = (self._frame_index + 1) % self.frame_stack
+            self.observe(out=self._frames[self._frame_index])
+        return self.output(out), rewards, done, None
+
+    def _check_overlapping_players(self, player, i):
+        x, y = player.position.tolist()
+        code = self.grid.item(x, y)
+        if code in (CELL_WALL, CELL_BALL) or code & CELL_PLAYERS:  # player occupying same pos.
+            players = self.get_agents()
+            other = self._last_player.item(x, y)
+            moved = (i, other)[self.np_random.integers(2)]  # choose one of them to move
+            moved_player = players[moved]
+            old_cell = tuple(moved_player.position.tolist())
             moved_player.position = moved_player.prev_position.copy()
-            self.field[moved_player.position[0], moved_player.position[1], moved_player.team] = 255
-            self.field[player.position[0], player.position[1], moved_player.team] = 0
+            new_x, new_y = moved_player.position.tolist()
+            self._last_player[new_x, new_y] = max(self._last_player.item(new_x, new_y), moved)
+            if self._players_on is not None:
+                self._players_on[old_cell].remove(moved)
+                self._players_on.setdefault((new_x, new_y), []).append(moved)
+            if moved != i:
+                # a third player between the two on the same cell is rare, the players on every cell are only
+                # indexed the first time one has to be looked for in a step
+                if self._players_on is None:
+                    self._players_on = {}
+                    for j, other_player in enumerate(players):
+                        self._players_on.setdefault(tuple(other_player.position.tolist()), []).append(j)
+                self._last_player[x, y] = max([j for j in self._players_on[(x, y)] if i < j < moved] + [i])
+            team_cell = CELL_TEAMS[moved_player.team]
+            self.grid[new_x, new_y] = self.grid.item(new_x, new_y) | team_cell
+            x, y = player.position.tolist()
+            self.grid[x, y] = self.grid.item(x, y) & ~team_cell
+            self._dirty_cells.append((new_x, new_y))
             if moved_player.has_ball:
                 moved_player.has_ball = False
                 moved_player.move_counter = -1
 
     def _add_to_field(self):
-        self.field = self._static_field.copy()
-        for i,team in enumerate(self.teams):
-            for player in team:
-                self._check_overlapping_players(player)
-                self.field[player.position[0], player.position[1], i] = 255  # teams are red and green
-        if self._same_pixel(self.field[self.ball.position[0], self.ball.position[1]], self.FIELD)\
-                or self._same_pixel(self.field[self.ball.position[0], self.ball.position[1]], self.GOAL):
-            self.field[self.ball.position[0], self.ball.position[1], :] = self.BALL
+        # only the cells objects were drawn on last time are cleared, the rest of the grid is already static
+        for x, y in self._dirty_cells:
+            self.grid[x, y] = self._static_grid[x, y]
+            self._last_player[x, y] = -1
+        self._dirty_cells = []
+        self._players_on = None
+        players = self.get_agents()
+        for i, player in enumerate(players):
+            x, y = player.position.tolist()
+            self._last_player[x, y] = i
+            self._dirty_cells.append((x, y))
+        for i, player in enumerate(players):
+            self._check_overlapping_players(player, i)
+            x, y = player.position.tolist()
+            self.grid[x, y] = self.grid.item(x, y) | CELL_TEAMS[player.team]
+        ball_x, ball_y = self.ball.position % self.shape
+        if self.grid.item(ball_x, ball_y) in (CELL_EMPTY, CELL_GOAL):
+            self.grid[ball_x, ball_y] = CELL_BALL
+            self._dirty_cells.append((ball_x, ball_y))
+        self._field_synced = False
 
     def get_player_positions(self):
         agents = []
@@ -262,68 +496,99 @@ class FieldEnv(gym.Env):
         return [agent.position.copy() for agent in agents]
 
     def render(self, mode='human', field=None, scr=None, final=False):
-        if field is None:
-            field = self.field
-            inplace = False
-        else:
-            inplace = True
-
-        outfile = sys.stdout
-        string = '\n' if not final else '(Done)\n'
-        for y in range(field.shape[1]-1, -1, -1):
-            for x in range(field.shape[0]):
-                val = field[x, y]
-                if self._same_pixel(val, self.FIELD):
-                    string += '   '
-                elif self._same_pixel(val, self.TEAM1):
-                    string += ' 1 '
-                elif self._same_pixel(val, self.TEAM2):
-                    string += ' 2 '
-                elif self._same_pixel(val, self.BALL):
-                    string += ' o '
-                elif self._same_pixel(val, self.WALL):
-                    string += ' x '
-                elif self._same_pixel(val, self.GOAL):
-                    string += ' | '
-                else:
-                    raise ValueError()
-            string += '\n'
-        string += '\n'
-
-        if inplace:
+        """
+        Draws the field, or a given RGB field state, as text: written to stdout in 'human' mode, to the curses
+        window scr if one is given and returned as a string in any other mode.
+        """
+        grid = self.grid if field is None else field_to_grid(field)
+        string = ('\n' if not final else '(Done)\n') + grid_to_text(grid) + '\n'
+        if scr is not None:
             scr.addstr(0, 0, string)
             scr.refresh()
-            time.sleep(0.5)
+        elif mode == 'human':
+            sys.stdout.write(string)
         else:
-            outfile.write(string)
-
-        if mode != 'human':
-            with closing(outfile):
-                return outfile.getvalue()
+            return string
 
-    def render_episode(self, episode):
-        stdscr = curses.initscr()
-        curses.noecho()
-        curses.cbreak()
-        for field, done in episode:
-            self.render(field=field, scr=stdscr, final=done)
-        curses.echo()
-        curses.nocbreak()
-        curses.endwin()
+    def render_episode(self, episode, rate=2.0):
+        """Plays a list of (field, done) at rate frames per second, see EpisodeRecorder for a compact recording."""
+        play((self.render(mode='ansi', field=field, final=done) for field, done in episode), rate)
 
 
 class OlympiaRGB(FieldEnv):
     def __init__(self, **kwargs):
         super(OlympiaRGB, self).__init__(agent_type='RGB', **kwargs)
 
-    def output(self):
-        return np.reshape(self.field.copy(), (1, *self.field.shape))
+    def observe(self, out=None):
+        """
+        Returns a read-only view of the field, or of the grid for 'codes', that follows the environment, or copies
+        it into out. Egocentric windows are always copies.
+        """
+        if self.observation == 'egocentric':
+            return self._egocentric(out)
+        if self.observation == 'codes':
+            if out is not None:
+                out[0, ..., 0] = self.grid
+                return out
+            state = self.grid.view(np.uint8)[np.newaxis, ..., np.newaxis]
+        else:
+            if out is not None:
+                out[0] = self.field
+                return out
+            state = self.field[np.newaxis]
+        state.flags.writeable = False
+        return state
+
+    def _egocentric(self, out=None):
+        if out is None:
+            out = zeros((self.n_agents, *self.frame_size), dtype=np.uint8)
+        r = self.view_radius
+        padded = self._padded_grid
+        if self._padded_cells is None:
+            padded[r:-r, r:-r] = self.grid
+        elif self._padded_cells is not self._dirty_cells:  # _add_to_field starts a new list whenever it draws
+            for x, y in self._padded_cells:
+                padded[x + r, y + r] = self._static_grid.item(x, y)
+            for x, y in self._dirty_cells:
+                padded[x + r, y + r] = self.grid.item(x, y)
+        self._padded_cells = self._dirty_cells
+        size = 2 * r + 1
+        for i, agent in enumerate(self._agents):
+            x, y = agent.position.tolist()  # the window of the padded grid at x, y is centred on the agent
+            out[i, ..., 0] = padded[x:x + size, y:y + size]
+        return out
 
 
 class OlympiaRAM(FieldEnv):
     def __init__(self, **kwargs):
         super(OlympiaRAM, self).__init__(agent_type='RAM', **kwargs)
 
-    def output(self):
-        return array([[*self.ball.position.copy()] + [coord for pos in self.get_player_positions() for coord in pos]])
-
+    def observe(self, out=None):
+        """
+        Returns the positions, as a new array, or as a read-only view of a buffer the next call overwrites when
+        'normalized', or writes them into out.
+        """
+        if self.observation == 'normalized' or out is not None:
+            buffer = self._observation if out is None else out
+            row = buffer[0]
+            row[:2] = self.ball.position
+            for i, agent in enumerate(self._agents):
+                row[2 + 2 * i:4 + 2 * i] = agent.position
+            if self.observation == 'normalized':
+                row *= self._scale
+            if out is not None:
+                return out
+            state = buffer.view()
+            state.flags.writeable = False
+            return state
+        return array([[*self.ball.position] + [coord for agent in self._agents for coord in agent.position]])
+
+
+ENV_CLASSES = {'RAM': OlympiaRAM, 'RGB': OlympiaRGB}
+
+
+def scoring_team(env, reward):
+    """Team that scored the goal the episode of env ended with, None if it did not end with a goal."""
+    if reward != -100:  # every agent is rewarded -100 for a goal, the side of the ball tells who scored
+        return None
+    return 0 if env.ball.position[0] == 0 else 1
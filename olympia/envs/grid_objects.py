@@ -2,42 +2,42 @@
 Written by Matthew Filipovich and Hugh Morison
 Ball class simulates the ball in the FieldEnv.
 Agent class simulates the behaviour of a learning agent that can be trained through RL in FieldEnv.
+Keras is only imported when the network of an agent is first needed, environments can be used without it.
 """
 
-import random
 import numpy as np
 from numpy import array
-from collections import deque
-from keras.models import Sequential
-from keras.layers import Dense, Conv2D, MaxPooling2D, Flatten
-from keras.optimizers import Adam
+from .cells import CELL_EMPTY, CELL_BALL
+from .inference import NumpyMLP, keras_predict
+from .replay_memory import ReplayMemory, PrioritizedReplayMemory
 
 
 class GridObject:
     def __init__(self, env, initial_position):
         self._initial_position = array(initial_position)
         self.env = env
-        self.reset_position()
+        self.position = self._initial_position.copy()
 
     def reset_position(self):
         self.position = self._initial_position.copy()
 
 
 class Ball(GridObject):
+    _turns_thrown = 3
+    movements = {
+        'RIGHT': [array([2, 0])] * _turns_thrown,
+        'UPRIGHT': [array([2, 2])] * _turns_thrown,
+        'UP': [array([0, 2])] * _turns_thrown,
+        'UPLEFT': [array([-2, 2])] * _turns_thrown,
+        'LEFT': [array([-2, 0])] * _turns_thrown,
+        'DOWNLEFT': [array([-2, -2])] * _turns_thrown,
+        'DOWN': [array([0, -2])] * _turns_thrown,
+        'DOWNRIGHT': [array([2, -2])] * _turns_thrown
+    }
+
     def __init__(self, env, initial_position):
         super(Ball, self).__init__(env, initial_position)
-        self._turns_thrown = 3
         self.moving = False
-        self.movements = {
-            'RIGHT': [array([2, 0])] * self._turns_thrown,
-            'UPRIGHT': [array([2, 2])] * self._turns_thrown,
-            'UP': [array([0, 2])] * self._turns_thrown,
-            'UPLEFT': [array([-2, 2])] * self._turns_thrown,
-            'LEFT': [array([-2, 0])] * self._turns_thrown,
-            'DOWNLEFT': [array([-2, -2])] * self._turns_thrown,
-            'DOWN': [array([0, -2])] * self._turns_thrown,
-            'DOWNRIGHT': [array([2, -2])] * self._turns_thrown
-        }
         self.movement = []
 
     def thrown(self, ndx):
@@ -46,45 +46,71 @@ class Ball(GridObject):
 
 
 class Agent(GridObject):
-    def __init__(self, env, agent_type, team, number, initial_position):
+    actions = {'STAY': array([0, 0]),
+               'RIGHT': array([1, 0]),
+               'UPRIGHT': array([1, 1]),
+               'UP': array([0, 1]),
+               'UPLEFT': array([-1, 1]),
+               'LEFT': array([-1, 0]),
+               'DOWNLEFT': array([-1, -1]),
+               'DOWN': array([0, -1]),
+               'DOWNRIGHT': array([1, -1]),
+               'THROW_RIGHT': array([0, 0]),  # no movement happens on throw actions
+               'THROW_UPRIGHT': array([0, 0]),
+               'THROW_UP': array([0, 0]),
+               'THROW_UPLEFT': array([0, 0]),
+               'THROW_LEFT': array([0, 0]),
+               'THROW_DOWNLEFT': array([0, 0]),
+               'THROW_DOWN': array([0, 0]),
+               'THROW_DOWNRIGHT': array([0, 0])
+               }
+
+    def __init__(self, env, agent_type, team, number, initial_position, memory_size=2000, share_frames=False):
         super().__init__(env, initial_position)
+        if agent_type not in ('RAM', 'RGB'):
+            raise ValueError('Invalid agent type supplied!')
         #Environment Values
         self.agent_type = agent_type
         self.team = team
         self.number = number 
-        self.reset_position()
+        self.reset_position(randomize=False)  # positions are randomized by FieldEnv.reset
         self.file_name = 'agent' + str(self.number) + 'team' + str(self.team)
-        self.actions = {'STAY': array([0, 0]),
-                        'RIGHT': array([1, 0]),
-                        'UPRIGHT': array([1, 1]),
-                        'UP': array([0, 1]),
-                        'UPLEFT': array([-1, 1]),
-                        'LEFT': array([-1, 0]),
-                        'DOWNLEFT': array([-1, -1]),
-                        'DOWN': array([0, -1]),
-                        'DOWNRIGHT': array([1, -1]),
-                        'THROW_RIGHT': array([0, 0]),  # no movement happens on throw actions
-                        'THROW_UPRIGHT': array([0, 0]),
-                        'THROW_UP': array([0, 0]),
-                        'THROW_UPLEFT': array([0, 0]),
-                        'THROW_LEFT': array([0, 0]),
-                        'THROW_DOWNLEFT': array([0, 0]),
-                        'THROW_DOWN': array([0, 0]),
-                        'THROW_DOWNRIGHT': array([0, 0])
-                        }
         #ANN values
         self.state_size = env.state_size
         self.action_size = len(self.actions)
-        self.memory = deque(maxlen=2000)
+        self.np_random = np.random.default_rng()  # exploration and minibatches, FieldEnv.seed seeds it
+        self.memory = ReplayMemory(memory_size, self.state_size, env.state_dtype,
+                                   share_frames=share_frames, np_random=self.np_random)
         self.gamma = 1.0    
         self.epsilon = 1.0  
         self.epsilon_min = 0.005
         self.epsilon_decay = 0.995
         self.learning_rate = 0.001
-        self.model = self._build_model()
+        # bootstrapping, see replay: without target_sync_every the online network bootstraps from itself
+        self.n_step = 1
+        self.double_dqn = False
+        self.target_sync_every = None
+        self.target_tau = 1.0
+        self._target_model = None
+        self._replays = 0
+        # RAM networks are small enough to evaluate faster with NumPy than with a Keras call, see inference.py
+        self.backend = 'numpy' if agent_type == 'RAM' else 'keras'
+        self._model = None
+        self._numpy_model = None
+        self._numpy_synced = False
+
+    @property
+    def model(self):
+        """Keras model of the agent, built the first time it is used."""
+        if self._model is None:
+            self._model = self._build_model()
+        return self._model
 
     def _build_model(self):
         """Neural Net for Deep-Q learning Model."""
+        from keras.models import Sequential
+        from keras.layers import Dense, Conv2D, MaxPooling2D, Flatten
+        from keras.optimizers import Adam
         model = Sequential()
         if self.agent_type == 'RAM':
             model.add(Dense(24, input_shape=self.state_size, activation='relu'))
@@ -100,20 +126,68 @@ class Agent(GridObject):
             raise ValueError('Invalid agent type supplied!')
         model.compile(loss='mse', optimizer=Adam(lr=self.learning_rate))
         return model
+
+    def q_values(self, states):
+        """Q-values of a batch of states, shaped (n_states, n_actions), computed by the backend of the agent."""
+        if self.backend == 'numpy':
+            if self._numpy_model is None:
+                self._numpy_model = NumpyMLP.from_model(self.model)
+            elif not self._numpy_synced:
+                self._numpy_model.sync(self.model)
+            self._numpy_synced = True
+            return self._numpy_model.predict(states)
+        return keras_predict(self.model, states)
+
+    def set_weights(self, weights):
+        self.model.set_weights(weights)
+        self._numpy_synced = False
+
+    def target_q_values(self, states):
+        """Q-values of the target network, the online network itself unless target_sync_every is set."""
+        if self.target_sync_every is None:
+            return self.q_values(states)
+        if self._target_model is None or isinstance(self._target_model, NumpyMLP) != (self.backend == 'numpy'):
+            self._target_model = self._build_target_model()
+        if self.backend == 'numpy':
+            return self._target_model.predict(states)
+        return keras_predict(self._target_model, states)
+
+    def _build_target_model(self):
+        if self.backend == 'numpy':
+            return NumpyMLP.from_model(self.model)
+        from keras.models import clone_model
+        target_model = clone_model(self.model)
+        target_model.set_weights(self.model.get_weights())
+        return target_model
+
+    def update_target(self):
+        """Moves the target network target_tau of the way to the online network, 1.0 copies it."""
+        if self._target_model is None:
+            self._target_model = self._build_target_model()
+            return
+        weights = self.model.get_weights()
+        if self.target_tau < 1.0:
+            weights = [self.target_tau * w + (1 - self.target_tau) * t
+                       for w, t in zip(weights, self._target_model.get_weights())]
+        self._target_model.set_weights(weights)
     
+    def seed(self, seed=None):
+        self.np_random = np.random.default_rng(seed)
+        self.memory.np_random = self.np_random
+
     def reset_position(self, randomize=True):
-        x = random.randrange(-1, 2) if randomize else 0
-        y = random.randrange(-1, 2) if randomize else 0
+        x = self.env.np_random.integers(-1, 2) if randomize else 0
+        y = self.env.np_random.integers(-1, 2) if randomize else 0
         self.position = array([self._initial_position[0] + x, self._initial_position[1] + y])
         self.has_ball = False
         self.move_counter = -1
         self.prev_position = None
 
     def choose_action(self, state):
-        if np.random.rand() <= self.epsilon:
-            return random.randrange(self.action_size)
-        action_q = self.model.predict(state)
-        return np.argmax(action_q[0])  
+        if self.np_random.random() <= self.epsilon:
+            return int(self.np_random.integers(self.action_size))
+        action_q = self.q_values(state)
+        return np.argmax(action_q[0])
 
     def act(self, ndx):
         moving_tiles = 1 <= ndx <= 8
@@ -121,8 +195,8 @@ class Agent(GridObject):
         if ndx <= 8:  # movement action
             movement = list(self.actions.values())[ndx]
             new_pos = self.position + movement
-            space = self.env.field[new_pos[0], new_pos[1]]
-            if not (space >= 250).any():  # greater than 250 is wall, net, players or ball
+            space = self.env.grid.item(*new_pos.tolist())
+            if space == CELL_EMPTY:  # anything else is wall, net, players or ball
                 if self.has_ball:
                     if self.move_counter > 0:
                         self.move_counter -= 1
@@ -131,7 +205,7 @@ class Agent(GridObject):
                 else:
                     self.position += movement
             else:
-                if (self.env.field[new_pos[0], new_pos[1]] == array([0, 0, 255])).all():
+                if space == CELL_BALL:
                     self.position += movement
                     self.has_ball = True
                     self.move_counter = 3
@@ -141,24 +215,56 @@ class Agent(GridObject):
                 self.move_counter = -1
                 self.env.ball.thrown(ndx-9)
 
-    def remember(self, state, action, reward, next_state, done):
-        self.memory.append((state.copy(), action, reward, next_state.copy(), done))
+    def prioritize_replay(self, **kwargs):
+        """Switches memory to prioritized replay, keeping the transitions stored so far."""
+        if not isinstance(self.memory, PrioritizedReplayMemory):
+            self.memory = PrioritizedReplayMemory.from_memory(self.memory, **kwargs)
+
+    def remember(self, state, action, reward, next_state, done, start=False):
+        """start: the transition is the first of an episode."""
+        self.memory.append(state, action, reward, next_state, done, start=start)
 
     def replay(self, batch_size):
-        minibatch = random.sample(self.memory, batch_size)
-        for state, action, reward, next_state, done in minibatch:
-            target = reward
-            if not done:
-                target = (reward + self.gamma *
-                          np.amax(self.model.predict(next_state)[0]))
-            target_f = self.model.predict(state)
-            target_f[0][action] = target
-            self.model.fit(state, target_f, epochs=1, verbose=0)
+        """
+        Performs one gradient update on a minibatch sampled from memory. The targets are n_step returns bootstrapped
+        from the target network, with the action the online network prefers when double_dqn is set, and the target
+        network follows the online one every target_sync_every replays.
+        """
+        prioritized = isinstance(self.memory, PrioritizedReplayMemory)
+        indices = self.memory.sample_indices(batch_size)
+        states, actions, returns, next_states, dones, discounts = self.memory.n_step_transitions(
+            indices, self.n_step, self.gamma)
+        # forward passes on the whole minibatch at once
+        next_q = self.target_q_values(next_states)
+        if self.double_dqn:
+            next_q = next_q[np.arange(batch_size), np.argmax(self.q_values(next_states), axis=1)]
+        else:
+            next_q = np.amax(next_q, axis=1)
+        targets = returns + discounts * next_q * ~dones
+        target_f = self.q_values(states)
+        if prioritized:
+            # weighted by the probabilities the minibatch was drawn with, before its priorities change
+            sample_weight = self.memory.importance_weights(indices)
+            self.memory.update_priorities(indices, targets - target_f[np.arange(batch_size), actions])
+        else:
+            sample_weight = None
+        target_f[np.arange(batch_size), actions] = targets
+        self.fit(states, target_f, sample_weight)
+        self._replays += 1
+        if self.target_sync_every is not None and self._replays % self.target_sync_every == 0:
+            self.update_target()
         if self.epsilon > self.epsilon_min:
             self.epsilon *= self.epsilon_decay
 
+    def fit(self, states, targets, sample_weight=None):
+        """One gradient update of the online network towards the Q-value targets of a batch of states."""
+        self.model.train_on_batch(states, targets, sample_weight=sample_weight)
+        self._numpy_synced = False
+
     def load(self, episode, model, level):
         self.model.load_weights(model+'_'+level+'_'+self.file_name+'_ep'+str(episode+1)+'.h5')
+        self._numpy_synced = False
+        self._target_model = None  # starts again from the loaded weights
 
     def save(self, episode, model, level):
         self.model.save_weights(model+'_'+level+'_'+self.file_name+'_ep'+str(episode+1)+'.h5')
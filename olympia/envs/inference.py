@@ -0,0 +1,70 @@
+"""
+NumpyMLP evaluates a Keras network made only of Dense layers with plain NumPy matmuls. For the small RAM network of
+an agent the overhead of a Keras call is orders of magnitude larger than the math, so acting and the forward passes
+of replay use a NumpyMLP copy of the weights, which the agent resyncs after every change to its Keras model.
+keras_predict evaluates the networks that stay on Keras.
+"""
+
+import numpy as np
+
+ACTIVATIONS = {
+    'linear': None,
+    'relu': lambda x: np.maximum(x, 0, out=x),
+}
+
+
+class NumpyMLP:
+    def __init__(self, weights, activations):
+        """
+        weights: [kernel, bias, kernel, bias, ...] as returned by the get_weights() of a Keras model of Dense layers.
+        activations: name of the activation of each layer, one of ACTIVATIONS.
+        """
+        for activation in activations:
+            if activation not in ACTIVATIONS:
+                raise ValueError('Unsupported activation {!r}.'.format(activation))
+        self.activations = [ACTIVATIONS[activation] for activation in activations]
+        self.set_weights(weights)
+
+    @classmethod
+    def from_model(cls, model):
+        activations = []
+        for layer in model.layers:
+            if type(layer).__name__ != 'Dense':
+                raise ValueError('NumpyMLP only evaluates Dense layers, got {}.'.format(type(layer).__name__))
+            activations.append(layer.get_config()['activation'])
+        return cls(model.get_weights(), activations)
+
+    def set_weights(self, weights):
+        if len(weights) != 2 * len(self.activations):
+            raise ValueError('Expected a kernel and a bias for each of the {} layers.'.format(len(self.activations)))
+        self.kernels = [np.asarray(w, dtype=np.float32) for w in weights[0::2]]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in weights[1::2]]
+
+    def get_weights(self):
+        return [w for layer in zip(self.kernels, self.biases) for w in layer]
+
+    def sync(self, model):
+        """Copies the current weights of the Keras model the MLP was made from."""
+        self.set_weights(model.get_weights())
+
+    def predict(self, states):
+        """Q-values of one state, shaped (n_inputs,), or of a batch of them, shaped (n_states, n_inputs)."""
+        states = np.asarray(states)
+        x = states.reshape(-1, states.shape[-1]).astype(np.float32)
+        for kernel, bias, activation in zip(self.kernels, self.biases, self.activations):
+            x = x @ kernel
+            x += bias
+            if activation is not None:
+                activation(x)
+        return x.reshape(states.shape[:-1] + x.shape[1:])
+
+
+def keras_predict(model, states):
+    """
+    Outputs of a Keras model for a batch of states as NumPy arrays, a list of them for a model with several outputs.
+    Calling the model directly skips the per-call setup of predict, which dominates for small batches.
+    """
+    outputs = model(states, training=False)
+    if isinstance(outputs, (list, tuple)):
+        return [np.array(output) for output in outputs]
+    return np.array(outputs)
@@ -0,0 +1,232 @@
+"""
+Self-play: one team learns while the other plays frozen snapshots of the learning team taken earlier in training.
+
+A snapshot plays the other side of the field the way it learned to play its own: Mirror shows the opponents the
+field flipped left to right with the teams swapped, and their actions are flipped back. Opponents only ever run a
+forward pass, so the gradient updates of an episode are those of the learning team alone.
+
+League keeps a pool of snapshots with Elo ratings. Every training episode is played against a snapshot drawn with a
+preference for those the learning team is expected to do worst against, and updates the ratings of both. evaluate
+plays matches between snapshots in worker processes to rate the pool against itself.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from numpy import zeros
+from .cells import CELL_TEAMS
+from .environment import ENV_CLASSES, scoring_team
+from .grid_objects import Agent
+from .parallel import worker_context
+from .policy import Policy, BatchedPolicy
+
+
+def _mirrored_action(name):
+    return name.replace('RIGHT', '#').replace('LEFT', 'RIGHT').replace('#', 'LEFT')
+
+
+# MIRRORED_ACTIONS[a] moves or throws the other way along x
+MIRRORED_ACTIONS = np.array([list(Agent.actions).index(_mirrored_action(name)) for name in Agent.actions])
+# SWAPPED_CODES[code] is the occupancy code with the players of the two teams swapped
+SWAPPED_CODES = np.array([code & ~(CELL_TEAMS[0] | CELL_TEAMS[1]) | (CELL_TEAMS[1] if code & CELL_TEAMS[0] else 0) |
+                          (CELL_TEAMS[0] if code & CELL_TEAMS[1] else 0) for code in range(16)], dtype=np.uint8)
+
+
+class Mirror:
+    """The states of env as the other team sees them, with the field flipped left to right and the teams swapped."""
+
+    def __init__(self, env):
+        self.env = env
+        if env.agent_type == 'RAM':
+            # ball, then the players of the team the state is shown to, then those of the other one
+            per_team = 2 * env.n_agents_team
+            frame = [0, 1] + list(range(2 + per_team, 2 + 2 * per_team)) + list(range(2, 2 + per_team))
+            size = env.frame_size[0]
+            self._columns = [offset + c for offset in range(0, env.state_size[0], size) for c in frame]
+            self._x_columns = np.arange(0, env.state_size[0], 2)
+            self._x_max = 1.0 if env.observation == 'normalized' else env.shape[0] - 1
+        elif env.observation == 'rgb':
+            self._channels = [c + [1, 0, 2][c % 3] - c % 3 for c in range(env.state_size[-1])]  # red and green
+
+    def __call__(self, states):
+        """states: (n_states, *state_size), or (n_states, n_agents, *state_size) for egocentric observations."""
+        env = self.env
+        if env.agent_type == 'RAM':
+            mirrored = states[:, self._columns]
+            mirrored[:, self._x_columns] = self._x_max - mirrored[:, self._x_columns]
+            return mirrored
+        x_axis = 2 if env.per_agent_observation else 1
+        flipped = np.flip(states, axis=x_axis)
+        if env.observation == 'rgb':
+            return flipped[..., self._channels]
+        return SWAPPED_CODES[flipped]
+
+
+class SelfPlayPolicy(Policy):
+    """
+    Chooses the actions of the learning team with a BatchedPolicy and those of the other team with a BatchedPolicy
+    of its agents on mirrored states, mirroring their actions back.
+    """
+
+    def __init__(self, env, learning_team=0):
+        super(SelfPlayPolicy, self).__init__(env.get_agents())
+        self.env = env
+        self.learning_team = learning_team
+        self._learners = [i for i, agent in enumerate(self.agents) if agent.team == learning_team]
+        self._opponents = [i for i, agent in enumerate(self.agents) if agent.team != learning_team]
+        self.learners = BatchedPolicy([self.agents[i] for i in self._learners])
+        self.opponents = BatchedPolicy([self.agents[i] for i in self._opponents])
+        self.mirror = Mirror(env)
+
+    def choose_actions(self, states):
+        learner_states, opponent_states = states, states
+        if self.env.per_agent_observation:
+            learner_states, opponent_states = states[:, self._learners], states[:, self._opponents]
+        actions = zeros((len(states), len(self.agents)), dtype=np.int64)
+        actions[:, self._learners] = self.learners.choose_actions(learner_states)
+        actions[:, self._opponents] = MIRRORED_ACTIONS[self.opponents.choose_actions(self.mirror(opponent_states))]
+        return actions
+
+
+def expected_score(rating, other_rating):
+    """Elo expectation of the score of a player rated rating against one rated other_rating."""
+    return 1 / (1 + 10 ** ((other_rating - rating) / 400))
+
+
+def _load_team(env, team, weights, epsilon):
+    """Gives every agent of the team the snapshot weights of its number."""
+    for agent in env.get_agents():
+        if agent.team == team:
+            agent.set_weights(weights[agent.number])
+            agent.epsilon = epsilon
+
+
+def _episode_score(env, policy, learning_team, max_timesteps):
+    """Plays an episode and returns the score of learning_team: 1 for a goal, 0 for a goal against, 0.5 if none."""
+    state = env.reset()
+    for _ in range(max_timesteps):
+        state, rewards, done, _ = env.step(*policy.choose_actions(env._policy_states(state))[0].tolist())
+        if done:
+            return float(scoring_team(env, rewards[0]) == learning_team)
+    return 0.5
+
+
+def play_match(env_config, weights, other_weights, games, max_timesteps=200, epsilon=0.0, seed=None):
+    """
+    Plays games episodes between two snapshots in a new environment made from env_config, the first on the side of
+    team 0, and returns the total score of the first.
+    """
+    env_config = dict(env_config)
+    env = ENV_CLASSES[env_config.pop('agent_type')](seed=seed, memory_size=1, **env_config)
+    _load_team(env, 0, weights, epsilon)
+    _load_team(env, 1, other_weights, epsilon)
+    policy = SelfPlayPolicy(env, learning_team=0)
+    return sum(_episode_score(env, policy, 0, max_timesteps) for _ in range(games))
+
+
+class League:
+    def __init__(self, env, learning_team=0, snapshot_every=20, pool_size=10, opponent_epsilon=0.05, k_factor=32,
+                 initial_rating=1000.0, seed=None):
+        """
+        snapshot_every: number of training episodes between snapshots of the learning team.
+        pool_size: number of snapshots kept, the oldest are dropped first.
+        opponent_epsilon: exploration of the snapshots while they play, so that they do not replay one game.
+        k_factor: largest change of a rating from one game.
+        """
+        if env.n_teams != 2:
+            raise ValueError('Self-play needs a level with two teams.')
+        self.env = env
+        self.learning_team = learning_team
+        self.opponent_team = 1 - learning_team
+        self.snapshot_every = snapshot_every
+        self.pool_size = pool_size
+        self.opponent_epsilon = opponent_epsilon
+        self.k_factor = k_factor
+        self.rating = initial_rating  # of the learning team as it is now
+        self.snapshots = []  # dicts of the episode, the weights of every player number and the rating
+        self.episodes = 0
+        self.history = []  # the snapshot episode, score and length of every training episode
+        self.policy = SelfPlayPolicy(env, learning_team)
+        self.np_random = np.random.default_rng(seed)
+        self._opponent = None  # the snapshot the opponent team plays
+        self.snapshot()
+
+    def snapshot(self):
+        """Adds the learning team as it is now to the pool, starting at its current rating."""
+        weights = {agent.number: agent.model.get_weights() for agent in self.env.get_agents()
+                   if agent.team == self.learning_team}
+        self.snapshots.append({'episode': self.episodes, 'weights': weights, 'rating': self.rating})
+        del self.snapshots[:-self.pool_size]
+
+    def sample_opponent(self):
+        """Index of a snapshot, drawn with the learning team's expected loss against each as its weight."""
+        losses = np.array([1 - expected_score(self.rating, snapshot['rating']) for snapshot in self.snapshots])
+        return self.np_random.choice(len(self.snapshots), p=losses / losses.sum())
+
+    def _update_ratings(self, snapshot, score, games=1):
+        change = self.k_factor * (score - games * expected_score(self.rating, snapshot['rating']))
+        self.rating += change
+        snapshot['rating'] -= change
+
+    def _load_opponent(self):
+        """Draws a snapshot from the pool and loads it into the opponent team for the next episode."""
+        self._opponent = self.snapshots[self.sample_opponent()]
+        _load_team(self.env, self.opponent_team, self._opponent['weights'], self.opponent_epsilon)
+
+    def _end_episode(self, length, reward):
+        """Rates the episode played against the loaded opponent and returns the score of the learning team."""
+        team = scoring_team(self.env, reward)
+        score = 0.5 if team is None else float(team == self.learning_team)
+        self._update_ratings(self._opponent, score)
+        self.history.append({'opponent': self._opponent['episode'], 'score': score, 'length': length})
+        self.episodes += 1
+        if self.episodes % self.snapshot_every == 0:
+            self.snapshot()
+        return score
+
+    def train(self, episodes, **train_kwargs):
+        """
+        Trains the learning team for episodes episodes against snapshots from the pool, in one FieldEnv.train, and
+        returns the score of every episode. train_kwargs are passed on to FieldEnv.train, such as batch_size or
+        max_timesteps, except for its checkpoints, which hold neither the pool nor the ratings.
+        """
+        for key in ('load_saved', 'save_models', 'checkpoint_path'):
+            if key in train_kwargs:
+                raise ValueError('League does not checkpoint its pool, {} is not supported.'.format(key))
+        scores = []
+        if episodes == 0:
+            return scores
+
+        def end_episode(episode, length, reward):
+            scores.append(self._end_episode(length, reward))
+            if episode + 1 < episodes:
+                self._load_opponent()
+
+        self._load_opponent()
+        self.env.train(episodes, policy=self.policy, learning_team=self.learning_team, episode_callback=end_episode,
+                       **train_kwargs)
+        return scores
+
+    def evaluate(self, games=10, n_workers=2, max_timesteps=200):
+        """
+        Plays games episodes between every pair of snapshots, in n_workers processes or in this one if n_workers
+        is 0, and updates their ratings. Returns the matrix of the mean score of each snapshot against each other.
+        """
+        env = self.env
+        env_config = {'agent_type': env.agent_type, 'shape': env.shape, 'training_level': env._training_level,
+                      'observation': env.observation, 'frame_stack': env.frame_stack, 'view_radius': env.view_radius}
+        pairs = [(i, j) for i in range(len(self.snapshots)) for j in range(len(self.snapshots)) if i != j]
+        args = [(env_config, self.snapshots[i]['weights'], self.snapshots[j]['weights'], games, max_timesteps,
+                 self.opponent_epsilon, k) for k, (i, j) in enumerate(pairs)]
+        if n_workers == 0:
+            totals = [play_match(*match) for match in args]
+        else:
+            with ProcessPoolExecutor(n_workers, mp_context=worker_context()) as executor:
+                totals = list(executor.map(play_match, *zip(*args)))
+        scores = np.full((len(self.snapshots), len(self.snapshots)), np.nan)
+        for (i, j), total in zip(pairs, totals):
+            scores[i, j] = total / games
+            change = self.k_factor * (total - games * expected_score(self.snapshots[i]['rating'],
+                                                                     self.snapshots[j]['rating']))
+            self.snapshots[i]['rating'] += change
+            self.snapshots[j]['rating'] -= change
+        return scores
@@ -0,0 +1,93 @@
+"""
+MultiAgentOlympia puts a FieldEnv behind the Gymnasium interface, which gym 0.26 shares: reset returns the
+observation and an info dict, step takes the actions of every agent at once and returns the observation, a reward
+per agent, terminated, truncated and an info dict, and the observation and action spaces describe what the agents
+see and do. gym's AsyncVectorEnv can therefore run it, stacking the rewards into (n_envs, n_agents), while gym 0.26's
+SyncVectorEnv expects a single reward. make_async_pool runs a pool of them in subprocesses that write their
+observations into shared memory, so that stepping them overlaps with the learner's work between step_async and
+step_wait.
+"""
+
+from functools import partial
+import gym
+import numpy as np
+from gym import spaces
+from .cells import CELL_PLAYERS, CELL_BALL
+from .environment import ENV_CLASSES, scoring_team
+from .parallel import worker_context
+
+
+def observation_space(env):
+    """The space of the observations of env, with a leading axis of agents for egocentric observations."""
+    shape = (env.n_agents, *env.state_size) if env.per_agent_observation else env.state_size
+    if env.agent_type == 'RGB':
+        high = 255 if env.observation == 'rgb' else CELL_PLAYERS | CELL_BALL
+        return spaces.Box(0, high, shape=shape, dtype=env.state_dtype)
+    # a ball thrown from a wall can leave the field for a few steps, by less than the size of the field
+    size = np.tile(np.array(env.shape, dtype=np.float32), (env.state_size[0] // 2))
+    low, high = -size, 2 * size - 1
+    if env.observation == 'normalized':
+        scale = np.tile(env._scale, env.frame_stack)
+        low, high = low * scale, high * scale
+    return spaces.Box(low.astype(env.state_dtype), high.astype(env.state_dtype), dtype=env.state_dtype)
+
+
+class MultiAgentOlympia(gym.Env):
+    metadata = {'render_modes': ['human', 'ansi']}
+
+    def __init__(self, agent_type='RAM', max_episode_steps=None, render_mode=None, **env_kwargs):
+        """
+        max_episode_steps: number of steps after which an episode is truncated, None to only end it with a goal.
+        env_kwargs: passed on to OlympiaRAM or OlympiaRGB, such as shape, training_level or observation. The
+            agents are driven from outside, so their replay memories hold a single transition unless memory_size
+            is given.
+        """
+        if agent_type not in ENV_CLASSES:
+            raise ValueError('Invalid agent type supplied!')
+        env_kwargs.setdefault('memory_size', 1)
+        self.env = ENV_CLASSES[agent_type](**env_kwargs)
+        self.n_agents = self.env.n_agents
+        self.max_episode_steps = max_episode_steps
+        self.render_mode = render_mode
+        self.observation_space = observation_space(self.env)
+        self.action_space = spaces.MultiDiscrete([len(self.env.get_agents()[0].actions)] * self.n_agents)
+        self._timestep = 0
+
+    def _observation(self, state):
+        # views of the field follow the environment, the caller gets a copy of its own
+        state = state if self.env.per_agent_observation else state[0]
+        return np.array(state, dtype=self.observation_space.dtype)
+
+    def reset(self, *, seed=None, options=None):
+        super(MultiAgentOlympia, self).reset(seed=seed)
+        self._timestep = 0
+        return self._observation(self.env.reset(seed=seed)), {'timestep': 0}
+
+    def step(self, actions):
+        """
+        Takes the actions of every agent, in the order of FieldEnv.get_agents. info holds the timestep and, once a
+        goal ended the episode, the team that scored it.
+        """
+        state, rewards, terminated, _ = self.env.step(*np.asarray(actions).tolist())
+        self._timestep += 1
+        truncated = not terminated and self.max_episode_steps is not None and self._timestep >= self.max_episode_steps
+        info = {'timestep': self._timestep}
+        if terminated:
+            info['winning_team'] = scoring_team(self.env, rewards[0])
+        return self._observation(state), np.array(rewards, dtype=np.float32), terminated, truncated, info
+
+    def render(self):
+        if self.render_mode is not None:
+            return self.env.render(mode=self.render_mode)
+
+
+def make_async_pool(n_envs, agent_type='RAM', copy=True, **kwargs):
+    """
+    Returns a gym AsyncVectorEnv stepping n_envs MultiAgentOlympia in subprocesses, created with the keyword
+    arguments of MultiAgentOlympia, which write their observations into shared memory instead of pickling them.
+    Finished episodes are reset automatically. The workers are started like those of ParallelTrainer.
+    copy: return a copy of the observations, False to return the shared buffer the next step overwrites.
+    """
+    env_fns = [partial(MultiAgentOlympia, agent_type, **kwargs) for _ in range(n_envs)]
+    return gym.vector.AsyncVectorEnv(env_fns, shared_memory=True, copy=copy,
+                                     context=worker_context().get_start_method())
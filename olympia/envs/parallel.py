@@ -0,0 +1,245 @@
+"""
+Parallel training: a pool of worker processes plays episodes in their own environments with periodically
+synced copies of the agents and streams the transitions back through shared memory to the learner, which
+owns the replay memories and performs every update.
+"""
+
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from .policy import BatchedPolicy
+
+
+def worker_context():
+    """The multiprocessing context worker processes are started with: spawn, as TensorFlow does not survive a fork."""
+    return mp.get_context('spawn')
+
+
+class TransitionBuffer:
+    """
+    Ring of environment steps in shared memory with a single writer (a worker) and a single reader (the
+    learner). The writer never overwrites a step the reader has not collected yet.
+    """
+    _ALIGNMENT = 64
+
+    def __init__(self, slots, state_size, n_agents, dtype, name=None):
+        self.slots = slots
+        layout = [('_counters', (2,), np.int64),  # steps written, steps read
+                  ('states', (slots, *state_size), dtype),
+                  ('next_states', (slots, *state_size), dtype),
+                  ('actions', (slots, n_agents), np.uint8),
+                  ('rewards', (slots, n_agents), np.float32),
+                  ('dones', (slots,), bool),
+                  ('starts', (slots,), bool)]  # the step is the first of an episode
+        sizes = [-(-int(np.prod(shape)) * np.dtype(dt).itemsize // self._ALIGNMENT) * self._ALIGNMENT
+                 for _, shape, dt in layout]
+        self._shm = shared_memory.SharedMemory(name=name, create=name is None, size=sum(sizes))
+        self.name = self._shm.name
+        self._arrays = []
+        offset = 0
+        for (attr, shape, dt), size in zip(layout, sizes):
+            setattr(self, attr, np.ndarray(shape, dtype=dt, buffer=self._shm.buf, offset=offset))
+            self._arrays.append(attr)
+            offset += size
+        if name is None:
+            self._counters[:] = 0
+
+    def put(self, state, actions, rewards, next_state, done, start):
+        """Writes one step, returns False without writing if the reader has fallen a full ring behind."""
+        written, read = self._counters
+        if written - read >= self.slots:
+            return False
+        i = written % self.slots
+        self.states[i] = state[0]
+        self.next_states[i] = next_state[0]
+        self.actions[i] = actions
+        self.rewards[i] = rewards
+        self.dones[i] = done
+        self.starts[i] = start
+        self._counters[0] = written + 1
+        return True
+
+    def get(self):
+        """Returns copies of (states, actions, rewards, next_states, dones, starts) for every step not yet read."""
+        written, read = self._counters
+        indices = np.arange(read, written) % self.slots
+        steps = (self.states[indices], self.actions[indices], self.rewards[indices], self.next_states[indices],
+                 self.dones[indices], self.starts[indices])
+        self._counters[1] = written
+        return steps
+
+    def close(self, unlink=False):
+        for attr in self._arrays:
+            delattr(self, attr)  # the shared memory cannot be closed while arrays still point into it
+        self._arrays = []
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+
+
+def _rollout_worker(env_class, env_kwargs, seed, buffer_args, weights_queue, stop_event, max_timesteps):
+    env = env_class(seed=seed, memory_size=1, **env_kwargs)
+    agents = env.get_agents()
+    policy = BatchedPolicy(agents)  # shares the agents' layers, so synced weights take effect in it too
+    buffer = TransitionBuffer(*buffer_args)
+    state_buffer, next_state_buffer = env.output().copy(), env.output().copy()
+    try:
+        while not stop_event.is_set():
+            state = env.reset(out=state_buffer)
+            for t in range(max_timesteps):
+                _sync_agents(agents, weights_queue)
+                actions = policy.choose_actions(state)[0]
+                next_state, rewards, done, _ = env.step(*actions, out=next_state_buffer)
+                while not buffer.put(state, actions, rewards, next_state, done, t == 0):
+                    if stop_event.is_set():
+                        return
+                    time.sleep(0.001)
+                if done or stop_event.is_set():
+                    break
+                state = next_state
+                state_buffer, next_state_buffer = next_state_buffer, state_buffer
+    finally:
+        buffer.close()
+
+
+def _sync_agents(agents, weights_queue):
+    update = None
+    while True:  # only the most recent weights matter
+        try:
+            update = weights_queue.get_nowait()
+        except queue.Empty:
+            break
+    if update is not None:
+        for agent, (weights, epsilon) in zip(agents, update):
+            agent.set_weights(weights)
+            agent.epsilon = epsilon
+
+
+class ParallelTrainer:
+    """
+    Trains the agents of env with experience collected by n_workers processes. Each worker runs its own
+    instance of type(env) and receives the learner's weights and epsilon every sync_every updates.
+    """
+
+    def __init__(self, env, n_workers, slots=1024, sync_every=50, max_timesteps=1000, seed=None):
+        if env.per_agent_observation:
+            raise ValueError('Workers can only stream states shared by every agent.')
+        self.env = env
+        self.n_workers = n_workers
+        self.slots = slots
+        self.sync_every = sync_every
+        self.max_timesteps = max_timesteps
+        self.seed = seed
+        self._context = worker_context()
+        self._workers = []
+        self._buffers = []
+        self._weights_queues = []
+        self._stop_event = None
+        self._last_buffer = None  # the buffer the steps remembered last came from
+        self._owed_updates = 0.0  # the fraction of an update the transitions collected so far are owed
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self):
+        if self._workers:
+            return
+        env = self.env
+        env_kwargs = {'shape': env.shape, 'training_level': env._training_level, 'observation': env.observation,
+                      'frame_stack': env.frame_stack, 'view_radius': env.view_radius}
+        dtype = env.state_dtype
+        self._stop_event = self._context.Event()
+        for i in range(self.n_workers):
+            buffer = TransitionBuffer(self.slots, env.state_size, env.n_agents, dtype)
+            weights_queue = self._context.Queue()
+            seed = None if self.seed is None else self.seed + i
+            worker = self._context.Process(
+                target=_rollout_worker, daemon=True,
+                args=(type(env), env_kwargs, seed, (self.slots, env.state_size, env.n_agents, dtype, buffer.name),
+                      weights_queue, self._stop_event, self.max_timesteps))
+            worker.start()
+            self._buffers.append(buffer)
+            self._weights_queues.append(weights_queue)
+            self._workers.append(worker)
+        self.sync_weights()
+
+    def sync_weights(self):
+        update = [(agent.model.get_weights(), agent.epsilon) for agent in self.env.get_agents()]
+        for weights_queue in self._weights_queues:
+            weights_queue.put(update)
+
+    def collect(self):
+        """Moves every step the workers have written into the agents' memories, returns how many there were."""
+        agents = self.env.get_agents()
+        collected = 0
+        for buffer in self._buffers:
+            states, actions, rewards, next_states, dones, starts = buffer.get()
+            if len(dones) == 0:
+                continue
+            if buffer is not self._last_buffer:
+                # the steps remembered last are those of another worker, the first ones here cannot continue them
+                starts[0] = True
+                self._last_buffer = buffer
+            for i, agent in enumerate(agents):
+                agent.memory.extend(states, actions[:, i], rewards[:, i], next_states, dones, starts)
+            collected += len(dones)
+        return collected
+
+    def train(self, transitions, batch_size=10, learn=True, replay_ratio=1.0):
+        """
+        Trains until the workers have produced the given number of transitions, returns transitions/sec and
+        updates/sec, an update being a replay of every agent.
+        replay_ratio: updates per collected transition, 1.0 updates as often as FieldEnv.train does, whatever the
+            number of workers.
+        """
+        self.start()
+        agents = self.env.get_agents()
+        collected = 0
+        updates = 0
+        start_time = time.time()
+        while collected < transitions:
+            new_transitions = self.collect()
+            collected += new_transitions
+            if new_transitions == 0:
+                for worker in self._workers:
+                    if not worker.is_alive():
+                        raise RuntimeError('Rollout worker exited with code {}'.format(worker.exitcode))
+                time.sleep(0.001)
+                continue
+            if learn:
+                self._owed_updates += new_transitions * replay_ratio
+                for _ in range(int(self._owed_updates)):
+                    for agent in agents:
+                        if len(agent.memory) > batch_size:
+                            agent.replay(batch_size)
+                    updates += 1
+                    if updates % self.sync_every == 0:
+                        self.sync_weights()
+                self._owed_updates -= int(self._owed_updates)
+        seconds = time.time() - start_time
+        return collected / seconds, updates / seconds
+
+    def close(self, timeout=10):
+        """Stops the workers and releases the shared memory."""
+        if self._stop_event is not None:
+            self._stop_event.set()
+        for worker in self._workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        for weights_queue in self._weights_queues:
+            weights_queue.close()
+            weights_queue.cancel_join_thread()  # weights a stopped worker never read are dropped
+        for buffer in self._buffers:
+            buffer.close(unlink=True)
+        self._workers = []
+        self._buffers = []
+        self._weights_queues = []
+        self._last_buffer = None
@@ -0,0 +1,128 @@
+"""
+A Policy chooses the actions of a list of agents for a batch of states, one per environment. FieldEnv.train and
+FieldEnv.run take any Policy.
+
+RandomPolicy needs no network at all. BatchedPolicy fuses the Keras agents whose networks share an architecture into
+one model with a head per agent, so that the Q-values of all of them, for any number of states, come from one forward
+pass instead of one model.predict on a single state per agent. Agents with the NumPy backend are evaluated by their
+own q_values, which is cheaper still.
+
+fill_memory plays random actions to give an agent transitions to replay without any policy.
+"""
+
+import json
+import numpy as np
+from numpy import zeros
+from .inference import keras_predict
+
+
+def _architecture(model):
+    """The layers of a Keras model and their configuration, without the names Keras makes unique to each model."""
+    return json.dumps([(type(layer).__name__,
+                        {key: value for key, value in layer.get_config().items() if key != 'name'})
+                       for layer in model.layers], sort_keys=True, default=str)
+
+
+class Policy:
+    def __init__(self, agents):
+        self.agents = list(agents)
+
+    def choose_actions(self, states):
+        """Returns the actions of every agent for each of the states, shaped (n_states, n_agents)."""
+        raise NotImplementedError('choose_actions() not implemented in child class!')
+
+
+class RandomPolicy(Policy):
+    """Uniformly random actions, drawn from the generator of each agent."""
+
+    def choose_actions(self, states):
+        actions = zeros((len(states), len(self.agents)), dtype=np.int64)
+        for k in range(len(states)):
+            for i, agent in enumerate(self.agents):
+                actions[k, i] = agent.np_random.integers(agent.action_size)
+        return actions
+
+
+def fill_memory(env, agent, steps, seed=None):
+    """
+    Steps env with uniformly random actions for all of its agents, drawn from a generator seeded with seed,
+    remembering every transition of agent and resetting env whenever an episode ends.
+    """
+    i = env.get_agents().index(agent)
+    # observations can be views of a buffer the next step overwrites, see FieldEnv.train
+    state_buffer, next_state_buffer = env.output().copy(), env.output().copy()
+    state = env.reset(out=state_buffer)
+    for actions in np.random.default_rng(seed).integers(agent.action_size, size=(steps, env.n_agents)):
+        next_state, rewards, done, _ = env.step(*actions, out=next_state_buffer)
+        agent.remember(env.agent_observation(state, i), actions[i], rewards[i], env.agent_observation(next_state, i),
+                       done)
+        state_buffer, next_state_buffer = next_state_buffer, state_buffer
+        state = env.reset(out=state_buffer) if done else next_state
+
+
+class BatchedPolicy(Policy):
+    def __init__(self, agents):
+        super(BatchedPolicy, self).__init__(agents)
+        self._groups = None  # built when Q-values are first needed, until then no network is touched
+
+    def _fuse_models(self):
+        from keras.layers import Input
+        from keras.models import Model
+        groups = {}
+        for i, agent in enumerate(self.agents):
+            if agent.backend == 'keras':
+                groups.setdefault(_architecture(agent.model), []).append(i)
+        self._groups = []
+        for indices in groups.values():
+            models = [self.agents[i].model for i in indices]
+            if len(models) == 1:
+                fused = models[0]
+            else:
+                # calling the agents' models on a shared input reuses their layers, training them updates this too
+                inputs = Input(shape=models[0].input_shape[1:])
+                fused = Model(inputs, [model(inputs) for model in models])
+            self._groups.append((indices, fused))
+
+    def q_values(self, states):
+        """
+        Returns the Q-values of every agent for each of the states, shaped (n_states, n_agents, n_actions). States
+        with a row per agent, egocentric ones, are shaped (n_states, n_agents, *state_size) and every agent is
+        evaluated on its own row.
+        """
+        q_values = np.empty((len(states), len(self.agents), self.agents[0].action_size), dtype=np.float32)
+        if states.ndim == len(self.agents[0].state_size) + 2:
+            for i, agent in enumerate(self.agents):
+                q_values[:, i] = agent.q_values(states[:, i])
+            return q_values
+        if self._groups is None:
+            self._fuse_models()
+        for indices, model in self._groups:
+            outputs = keras_predict(model, states)
+            if len(indices) == 1:
+                outputs = [outputs]
+            for i, output in zip(indices, outputs):
+                q_values[:, i] = output
+        for i, agent in enumerate(self.agents):
+            if agent.backend == 'numpy':
+                q_values[:, i] = agent.q_values(states)
+        return q_values
+
+    def choose_actions(self, states):
+        """
+        Returns the actions of every agent for each of the states, shaped (n_states, n_agents). Every agent draws
+        from its generator exactly as Agent.choose_action would for the states one after the other, so both give
+        the same actions.
+        """
+        actions = zeros((len(states), len(self.agents)), dtype=np.int64)
+        greedy = zeros(actions.shape, dtype=bool)
+        for k in range(len(states)):
+            for i, agent in enumerate(self.agents):
+                if agent.np_random.random() <= agent.epsilon:
+                    actions[k, i] = agent.np_random.integers(agent.action_size)
+                else:
+                    greedy[k, i] = True
+        rows = np.flatnonzero(greedy.any(axis=1))
+        if len(rows) > 0:
+            best = self.q_values(states[rows]).argmax(axis=2)
+            actions[rows] = np.where(greedy[rows], best, actions[rows])
+        return actions
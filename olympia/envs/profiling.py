@@ -0,0 +1,158 @@
+"""
+Timing of the phases of FieldEnv.train and FieldEnv.run.
+
+A Profiler attached to an environment replaces the methods each phase runs in with timed wrappers on those objects
+only, and detaching it removes them again, so an environment trained without a profiler runs exactly the code it
+always did. Timers are inclusive: 'step' contains 'act', 'ball', 'field' and 'observation', 'choose_actions'
+contains 'inference' and 'replay' contains 'sample' and 'gradient', the rest of a replay being the forward passes
+of its targets.
+"""
+
+import cProfile
+import csv
+import json
+import pstats
+import time
+
+# phase: what it times
+PHASES = {
+    'step': 'FieldEnv.step',
+    'act': 'Agent.act of every player',
+    'ball': 'FieldEnv.move_ball',
+    'field': 'FieldEnv._add_to_field, drawing the players and the ball',
+    'observation': 'FieldEnv.output',
+    'choose_actions': 'Policy.choose_actions',
+    'inference': 'BatchedPolicy.q_values',
+    'remember': 'Agent.remember',
+    'replay': 'Agent.replay',
+    'sample': 'drawing a minibatch from the replay memory',
+    'gradient': 'Agent.fit',
+    'render': 'FieldEnv.render',
+}
+
+
+class Profiler:
+    def __init__(self, summary_every=None, trace_path=None, profile_episodes=0, profile_path=None):
+        """
+        summary_every: number of episodes between printed summaries, None to not print any.
+        trace_path: file the time of every phase in every episode is written to on detach, as JSON or, for paths
+            ending in '.csv', as CSV.
+        profile_episodes: number of episodes, from the first one after attach, cProfile runs in.
+        profile_path: file the cProfile statistics are dumped to once those episodes are over.
+        """
+        self.summary_every = summary_every
+        self.trace_path = trace_path
+        self.profile_episodes = profile_episodes
+        self.profile_path = profile_path
+        self.stats = {phase: [0, 0.0] for phase in PHASES}  # calls and seconds
+        self.counters = {'episodes': 0, 'timesteps': 0}
+        self.trace = []
+        self.seconds = 0.0  # wall time of the profiled episodes
+        self._cprofile = None
+        self._profiled = 0
+        self._wrapped = []
+        self._episode_start = None
+        self._episode_totals = None
+
+    def attach(self, env, policy=None):
+        """Times the phases of env, its agents and policy until detach."""
+        if self._wrapped:
+            raise RuntimeError('The profiler is already attached.')
+        for attr, phase in [('step', 'step'), ('move_ball', 'ball'), ('_add_to_field', 'field'),
+                            ('output', 'observation'), ('render', 'render')]:
+            self._wrap(env, attr, phase)
+        for agent in env.get_agents():
+            for attr, phase in [('act', 'act'), ('remember', 'remember'), ('replay', 'replay'), ('fit', 'gradient')]:
+                self._wrap(agent, attr, phase)
+            for attr in ['sample_indices', 'n_step_transitions']:
+                self._wrap(agent.memory, attr, 'sample')
+        if policy is not None:
+            self._wrap(policy, 'choose_actions', 'choose_actions')
+            if hasattr(policy, 'q_values'):
+                self._wrap(policy, 'q_values', 'inference')
+
+    def _wrap(self, obj, attr, phase):
+        fn = getattr(obj, attr)
+        stats = self.stats[phase]
+        perf_counter = time.perf_counter
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stats[0] += 1
+                stats[1] += perf_counter() - start
+
+        self._wrapped.append((obj, attr, vars(obj).get(attr)))
+        setattr(obj, attr, timed)
+
+    def detach(self):
+        """Restores the methods attach wrapped and writes the trace."""
+        for obj, attr, original in reversed(self._wrapped):
+            if original is None:
+                delattr(obj, attr)
+            else:
+                setattr(obj, attr, original)
+        self._wrapped = []
+        self._stop_cprofile()
+        if self.trace_path is not None:
+            self.save_trace(self.trace_path)
+
+    def start_episode(self, episode):
+        if self._profiled < self.profile_episodes:
+            if self._cprofile is None:
+                self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        self._episode_totals = [seconds for _, seconds in self.stats.values()]
+        self._episode_start = time.perf_counter()
+
+    def end_episode(self, episode, timesteps):
+        """Adds the episode to the trace, printing a summary every summary_every episodes."""
+        seconds = time.perf_counter() - self._episode_start
+        if self._cprofile is not None and self._profiled < self.profile_episodes:
+            self._cprofile.disable()
+            self._profiled += 1
+            if self._profiled == self.profile_episodes:
+                self._stop_cprofile()
+        self.seconds += seconds
+        self.counters['episodes'] += 1
+        self.counters['timesteps'] += timesteps
+        row = {'episode': episode, 'timesteps': timesteps, 'seconds': seconds}
+        for (phase, (_, total)), before in zip(self.stats.items(), self._episode_totals):
+            row[phase] = total - before
+        self.trace.append(row)
+        if self.summary_every and self.counters['episodes'] % self.summary_every == 0:
+            print(self.summary())
+
+    def _stop_cprofile(self):
+        if self._cprofile is not None and self.profile_path is not None:
+            self._cprofile.dump_stats(self.profile_path)
+            self.profile_path = None  # dumped once, when the profiled episodes are over
+
+    def profile_stats(self):
+        """pstats.Stats of the episodes cProfile ran in, None if it did not run."""
+        return None if self._cprofile is None else pstats.Stats(self._cprofile)
+
+    def summary(self):
+        """The calls, total and mean time of every phase that ran and its share of the profiled episodes."""
+        lines = ['{} episodes, {} timesteps, {:.2f} s'.format(self.counters['episodes'], self.counters['timesteps'],
+                                                           self.seconds),
+                 '{:>15} {:>10} {:>10} {:>10} {:>8}'.format('phase', 'calls', 'total s', 'mean us', 'share')]
+        for phase, (calls, seconds) in self.stats.items():
+            if calls:
+                lines.append('{:>15} {:>10} {:>10.3f} {:>10.1f} {:>7.1f}%'.format(
+                    phase, calls, seconds, seconds / calls * 1e6, 100 * seconds / max(self.seconds, 1e-12)))
+        return '\n'.join(lines)
+
+    def save_trace(self, path):
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=['episode', 'timesteps', 'seconds', *PHASES])
+                writer.writeheader()
+                writer.writerows(self.trace)
+        else:
+            with open(path, 'w') as f:
+                json.dump({'phases': PHASES, 'episodes': self.trace,
+                           'totals': {phase: {'calls': calls, 'seconds': seconds}
+                                      for phase, (calls, seconds) in self.stats.items()}}, f, indent=1)
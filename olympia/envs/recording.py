@@ -0,0 +1,78 @@
+"""
+ActionLog keeps the seed and the actions of an episode. Since a seeded FieldEnv is deterministic, playing the
+actions again after reset(seed=seed) reproduces the episode exactly, which makes a log a compact regression test
+for changes to the environment: a few bytes per step instead of a copy of the field.
+"""
+
+import hashlib
+import numpy as np
+
+
+def _game_state(env, rewards, done):
+    """Every value that decides how the game continues, as one array."""
+    ball = env.ball
+    state = [*ball.position, ball.moving, len(ball.movement), *rewards, done]
+    for player in env.get_agents():
+        state += [*player.position, player.has_ball, player.move_counter]
+    return np.array(state, dtype=np.int64)
+
+
+class ActionLog:
+    def __init__(self, seed, shape, training_level, actions=None, digest=None):
+        """
+        seed: seed the episode was started with by reset(seed=seed), required as an episode started without one
+            cannot be played again.
+        actions: list with the actions of every agent for each step.
+        digest: SHA-1 of the game states the episode went through, see replay.
+        """
+        if seed is None:
+            raise ValueError('Only an episode started with a seed can be replayed, a log needs its seed.')
+        self.seed = int(seed)
+        self.shape = tuple(shape)
+        self.training_level = training_level
+        self.actions = [] if actions is None else [[int(a) for a in step] for step in actions]
+        self.digest = digest
+
+    def __len__(self):
+        return len(self.actions)
+
+    @classmethod
+    def record(cls, env, seed, max_timesteps=1000):
+        """Plays an episode of env with its agents' choose_action and returns the log of it."""
+        log = cls(seed, env.shape, env._training_level)
+        agents = env.get_agents()
+        digest = hashlib.sha1()
+        state = env.reset(seed=seed)
+        for _ in range(max_timesteps):
+            actions = [agent.choose_action(env.agent_observation(state, i)) for i, agent in enumerate(agents)]
+            state, rewards, done, _ = env.step(*actions)
+            log.actions.append([int(a) for a in actions])
+            digest.update(_game_state(env, rewards, done).tobytes())
+            if done:
+                break
+        log.digest = digest.hexdigest()
+        return log
+
+    def replay(self, env):
+        """Plays the logged actions in env and returns the digest of the game states, equal to self.digest if the
+        episode was reproduced exactly."""
+        if tuple(env.shape) != self.shape or env._training_level != self.training_level:
+            raise ValueError('The log was recorded on a {} field at level {}.'.format(self.shape,
+                                                                                      self.training_level))
+        digest = hashlib.sha1()
+        env.reset(seed=self.seed)
+        for actions in self.actions:
+            _, rewards, done, _ = env.step(*actions)
+            digest.update(_game_state(env, rewards, done).tobytes())
+        return digest.hexdigest()
+
+    def save(self, path):
+        np.savez_compressed(path, seed=self.seed, shape=self.shape, training_level=self.training_level,
+                            actions=np.array(self.actions, dtype=np.uint8).reshape(len(self), -1),
+                            digest=self.digest)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(int(data['seed']), data['shape'], str(data['training_level']), actions=data['actions'],
+                       digest=str(data['digest']))
@@ -0,0 +1,131 @@
+"""
+Text rendering of the field and recording of episodes.
+
+Every cell is drawn with the characters CELL_CHARS holds for its occupancy code, so turning a grid into text is one
+lookup for the whole field followed by joining the rows. EpisodeRecorder keeps only the positions of the ball and
+of the players for every step, a few bytes instead of a copy of the field, and rebuilds the grids when an episode is
+played back.
+"""
+
+import curses
+import sys
+import time
+import numpy as np
+from numpy import zeros
+from .cells import CELL_EMPTY, CELL_GOAL, CELL_BALL, CELL_TEAMS, CELL_PLAYERS, COLORS
+
+
+def _cell_chars():
+    chars = np.empty(16, dtype='<U3')
+    for code in range(len(chars)):
+        chars[code] = ['   ', ' x ', ' | ', ' o '][code & 3]
+        if code & CELL_PLAYERS == CELL_PLAYERS:
+            chars[code] = ' X '  # players of both teams on one cell
+        elif code & CELL_PLAYERS:
+            chars[code] = ' 1 ' if code & CELL_TEAMS[0] else ' 2 '
+    return chars
+
+
+CELL_CHARS = _cell_chars()
+# COLORS packed into single integers, sorted, with the lowest code of each colour, to read codes back from a field
+_COLOR_KEYS, _KEY_CODES = np.unique(COLORS.astype(np.int64) @ [1 << 16, 1 << 8, 1], return_index=True)
+
+
+def grid_to_text(grid):
+    """Returns the field of an occupancy grid as text, one line per row with the top row first."""
+    rows = CELL_CHARS[grid[:, ::-1].T]
+    return ''.join(''.join(row) + '\n' for row in rows.tolist())
+
+
+def field_to_grid(field):
+    """Returns the occupancy grid an RGB field state was drawn from."""
+    keys = field.astype(np.int64) @ [1 << 16, 1 << 8, 1]
+    indices = np.minimum(np.searchsorted(_COLOR_KEYS, keys), len(_COLOR_KEYS) - 1)
+    if not (_COLOR_KEYS[indices] == keys).all():
+        raise ValueError('The field holds a colour no cell is drawn with.')
+    return _KEY_CODES[indices].astype(np.int8)
+
+
+def draw_grid(static_grid, ball_position, player_positions, teams):
+    """Returns the occupancy grid with the players and the ball drawn on static_grid, as FieldEnv draws them."""
+    grid = static_grid.copy()
+    for (x, y), team in zip(player_positions.tolist(), teams):
+        grid[x, y] |= CELL_TEAMS[team]
+    x, y = (ball_position % grid.shape).tolist()
+    if grid[x, y] in (CELL_EMPTY, CELL_GOAL):
+        grid[x, y] = CELL_BALL
+    return grid
+
+
+def play(frames, rate=2.0, scr=None):
+    """
+    Shows the text frames at rate frames per second, in the curses window scr or, if there is none, in a
+    curses window of its own when stdout is a terminal and as plain text otherwise.
+    """
+    if scr is None and sys.stdout.isatty():
+        curses.wrapper(lambda stdscr: play(frames, rate, stdscr))
+        return
+    for frame in frames:
+        if scr is not None:
+            scr.addstr(0, 0, frame)
+            scr.refresh()
+        else:
+            sys.stdout.write(frame)
+        if rate:
+            time.sleep(1 / rate)
+
+
+class EpisodeRecorder:
+    def __init__(self, env=None, shape=None, teams=None):
+        """Records the episodes of env, or holds loaded ones for a field of the given shape and player teams."""
+        if env is not None:
+            shape = env.shape
+            teams = [agent.team for agent in env.get_agents()]
+        self.shape = tuple(shape)
+        self.teams = list(teams)
+        self.positions = []  # ball and players for every step, shaped (n_players + 1, 2)
+        self.dones = []
+
+    def __len__(self):
+        return len(self.positions)
+
+    def record(self, env, done=False):
+        """Records the current state of env, call it after reset and after every step."""
+        positions = zeros((len(self.teams) + 1, 2), dtype=np.int16)
+        positions[0] = env.ball.position
+        for i, agent in enumerate(env.get_agents()):
+            positions[i + 1] = agent.position
+        self.positions.append(positions)
+        self.dones.append(bool(done))
+
+    def clear(self):
+        self.positions = []
+        self.dones = []
+
+    def grids(self):
+        """Yields the occupancy grid of every recorded step."""
+        from .environment import static_grid  # the environment imports this module
+        static = static_grid(self.shape)
+        for positions in self.positions:
+            yield draw_grid(static, positions[0], positions[1:], self.teams)
+
+    def frames(self):
+        """Yields every recorded step as text, the way FieldEnv.render shows it."""
+        for grid, done in zip(self.grids(), self.dones):
+            yield ('(Done)\n' if done else '\n') + grid_to_text(grid) + '\n'
+
+    def play(self, rate=2.0, scr=None):
+        play(self.frames(), rate, scr)
+
+    def save(self, path):
+        np.savez_compressed(path, shape=self.shape, teams=self.teams,
+                            positions=np.array(self.positions, dtype=np.int16).reshape(len(self), -1, 2),
+                            dones=np.array(self.dones, dtype=bool))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            recorder = cls(shape=data['shape'], teams=data['teams'].tolist())
+            recorder.positions = list(data['positions'])
+            recorder.dones = data['dones'].tolist()
+        return recorder
@@ -0,0 +1,326 @@
+"""
+ReplayMemory stores the transitions of an Agent in preallocated NumPy arrays used as a ring buffer.
+Appending is O(1) and minibatches are drawn with a single vectorized index sample. Every transition records whether
+the next one continues its episode, as told by the start flag of the next one, so that n-step returns can be computed
+from consecutive transitions.
+"""
+
+import numpy as np
+from numpy import zeros
+
+
+class ReplayMemory:
+    def __init__(self, capacity, state_size, dtype, share_frames=False, np_random=None):
+        """
+        capacity: number of transitions kept before the oldest ones are overwritten.
+        state_size: shape of a single state, without the leading batch dimension.
+        dtype: storage type of the states, FieldEnv.state_dtype.
+        share_frames: store each frame once and rebuild next states from the state of the following
+            transition, which halves the memory needed for frames.
+        np_random: np.random.Generator minibatches are drawn with, a fresh unseeded one by default.
+        """
+        self.capacity = capacity
+        self.share_frames = share_frames
+        self.np_random = np.random.default_rng() if np_random is None else np_random
+        self.states = zeros((capacity, *state_size), dtype=dtype)
+        self.actions = zeros(capacity, dtype=np.uint8)
+        self.rewards = zeros(capacity, dtype=np.float32)
+        self.dones = zeros(capacity, dtype=bool)
+        self._continues = zeros(capacity, dtype=bool)  # the following transition is the next step of the episode
+        if share_frames:
+            # a transition can be sampled once the frame of its next state is known
+            self._valid = zeros(capacity, dtype=bool)
+            self._next_frame = zeros(state_size, dtype=dtype)
+        else:
+            self.next_states = zeros((capacity, *state_size), dtype=dtype)
+        self._index = 0
+        self._size = 0
+        self._written = 0  # slots written since the memory was created, the newest is the one before _index
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        arrays = [self.states, self.actions, self.rewards, self.dones, self._continues]
+        arrays += [self._valid, self._next_frame] if self.share_frames else [self.next_states]
+        return sum(a.nbytes for a in arrays)
+
+    def append(self, state, action, reward, next_state, done, start=False):
+        """
+        start: the transition is the first of an episode, so the one appended before it does not continue into it
+            and, unless it was terminal, ended an episode cut short.
+        """
+        prev = (self._index - 1) % self.capacity
+        if self._size > 0 and not self.dones[prev]:
+            self._continues[prev] = not start
+            if self.share_frames:
+                if start:
+                    # the next state of a cut short episode is not the following state, it gets a slot of its own
+                    self._append_frame(self._next_frame)
+                self._valid[prev] = True
+        i = self._index
+        if self.share_frames:
+            self._valid[i] = done  # terminal transitions never look at their next state
+            self._next_frame[...] = next_state[0]
+        else:
+            self.next_states[i] = next_state[0]
+        self._continues[i] = False
+        self.states[i] = state[0]
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.dones[i] = done
+        self._index = (i + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        self._written += 1
+
+    def extend(self, states, actions, rewards, next_states, dones, starts):
+        """
+        Appends a block of consecutive transitions with array slicing, as appending them one at a time would.
+        starts: the start flag of every transition.
+        """
+        if len(dones) == 0:
+            return
+        dones = np.asarray(dones, dtype=bool)
+        starts = np.asarray(starts, dtype=bool)
+        # with shared frames a transition starting an episode after one cut short follows a slot holding the next
+        # state of that one
+        needs_frame = zeros(len(dones), dtype=bool)
+        if self.share_frames:
+            needs_frame[1:] = starts[1:] & ~dones[:-1]
+            needs_frame[0] = starts[0] and self._size > 0 and not self.dones[(self._index - 1) % self.capacity]
+        positions = np.arange(len(dones)) + np.cumsum(needs_frame)
+        if positions[-1] >= self.capacity:  # the block would overwrite itself
+            for k in range(len(dones)):
+                self.append(states[k:k + 1], actions[k], rewards[k], next_states[k:k + 1], dones[k], start=starts[k])
+        else:
+            self._write_block(states, actions, rewards, next_states, dones, starts, needs_frame, positions)
+
+    def _write_block(self, states, actions, rewards, next_states, dones, starts, needs_frame, positions):
+        """Writes the transitions to the slots at positions after the newest one, returns every slot written."""
+        prev = (self._index - 1) % self.capacity
+        if self._size > 0 and not self.dones[prev]:
+            self._continues[prev] = not starts[0]
+            if self.share_frames:
+                self._valid[prev] = True
+        written = (self._index + np.arange(positions[-1] + 1)) % self.capacity
+        if needs_frame.any():
+            frame_slots = written[positions[needs_frame] - 1]
+            frames = next_states[np.flatnonzero(needs_frame) - 1]
+            if needs_frame[0]:
+                frames[0] = self._next_frame
+            self.states[frame_slots] = frames
+            self.actions[frame_slots] = 0
+            self.rewards[frame_slots] = 0
+            self.dones[frame_slots] = False
+            self._continues[frame_slots] = False
+            self._valid[frame_slots] = False
+        slots = written[positions]
+        self.states[slots] = states
+        self.actions[slots] = actions
+        self.rewards[slots] = rewards
+        self.dones[slots] = dones
+        self._continues[slots[:-1]] = ~dones[:-1] & ~starts[1:]
+        self._continues[slots[-1]] = False
+        if self.share_frames:
+            self._valid[slots[:-1]] = True  # the following slot holds the next state, or it is never looked at
+            self._valid[slots[-1]] = dones[-1]
+            self._next_frame[...] = next_states[-1]
+        else:
+            self.next_states[slots] = next_states
+        self._index = (self._index + len(written)) % self.capacity
+        self._size = min(self._size + len(written), self.capacity)
+        self._written += len(written)
+        return written
+
+    def _append_frame(self, frame):
+        """Stores the frame as the state of a slot that holds no transition, which is never sampled."""
+        i = self._index
+        self.states[i] = frame
+        self.actions[i] = 0
+        self.rewards[i] = 0
+        self.dones[i] = False
+        self._continues[i] = False
+        self._valid[i] = False
+        self._index = (i + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        self._written += 1
+
+    def sample(self, batch_size):
+        """Returns batch_size (states, actions, rewards, next_states, dones) drawn uniformly with replacement."""
+        return self.transitions(self.sample_indices(batch_size))
+
+    def sample_indices(self, batch_size):
+        indices = self.np_random.integers(self._size, size=batch_size)
+        if self.share_frames:
+            if not self._valid[:self._size].any():
+                raise ValueError('No transition with a stored next state to sample from.')
+            invalid = ~self._valid[indices]
+            while invalid.any():
+                indices[invalid] = self.np_random.integers(self._size, size=invalid.sum())
+                invalid = ~self._valid[indices]
+        return indices
+
+    def transitions(self, indices):
+        if self.share_frames:
+            next_states = self.states[(indices + 1) % self.capacity]
+        else:
+            next_states = self.next_states[indices]
+        return self.states[indices], self.actions[indices], self.rewards[indices], next_states, self.dones[indices]
+
+    def n_step_transitions(self, indices, n_step, gamma):
+        """
+        Returns (states, actions, returns, next_states, dones, discounts) where returns sums the discounted rewards of
+        up to n_step consecutive transitions starting at indices, stopping early at the end of an episode or of the
+        stored steps, next_states and dones are those of the last of them and discounts is gamma to the number of
+        rewards summed, the factor of the value bootstrapped from next_states.
+        """
+        last = np.array(indices)
+        returns = self.rewards[last].astype(np.float64)
+        discounts = np.full(len(last), gamma, dtype=np.float64)
+        open_ = ~self.dones[last]
+        for _ in range(n_step - 1):
+            following = (last + 1) % self.capacity
+            # a window can only grow onto a step of the same episode whose own next state is known
+            grow = open_ & self._continues[last]
+            if self.share_frames:
+                grow &= self._valid[following]
+            if not grow.any():
+                break
+            last[grow] = following[grow]
+            returns[grow] += discounts[grow] * self.rewards[following[grow]]
+            discounts[grow] *= gamma
+            open_ = grow & ~self.dones[last]
+        _, _, _, next_states, dones = self.transitions(last)
+        return (self.states[indices], self.actions[indices], returns.astype(np.float32), next_states, dones,
+                discounts.astype(np.float32))
+
+
+class SumTree:
+    """Binary tree whose leaves hold priorities and whose inner nodes hold the sum of their children."""
+
+    def __init__(self, capacity):
+        self.depth = max(1, (capacity - 1).bit_length())
+        self._leaves = 1 << self.depth
+        self._tree = zeros(2 * self._leaves)  # node k has children 2k and 2k + 1, the root is node 1
+
+    @property
+    def total(self):
+        return self._tree[1]
+
+    def __getitem__(self, indices):
+        return self._tree[indices + self._leaves]
+
+    def update(self, indices, priorities):
+        nodes = np.asarray(indices) + self._leaves
+        self._tree[nodes] = priorities
+        if nodes.size == 1:  # a single new transition, walking up its path in Python is cheapest
+            node = int(nodes[0]) // 2
+            while node >= 1:
+                self._tree[node] = self._tree[2 * node] + self._tree[2 * node + 1]
+                node //= 2
+            return
+        for _ in range(self.depth):
+            # parents shared by several nodes are recomputed from the same children, so repeats are harmless
+            nodes //= 2
+            self._tree[nodes] = self._tree[2 * nodes] + self._tree[2 * nodes + 1]
+
+    def find(self, values):
+        """Returns the leaves at which the cumulative sum of priorities reaches each of the values."""
+        nodes = np.ones(len(values), dtype=np.int64)
+        values = np.array(values, dtype=np.float64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            right = values >= self._tree[left]
+            values -= self._tree[left] * right
+            nodes = left + right
+        return nodes - self._leaves
+
+
+class PrioritizedReplayMemory(ReplayMemory):
+    """
+    ReplayMemory that samples transitions in proportion to their TD error (Schaul et al., 2016).
+    New transitions get the largest priority seen so far so that each is replayed at least once.
+    """
+
+    def __init__(self, capacity, state_size, dtype, share_frames=False, np_random=None, alpha=0.6, beta=0.4,
+                 beta_increment=1e-5, epsilon=1e-3):
+        """
+        alpha: how strongly priorities skew sampling, 0 samples uniformly.
+        beta: initial importance-sampling correction, annealed to 1 by beta_increment per minibatch.
+        epsilon: added to every TD error so that no transition stops being sampled.
+        """
+        super(PrioritizedReplayMemory, self).__init__(capacity, state_size, dtype, share_frames=share_frames,
+                                                      np_random=np_random)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment
+        self.epsilon = epsilon
+        self._tree = SumTree(capacity)
+        self._max_priority = 1.0
+
+    @classmethod
+    def from_memory(cls, memory, **kwargs):
+        """Returns a prioritized copy of memory in which every stored transition has the same priority."""
+        prioritized = cls(memory.capacity, memory.states.shape[1:], memory.states.dtype,
+                          share_frames=memory.share_frames, np_random=memory.np_random, **kwargs)
+        for name, value in vars(memory).items():
+            if isinstance(value, np.ndarray):
+                getattr(prioritized, name)[...] = value
+        prioritized._index = memory._index
+        prioritized._size = memory._size
+        prioritized._written = memory._written
+        indices = np.arange(memory._size)
+        valid = memory._valid[indices] if memory.share_frames else True
+        prioritized._tree.update(indices, np.where(valid, 1.0, 0.0))
+        return prioritized
+
+    def append(self, state, action, reward, next_state, done, start=False):
+        prev = (self._index - 1) % self.capacity
+        prev_pending = self.share_frames and self._size > 0 and not self._valid[prev]
+        super(PrioritizedReplayMemory, self).append(state, action, reward, next_state, done, start=start)
+        i = (self._index - 1) % self.capacity
+        new_priority = self._max_priority ** self.alpha
+        if i != (prev + 1) % self.capacity:
+            self._tree.update([(prev + 1) % self.capacity], 0.0)  # the frame slot of a cut short episode
+        valid = not self.share_frames or self._valid[i]
+        self._tree.update([i], new_priority if valid else 0.0)
+        if prev_pending and self._valid[prev]:
+            self._tree.update([prev], new_priority)
+
+    def _write_block(self, states, actions, rewards, next_states, dones, starts, needs_frame, positions):
+        prev = (self._index - 1) % self.capacity
+        prev_pending = self.share_frames and self._size > 0 and not self._valid[prev]
+        written = super(PrioritizedReplayMemory, self)._write_block(states, actions, rewards, next_states, dones,
+                                                                    starts, needs_frame, positions)
+        new_priority = self._max_priority ** self.alpha
+        priorities = np.full(len(written), new_priority)
+        if self.share_frames:
+            priorities[~self._valid[written]] = 0.0
+        self._tree.update(written, priorities)
+        if prev_pending and self._valid[prev]:
+            self._tree.update([prev], new_priority)
+        return written
+
+    def sample_indices(self, batch_size):
+        # one draw from each of batch_size equal slices of the total priority
+        values = (np.arange(batch_size) + self.np_random.random(batch_size)) * self._tree.total / batch_size
+        indices = self._tree.find(values)
+        empty = self._tree[indices] <= 0
+        if empty.any():
+            # rounding can carry a draw past the last priority it should reach, onto a slot that is never sampled
+            sampled = np.flatnonzero(self._tree[np.arange(self._size)] > 0)
+            indices[empty] = sampled[np.maximum(np.searchsorted(sampled, indices[empty]) - 1, 0)]
+        self.beta = min(1.0, self.beta + self.beta_increment)
+        return indices
+
+    def importance_weights(self, indices):
+        """Weights that undo the bias of prioritized sampling, scaled so that the largest is 1."""
+        probabilities = self._tree[indices] / self._tree.total
+        weights = (self._size * probabilities) ** -self.beta
+        return weights / weights.max()
+
+    def update_priorities(self, indices, td_errors):
+        priorities = np.abs(td_errors) + self.epsilon
+        self._max_priority = max(self._max_priority, priorities.max())
+        self._tree.update(indices, priorities ** self.alpha)
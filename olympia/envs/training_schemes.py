@@ -1,11 +1,54 @@
-
 """
 Written by Matthew Filipovich and Hugh Morison
 This file just contains a dictionary of initial positions for various points int the training scheme
+Levels named 'N_v_N' that are not in the dictionary get their positions from formation, for any team size.
 """
 
+import math
+import re
+
 scheme = {
     'one_player': [[(0.7, 0.5)]],
     'one_v_one': [[(0.7, 0.5)], [(0.3, 0.5)]],
     'two_v_two': [[(0.7, 0.25), (0.7,0.75)], [(0.3, 0.25), (0.3, 0.75)]]
-}
\ No newline at end of file
+}
+
+
+def formation(n_players, front=0.55, back=0.85, per_line=4):
+    """
+    Relative positions of a team of n_players in the right half, which team 0 defends: lines of at most per_line
+    players spread evenly across the field, the first at front and the last at back.
+    """
+    n_lines = math.ceil(n_players / per_line)
+    positions = []
+    for line in range(n_lines):
+        x = (front + back) / 2 if n_lines == 1 else front + (back - front) * line / (n_lines - 1)
+        size = n_players // n_lines + (line < n_players % n_lines)
+        positions += [(x, (k + 1) / (size + 1)) for k in range(size)]
+    return positions
+
+
+def level_positions(training_level):
+    """Relative initial positions of every team of a level, team 1 mirrors team 0 in generated levels."""
+    if training_level in scheme:
+        return scheme[training_level]
+    match = re.fullmatch(r'(\d+)_v_(\d+)', training_level)
+    if match is None:
+        raise ValueError('Unknown training level {!r}.'.format(training_level))
+    teams = [formation(int(match.group(1))), formation(int(match.group(2)))]
+    return [teams[0], [(1 - x, y) for x, y in teams[1]]]
+
+
+def initial_positions(training_level, shape):
+    """
+    Initial cells of the players of every team of a level on a field of the given shape. Players start up to one
+    cell away from these, so they have to keep off the walls and three cells apart from each other.
+    """
+    teams = [[tuple(int(a * b) for a, b in zip(shape, position)) for position in team]
+             for team in level_positions(training_level)]
+    cells = [cell for team in teams for cell in team]
+    for i, (x, y) in enumerate(cells):
+        apart = all(max(abs(x - other_x), abs(y - other_y)) >= 3 for other_x, other_y in cells[i + 1:])
+        if not (apart and 2 <= x <= shape[0] - 3 and 2 <= y <= shape[1] - 3):
+            raise ValueError('A {}x{} field is too small for the players of {}.'.format(*shape, training_level))
+    return teams
@@ -0,0 +1,253 @@
+"""
+VectorOlympia steps N independent Olympia games at once.
+
+Every game is held in stacked arrays (agent positions (N, n_agents, 2), occupancy grids (N, W, H)) and the
+movement, ball flight, interception, collision and goal rules of FieldEnv are applied to all games with
+array operations. Players are still resolved one after the other, exactly as in FieldEnv.step, so that
+each game produces the same transitions as a separate FieldEnv created with the same seed.
+Finished games are reset automatically.
+"""
+
+import numpy as np
+from numpy import array, zeros
+from .cells import CELL_EMPTY, CELL_WALL, CELL_GOAL, CELL_BALL, CELL_TEAMS, CELL_PLAYERS, COLORS
+from .environment import static_field, static_grid
+from .grid_objects import Agent, Ball
+from .training_schemes import initial_positions
+
+
+class VectorOlympia:
+    MOVES = array(list(Agent.actions.values()))  # throwing actions do not move the player
+    THROWS = array([movement[0] for movement in Ball.movements.values()])
+
+    def __init__(self, n_envs, agent_type='RAM', shape=(21, 15), training_level='one_player', seeds=None,
+                 max_timesteps=None):
+        self.n_envs = n_envs
+        self.agent_type = agent_type
+        self.shape = shape
+        self._training_level = training_level
+        self.max_timesteps = max_timesteps
+        teams = initial_positions(training_level, shape)
+        self.n_teams = len(teams)
+        self.n_agents = sum(len(team) for team in teams)
+        if self.n_agents % self.n_teams != 0:
+            raise ValueError('Teams should be the same size.')
+        self.n_agents_team = self.n_agents // self.n_teams
+        if agent_type == 'RGB':
+            self.state_size = (*self.shape, 3)
+        else:
+            self.state_size = (self.n_agents * 2 + 2,)
+        self.seed(seeds)
+
+        self._static_grid = static_grid(self.shape)
+        self._static_field = static_field(self.shape)
+        self._initial_ball_position = array((int(shape[0]/2), int(shape[1]/2)))
+        self._initial_positions = array([position for team in teams for position in team])
+        self._agent_teams = np.repeat(np.arange(self.n_teams), self.n_agents_team)
+        self._agent_cells = array(CELL_TEAMS, dtype=np.int8)[self._agent_teams]
+
+        self.grids = np.tile(self._static_grid, (n_envs, 1, 1))
+        self._drawn_cells = zeros((n_envs, self.n_agents + 1, 2), dtype=np.int64)  # players, then the ball
+        # RGB frames are kept up to date alongside the grids, drawing them from a grid on request is slower
+        self.fields = np.tile(self._static_field, (n_envs, 1, 1, 1)) if agent_type == 'RGB' else None
+        self.positions = zeros((n_envs, self.n_agents, 2), dtype=np.int64)
+        self.prev_positions = np.tile(self._initial_positions, (n_envs, 1, 1))
+        self.has_ball = zeros((n_envs, self.n_agents), dtype=bool)
+        self.move_counters = np.full((n_envs, self.n_agents), -1)
+        self.ball_positions = np.tile(self._initial_ball_position, (n_envs, 1))
+        self.ball_moving = zeros(n_envs, dtype=bool)
+        self.ball_directions = zeros(n_envs, dtype=np.int64)
+        self.ball_moves_left = zeros(n_envs, dtype=np.int64)
+        self.timesteps = zeros(n_envs, dtype=np.int64)
+        self.reset()
+
+    def seed(self, seeds=None):
+        """Seeds game i with seeds[i], or with seeds + i if seeds is a single integer."""
+        if seeds is None or isinstance(seeds, int):
+            seeds = [None if seeds is None else seeds + i for i in range(self.n_envs)]
+        if len(seeds) != self.n_envs:
+            raise ValueError('Expected one seed per environment.')
+        self.np_randoms = [np.random.default_rng(seed) for seed in seeds]
+        return list(seeds)
+
+    def reset(self):
+        """Reset every environment to its original state."""
+        self._reset(np.arange(self.n_envs))
+        return self.output()
+
+    def step(self, actions):
+        """Advances every environment by one step.
+
+        actions has shape (n_envs, n_agents). Returns the observations, the (n_envs, n_agents) rewards,
+        the done flags and an info dict. Environments that finished are reset before returning, their
+        last observation is kept in info['final_observation'].
+        """
+        actions = np.asarray(actions)
+        envs = np.arange(self.n_envs)
+        for agent in range(self.n_agents):
+            self._act(envs, agent, actions[:, agent])
+        moving = np.flatnonzero(self.ball_moving)
+        if len(moving) > 0:
+            self._move_balls(moving)
+        ball = self.ball_positions % self.shape
+        done = self._static_grid[ball[:, 0], ball[:, 1]] == CELL_GOAL
+        rewards = np.full((self.n_envs, self.n_agents), -1)
+        rewards[done] = -100  # as in FieldEnv.step, a goal costs every agent 100
+        self._add_to_field(envs)
+        self.timesteps += 1
+
+        truncated = zeros(self.n_envs, dtype=bool)
+        if self.max_timesteps is not None:
+            truncated = ~done & (self.timesteps >= self.max_timesteps)
+        observations = self.output()
+        info = {'truncated': truncated}
+        finished = np.flatnonzero(done | truncated)
+        if len(finished) > 0:
+            info['final_observation'] = observations.copy()
+            self._reset(finished)
+            observations[finished] = self.output()[finished]
+        return observations, rewards, done, info
+
+    def output(self):
+        raise NotImplementedError('output() not implemented in child class!')
+
+    def _reset(self, envs):
+        for env in envs:
+            np_random = self.np_randoms[env]
+            for agent in range(self.n_agents):
+                x = np_random.integers(-1, 2)
+                y = np_random.integers(-1, 2)
+                self.positions[env, agent] = self._initial_positions[agent] + (x, y)
+        # like Ball.reset_position, a reset leaves a ball that is still in flight moving
+        self.ball_positions[envs] = self._initial_ball_position
+        self.has_ball[envs] = False
+        self.move_counters[envs] = -1
+        self.timesteps[envs] = 0
+        self._add_to_field(envs)
+
+    def _act(self, envs, agent, ndx):
+        """Vectorized Agent.act for one agent in every environment."""
+        position = self.positions[:, agent]
+        moving_tiles = (ndx >= 1) & (ndx <= 8)
+        movement = ndx <= 8
+        new_pos = position + self.MOVES[ndx]
+        space = self.grids[envs, new_pos[:, 0], new_pos[:, 1]]
+        free = space == CELL_EMPTY  # anything else is wall, net, players or ball
+        has_ball = self.has_ball[:, agent].copy()
+        carry = movement & free & has_ball & (self.move_counters[:, agent] > 0)
+        walk = movement & free & ~has_ball
+        pick_up = movement & (space == CELL_BALL)
+        throw = ~movement & has_ball
+
+        self.prev_positions[moving_tiles, agent] = position[moving_tiles]
+        moved = carry | walk | pick_up
+        position[moved] = new_pos[moved]
+        self.move_counters[carry, agent] -= 1
+        self.ball_positions[carry] = new_pos[carry]
+        self.has_ball[pick_up, agent] = True
+        self.move_counters[pick_up, agent] = 3
+        self.has_ball[throw, agent] = False
+        self.move_counters[throw, agent] = -1
+        self.ball_moving[throw] = True
+        self.ball_directions[throw] = ndx[throw] - 9
+        self.ball_moves_left[throw] = Ball._turns_thrown
+
+    def _move_balls(self, envs):
+        """Vectorized FieldEnv.move_ball for the environments in which the ball is in flight.
+
+        A ball that was knocked into a wall can be thrown from there and leave the field. Positions off the
+        field wrap around, as they do in FieldEnv.
+        """
+        ball = self.ball_positions[envs]
+        move = self.THROWS[self.ball_directions[envs]]
+        self.ball_moves_left[envs] -= 1
+        new_pos = ball + move
+        inter_pos = ball + move // 2
+        inter_space = self._space(envs, inter_pos)
+        close = (inter_space == CELL_WALL) | (inter_space == CELL_GOAL)
+        wall_far = close.copy()
+        far = ~close
+        wall_far[far] = self._space(envs[far], new_pos[far]) == CELL_WALL
+        # FieldEnv.check_walls stops the ball on inter_pos whenever something is close or far
+        new_pos[wall_far] = inter_pos[wall_far]
+        self.ball_moves_left[envs[wall_far]] = 0
+        self.ball_moving[envs[self.ball_moves_left[envs] == 0]] = False
+
+        at_inter = self._player_at(envs, inter_pos)
+        at_new = ~at_inter & self._player_at(envs, new_pos)
+        if at_inter.any():
+            self._interception(envs[at_inter], inter_pos[at_inter])
+        if at_new.any():
+            self._interception(envs[at_new], new_pos[at_new])
+        free = ~(at_inter | at_new)
+        new_pos[:, 0] = np.clip(new_pos[:, 0], 0, self.shape[0] - 1)
+        self.ball_positions[envs[free]] = new_pos[free]
+
+    def _space(self, envs, pos):
+        pos = pos % self.shape
+        return self.grids[envs, pos[:, 0], pos[:, 1]]
+
+    def _player_at(self, envs, pos):
+        return np.isin(self._space(envs, pos), CELL_TEAMS)
+
+    def _interception(self, envs, pos):
+        catchers = (self.positions[envs] == pos[:, None, :]).all(axis=2)
+        rows, agents = np.nonzero(catchers)
+        self.has_ball[envs[rows], agents] = True
+        self.move_counters[envs[rows], agents] = 3
+        caught = catchers.any(axis=1)
+        self.ball_moving[envs[caught]] = False
+        self.ball_positions[envs[caught]] = pos[caught]
+
+    def _add_to_field(self, envs):
+        """Vectorized FieldEnv._add_to_field for the given environments."""
+        drawn_x, drawn_y = self._drawn_cells[envs, :, 0], self._drawn_cells[envs, :, 1]
+        self.grids[envs[:, None], drawn_x, drawn_y] = self._static_grid[drawn_x, drawn_y]
+        for agent in range(self.n_agents):
+            position = self.positions[envs, agent]
+            space = self.grids[envs, position[:, 0], position[:, 1]]
+            overlapping = (space == CELL_WALL) | (space == CELL_BALL) | (space & CELL_PLAYERS != 0)
+            for env in envs[overlapping]:
+                self._check_overlapping_players(env, agent)
+            position = self.positions[envs, agent]
+            self.grids[envs, position[:, 0], position[:, 1]] |= self._agent_cells[agent]
+        ball = self.ball_positions[envs] % self.shape
+        space = self.grids[envs, ball[:, 0], ball[:, 1]]
+        empty = (space == CELL_EMPTY) | (space == CELL_GOAL)
+        self.grids[envs[empty], ball[empty, 0], ball[empty, 1]] = CELL_BALL
+        # collisions only ever touch cells the players end up on
+        self._drawn_cells[envs, :-1] = self.positions[envs]
+        self._drawn_cells[envs, -1] = ball
+        if self.fields is not None:
+            self.fields[envs[:, None], drawn_x, drawn_y] = self._static_field[drawn_x, drawn_y]
+            drawn_x, drawn_y = self._drawn_cells[envs, :, 0], self._drawn_cells[envs, :, 1]
+            self.fields[envs[:, None], drawn_x, drawn_y] = COLORS[self.grids[envs[:, None], drawn_x, drawn_y]]
+
+    def _check_overlapping_players(self, env, agent):
+        """Same tie-break as FieldEnv._check_overlapping_players, applied to a single environment."""
+        positions = self.positions[env]
+        other_agent = np.flatnonzero((positions == positions[agent]).all(axis=1))[-1]
+        moved_agent = (agent, other_agent)[self.np_randoms[env].integers(2)]
+        positions[moved_agent] = self.prev_positions[env, moved_agent]
+        cell = self._agent_cells[moved_agent]
+        self.grids[env, positions[moved_agent, 0], positions[moved_agent, 1]] |= cell
+        self.grids[env, positions[agent, 0], positions[agent, 1]] &= ~cell
+        if self.has_ball[env, moved_agent]:
+            self.has_ball[env, moved_agent] = False
+            self.move_counters[env, moved_agent] = -1
+
+
+class VectorOlympiaRGB(VectorOlympia):
+    def __init__(self, n_envs, **kwargs):
+        super(VectorOlympiaRGB, self).__init__(n_envs, agent_type='RGB', **kwargs)
+
+    def output(self):
+        return self.fields.copy()
+
+
+class VectorOlympiaRAM(VectorOlympia):
+    def __init__(self, n_envs, **kwargs):
+        super(VectorOlympiaRAM, self).__init__(n_envs, agent_type='RAM', **kwargs)
+
+    def output(self):
+        return np.concatenate((self.ball_positions, self.positions.reshape(self.n_envs, -1)), axis=1)
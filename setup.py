@@ -2,6 +2,6 @@ from setuptools import setup
 
 setup(name='olympia',
       version='0.0.1',
-      install_requires=['gym']
+      install_requires=['gym>=0.26']
 )
 
@@ -1,6 +1,28 @@
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
 import unittest
+from multiprocessing import shared_memory
+from unittest import mock
 import gym
-from olympia.envs import OlympiaRGB, OlympiaRAM
+import numpy as np
+from olympia.envs import OlympiaRGB, OlympiaRAM, VectorOlympiaRGB, VectorOlympiaRAM
+from olympia.envs.cells import COLORS
+from olympia.envs.checkpoint import Checkpointer, read_checkpoint, snapshot
+from olympia.envs.curriculum import Curriculum, transfer_agents
+from olympia.envs.dataset import DatasetWriter, OfflineDataset, train_offline
+from olympia.envs.league import League, Mirror, MIRRORED_ACTIONS
+from olympia.envs.multi_agent import MultiAgentOlympia, make_async_pool
+from olympia.envs.parallel import ParallelTrainer
+from olympia.envs.policy import BatchedPolicy, RandomPolicy, fill_memory
+from olympia.envs.profiling import Profiler
+from olympia.envs.recording import ActionLog
+from olympia.envs.rendering import EpisodeRecorder, field_to_grid
+from olympia.envs.replay_memory import ReplayMemory, PrioritizedReplayMemory, SumTree
+from olympia.envs.training_schemes import scheme
 
 
 class TestStringMethods(unittest.TestCase):
@@ -26,5 +48,668 @@ class TestStringMethods(unittest.TestCase):
             env.render()
 
 
+class TestVectorOlympia(unittest.TestCase):
+    def test_matches_separate_envs(self):
+        seeds = [0, 1, 2, 3]
+        max_timesteps = 50
+        for level, shape in [(level, (11, 9)) for level in scheme] + [('5_v_5', (31, 21))]:
+            vec_env = VectorOlympiaRAM(len(seeds), shape=shape, training_level=level, seeds=seeds,
+                                       max_timesteps=max_timesteps)
+            envs = [OlympiaRAM(shape=shape, training_level=level, seed=seed) for seed in seeds]
+            actions = np.random.default_rng(0).integers(0, 17, size=(500, len(seeds), vec_env.n_agents))
+            for t in range(len(actions)):
+                states, rewards, dones, info = vec_env.step(actions[t])
+                final_states = info.get('final_observation', states)
+                for k, env in enumerate(envs):
+                    state, reward, done, _ = env.step(*actions[t][k])
+                    np.testing.assert_array_equal(final_states[k], state[0])
+                    np.testing.assert_array_equal(rewards[k], reward)
+                    self.assertEqual(dones[k], done)
+                    if done or info['truncated'][k]:
+                        state = env.reset()
+                    np.testing.assert_array_equal(states[k], state[0])
+
+    def test_rgb_matches_separate_envs(self):
+        seeds = [0, 1]
+        vec_env = VectorOlympiaRGB(len(seeds), shape=(11, 9), training_level='two_v_two', seeds=seeds,
+                                   max_timesteps=50)
+        envs = [OlympiaRGB(shape=(11, 9), training_level='two_v_two', seed=seed) for seed in seeds]
+        for t, actions in enumerate(np.random.default_rng(0).integers(0, 17, size=(300, len(seeds), 4))):
+            states, _, dones, info = vec_env.step(actions)
+            for k, env in enumerate(envs):
+                _, _, done, _ = env.step(*actions[k])
+                np.testing.assert_array_equal(info.get('final_observation', states)[k], env.field)
+                if done or info['truncated'][k]:
+                    env.reset()
+                np.testing.assert_array_equal(states[k], env.field)
+
+
+class FullRedrawOlympiaRGB(OlympiaRGB):
+    def _add_to_field(self):
+        self.grid[...] = self._static_grid
+        self._last_player[...] = -1
+        self._dirty_cells = []
+        super(FullRedrawOlympiaRGB, self)._add_to_field()
+
+    @property
+    def field(self):
+        return COLORS[self.grid]
+
+
+class TestFieldEnv(unittest.TestCase):
+    def test_incremental_field_matches_full_redraw(self):
+        for level in scheme:
+            env = OlympiaRGB(shape=(11, 9), training_level=level, seed=0)
+            redrawn = FullRedrawOlympiaRGB(shape=(11, 9), training_level=level, seed=0)
+            state = env.output()
+            self.assertFalse(state.flags.writeable)
+            out = np.zeros_like(state)
+            for t, actions in enumerate(np.random.default_rng(0).integers(0, 17, size=(300, env.n_agents))):
+                _, _, done, _ = env.step(*actions)
+                redrawn.step(*actions, out=out)
+                np.testing.assert_array_equal(state, out)  # the view follows the field
+                if done or t % 50 == 49:
+                    env.reset()
+                    np.testing.assert_array_equal(state, redrawn.reset(out=out))
+
+
+class TestObservations(unittest.TestCase):
+    def test_modes_hold_the_same_information(self):
+        ram = OlympiaRAM(training_level='two_v_two', seed=0, memory_size=1)
+        normalized = OlympiaRAM(training_level='two_v_two', seed=0, memory_size=1, observation='normalized')
+        stacked = OlympiaRAM(training_level='two_v_two', seed=0, memory_size=1, frame_stack=3)
+        codes = OlympiaRGB(training_level='two_v_two', seed=0, memory_size=1, observation='codes')
+        egocentric = OlympiaRGB(training_level='two_v_two', seed=0, memory_size=1, observation='egocentric')
+        envs = [ram, normalized, stacked, codes, egocentric]
+        self.assertEqual(normalized.output().dtype, np.float32)
+        self.assertEqual(stacked.state_size, (30,))
+        self.assertEqual(egocentric.output().shape, (4, 7, 7, 1))
+        frames = [ram.output()] * 3
+        for actions in np.random.default_rng(0).integers(0, 17, size=(200, 4)):
+            states = [env.step(*actions)[0] for env in envs]
+            frames = frames[1:] + [states[0]]
+            np.testing.assert_allclose(states[1], states[0] / np.tile([20, 14], 5), rtol=1e-6)
+            np.testing.assert_array_equal(states[2], np.concatenate(frames, axis=1))
+            np.testing.assert_array_equal(COLORS[states[3][0, ..., 0]], codes.field)
+            padded = np.pad(codes.grid, 3, constant_values=1)
+            for i, (x, y) in enumerate(codes.get_player_positions()):
+                np.testing.assert_array_equal(states[4][i, ..., 0], padded[x:x + 7, y:y + 7])
+            self.assertTrue(states[4][0, 3, 3, 0] & 4)  # every window is centred on its agent
+
+    def test_trains_on_egocentric_windows(self):
+        env = OlympiaRGB(shape=(11, 9), training_level='one_v_one', seed=0, memory_size=50,
+                         observation='egocentric', frame_stack=2)
+        env.train(1, batch_size=4, max_timesteps=20)
+        agent = env.get_agents()[0]
+        self.assertEqual(agent.memory.states.shape[1:], (7, 7, 2))
+        with self.assertRaises(ValueError):
+            ParallelTrainer(env, n_workers=1)
+
+
+class TestProfiler(unittest.TestCase):
+    def test_times_every_phase_while_attached(self):
+        env = OlympiaRAM(training_level='one_v_one', seed=0, memory_size=100)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'trace.json')
+            profiler = Profiler(trace_path=path, profile_episodes=1)
+            time_done, _ = env.train(2, batch_size=4, max_timesteps=30, profiler=profiler)
+            with open(path) as f:
+                trace = json.load(f)
+        steps = sum(time_done)
+        self.assertEqual(profiler.stats['step'][0], steps)
+        self.assertEqual(profiler.stats['act'][0], 2 * steps)
+        self.assertEqual(profiler.stats['remember'][0], 2 * steps)
+        self.assertEqual(profiler.stats['gradient'][0], profiler.stats['replay'][0])
+        self.assertGreater(profiler.stats['replay'][1], profiler.stats['gradient'][1])
+        self.assertEqual([row['timesteps'] for row in trace['episodes']], time_done)
+        self.assertIsNotNone(profiler.profile_stats())
+        # detaching leaves nothing behind, an environment without a profiler runs its own methods
+        self.assertFalse({'step', 'output', 'move_ball'} & set(vars(env)))
+        self.assertFalse({'act', 'replay', 'fit'} & set(vars(env.get_agents()[0])))
+
+
+class TestMultiAgentOlympia(unittest.TestCase):
+    def test_gymnasium_interface(self):
+        env = gym.make('olympia-ram-v1', training_level='two_v_two', max_episode_steps=30)
+        observation, info = env.reset(seed=0)
+        self.assertTrue(env.observation_space.contains(observation))
+        self.assertEqual(env.action_space.shape, (4,))
+        for t in range(30):
+            observation, rewards, terminated, truncated, info = env.step(env.action_space.sample())
+            self.assertTrue(env.observation_space.contains(observation))
+            self.assertEqual(rewards.shape, (4,))
+            if terminated:
+                self.assertIn(info['winning_team'], (0, 1))
+                break
+        self.assertTrue(terminated or truncated)
+        egocentric = MultiAgentOlympia('RGB', training_level='two_v_two', observation='egocentric')
+        self.assertEqual(egocentric.observation_space.shape, (4, 7, 7, 1))
+
+    def test_async_pool_matches_separate_envs(self):
+        kwargs = dict(training_level='one_v_one', max_episode_steps=15)
+        envs = [MultiAgentOlympia('RAM', **kwargs) for _ in range(2)]
+        pool = make_async_pool(2, 'RAM', **kwargs)
+        try:
+            observations, _ = pool.reset(seed=0)
+            expected = [env.reset(seed=i)[0] for i, env in enumerate(envs)]
+            np.testing.assert_array_equal(observations, expected)
+            for actions in np.random.default_rng(0).integers(0, 17, size=(40, 2, 2)):
+                observations, rewards, terminated, truncated, _ = pool.step(actions)
+                for i, env in enumerate(envs):
+                    observation, reward, done, cut, _ = env.step(actions[i])
+                    if done or cut:
+                        observation, _ = env.reset()
+                    np.testing.assert_array_equal(observations[i], observation)
+                    np.testing.assert_array_equal(rewards[i], reward)
+                    self.assertEqual((terminated[i], truncated[i]), (done, cut))
+        finally:
+            pool.close()
+
+
+class TestFormations(unittest.TestCase):
+    def test_generated_levels(self):
+        env = OlympiaRAM(shape=(101, 65), training_level='11_v_11', seed=0, memory_size=1)
+        self.assertEqual(env.state_size, (46,))
+        positions = [tuple(agent._initial_position) for agent in env.get_agents()]
+        self.assertEqual(len(set(positions)), 22)
+        team, opponents = positions[:11], positions[11:]
+        # team 0 defends the right half and team 1 mirrors it
+        self.assertTrue(all(x > 50 for x, _ in team) and all(x < 50 for x, _ in opponents))
+        self.assertEqual(sorted(y for _, y in team), sorted(y for _, y in opponents))
+        with self.assertRaises(ValueError):
+            OlympiaRAM(shape=(15, 9), training_level='5_v_5')
+        with self.assertRaises(ValueError):
+            OlympiaRAM(training_level='five_v_five')
+
+
+class TestActionLog(unittest.TestCase):
+    def test_seeded_episodes_repeat(self):
+        env = OlympiaRAM(shape=(15, 9), training_level='two_v_two', memory_size=1)
+        log = ActionLog.record(env, seed=7, max_timesteps=200)
+        other = ActionLog.record(OlympiaRAM(shape=(15, 9), training_level='two_v_two', memory_size=1), seed=7,
+                                 max_timesteps=200)
+        self.assertEqual(log.actions, other.actions)
+        self.assertEqual(log.digest, other.digest)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'log.npz')
+            log.save(path)
+            loaded = ActionLog.load(path)
+        self.assertEqual((loaded.seed, loaded.actions, loaded.digest), (log.seed, log.actions, log.digest))
+        self.assertEqual(loaded.replay(env), log.digest)
+        with self.assertRaises(ValueError):
+            ActionLog.record(env, seed=None)
+
+    def test_recorded_games(self):
+        # recorded with ActionLog.record, every change to the game rules has to keep replaying them exactly
+        directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_recordings')
+        paths = sorted(glob.glob(os.path.join(directory, '*.npz')))
+        self.assertEqual(len(paths), len(scheme))
+        for path in paths:
+            log = ActionLog.load(path)
+            for env_class in (OlympiaRAM, OlympiaRGB):
+                env = env_class(shape=log.shape, training_level=log.training_level, memory_size=1)
+                self.assertEqual(log.replay(env), log.digest, path)
+
+
+class TestEpisodeRecorder(unittest.TestCase):
+    def test_replays_the_episode(self):
+        env = OlympiaRGB(shape=(15, 9), training_level='two_v_two', seed=0)
+        recorder = EpisodeRecorder(env)
+        env.reset()
+        recorder.record(env)
+        grids, frames = [env.grid.copy()], [env.render(mode='ansi')]
+        for actions in np.random.default_rng(0).integers(0, 17, size=(300, 4)):
+            _, _, done, _ = env.step(*actions)
+            recorder.record(env, done)
+            grids.append(env.grid.copy())
+            frames.append(env.render(mode='ansi', final=done))
+            np.testing.assert_array_equal(field_to_grid(env.field), env.grid)
+            if done:
+                break
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'episode.npz')
+            recorder.save(path)
+            loaded = EpisodeRecorder.load(path)
+        np.testing.assert_array_equal(list(loaded.grids()), grids)
+        self.assertEqual(list(loaded.frames()), frames)
+
+
+class TestBatchedPolicy(unittest.TestCase):
+    def test_matches_choose_action(self):
+        env = OlympiaRAM(shape=(15, 9), training_level='two_v_two', seed=0, memory_size=1)
+        agents = env.get_agents()
+        for agent, epsilon in zip(agents, [0., 0.3, 0.7, 1.]):
+            agent.epsilon = epsilon
+        states = VectorOlympiaRAM(8, shape=(15, 9), training_level='two_v_two', seeds=1).output()
+        rng_states = [agent.np_random.bit_generator.state for agent in agents]
+        expected = [[agent.choose_action(states[k:k + 1]) for agent in agents] for k in range(len(states))]
+        for agent, rng_state in zip(agents, rng_states):
+            agent.np_random.bit_generator.state = rng_state
+        np.testing.assert_array_equal(BatchedPolicy(agents).choose_actions(states), expected)
+        # RGB agents use the Keras backend, which BatchedPolicy fuses into one model
+        env = OlympiaRGB(shape=(15, 9), training_level='two_v_two', seed=0, memory_size=1)
+        agents = env.get_agents()
+        states = VectorOlympiaRGB(8, shape=(15, 9), training_level='two_v_two', seeds=1).output()
+        policy = BatchedPolicy(agents)
+        q_values = policy.q_values(states)
+        self.assertEqual([len(indices) for indices, _ in policy._groups], [4])
+        for i, agent in enumerate(agents):
+            np.testing.assert_allclose(q_values[:, i], agent.q_values(states), rtol=1e-5, atol=1e-5)
+
+    def test_environments_run_without_keras(self):
+        code = ('import sys; from olympia.envs import OlympiaRAM; from olympia.envs.policy import RandomPolicy; '
+                'env = OlympiaRAM(seed=0); state = env.reset(); '
+                'env.step(*RandomPolicy(env.get_agents()).choose_actions(state)[0]); '
+                "print('tensorflow' in sys.modules or 'keras' in sys.modules)")
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), 'False')
+
+
+class TestAgent(unittest.TestCase):
+    def test_replay_targets(self):
+        env = OlympiaRAM(shape=(15, 9), seed=0)
+        agent = env.get_agents()[0]
+        fill_memory(env, agent, 30, seed=0)
+        indices = np.random.default_rng(0).integers(len(agent.memory), size=10)
+        memory = agent.memory
+        expected = []
+        for i in indices:
+            target = memory.rewards[i]
+            if not memory.dones[i]:
+                target += agent.gamma * np.amax(agent.model.predict(memory.next_states[i][None], verbose=0)[0])
+            target_f = agent.model.predict(memory.states[i][None], verbose=0)
+            target_f[0][memory.actions[i]] = target
+            expected.append(target_f[0])
+        agent.memory.np_random = np.random.default_rng(0)
+        with mock.patch.object(agent.model, 'train_on_batch') as train_on_batch:
+            agent.replay(10)
+        states, targets = train_on_batch.call_args[0]
+        np.testing.assert_array_equal(states, memory.states[indices])
+        np.testing.assert_allclose(targets, expected, rtol=1e-5, atol=1e-5)
+
+    def test_numpy_backend_matches_keras(self):
+        env = OlympiaRAM(shape=(15, 9), training_level='one_v_one', seed=0)
+        agent = env.get_agents()[0]
+        states = VectorOlympiaRAM(16, shape=(15, 9), training_level='one_v_one', seeds=1).output()
+        np.testing.assert_allclose(agent.q_values(states), agent.model.predict(states, verbose=0), rtol=1e-5,
+                                   atol=1e-5)
+        np.testing.assert_allclose(agent._numpy_model.predict(states[0]), agent.q_values(states[:1])[0])
+        state = env.reset()
+        for _ in range(20):
+            next_state, rewards, done, _ = env.step(*np.random.default_rng(0).integers(0, 17, size=2))
+            agent.remember(state, 0, rewards[0], next_state, done)
+            state = next_state
+        agent.replay(10)  # changes the Keras weights, the NumPy copy has to follow
+        np.testing.assert_allclose(agent.q_values(states), agent.model.predict(states, verbose=0), rtol=1e-5,
+                                   atol=1e-5)
+
+    def test_target_network(self):
+        env = OlympiaRAM(shape=(15, 9), seed=0)
+        agent = env.get_agents()[0]
+        agent.target_sync_every = 3
+        fill_memory(env, agent, 20, seed=0)
+        states = agent.memory.states[:5]
+        target = agent.target_q_values(states)  # the target starts as a copy of the online network
+        np.testing.assert_allclose(target, agent.q_values(states), rtol=1e-6)
+        agent.replay(10)
+        agent.replay(10)
+        np.testing.assert_array_equal(agent.target_q_values(states), target)
+        self.assertFalse(np.allclose(agent.q_values(states), target, rtol=1e-6, atol=1e-6))
+        agent.replay(10)
+        np.testing.assert_allclose(agent.target_q_values(states), agent.q_values(states), rtol=1e-6)
+
+    def test_fill_memory_keeps_every_state(self):
+        def moves(env):
+            agent = env.get_agents()[0]
+            fill_memory(env, agent, 30, seed=0)
+            states, _, _, next_states, _ = agent.memory.transitions(np.arange(30))
+            return (states != next_states).reshape(30, -1).any(axis=1)
+
+        expected = moves(OlympiaRAM(shape=(15, 9), seed=0))  # returns a new array for every observation
+        self.assertTrue(expected.any())
+        # both return views of a buffer the next step overwrites
+        np.testing.assert_array_equal(moves(OlympiaRGB(shape=(15, 9), seed=0)), expected)
+        np.testing.assert_array_equal(moves(OlympiaRAM(shape=(15, 9), seed=0, observation='normalized')), expected)
+
+
+class TestCurriculum(unittest.TestCase):
+    def test_transfer_keeps_what_was_learned(self):
+        source = OlympiaRAM(shape=(15, 9), training_level='one_player', seed=0)
+        agent = source.get_agents()[0]
+        agent.epsilon = 0.3
+        fill_memory(source, agent, 30, seed=0)
+        agent.replay(10)
+        target = OlympiaRAM(shape=(15, 9), training_level='one_v_one', seed=1)
+        transfer_agents(source, target)
+        carried = target.get_agents()[0]
+        self.assertEqual(carried.epsilon, agent.epsilon)
+        self.assertEqual(len(carried.memory), 30)
+        # the ball and player 0 keep their columns, the new opponent's columns start empty
+        np.testing.assert_array_equal(carried.memory.states[:30, :4], agent.memory.states[:30])
+        np.testing.assert_array_equal(carried.memory.states[:30, 4:], 0)
+        states = VectorOlympiaRAM(8, shape=(15, 9), training_level='one_v_one', seeds=2).output()
+        np.testing.assert_allclose(carried.q_values(states), agent.q_values(states[:, :4]), rtol=1e-5, atol=1e-5)
+
+    def test_runs_every_level(self):
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            curriculum = Curriculum(levels=['one_player', 'one_v_one'], window=1, max_episodes=2,
+                                    checkpoint_dir=checkpoint_dir, seed=0, max_timesteps=5)
+            with mock.patch('builtins.print'):
+                history = curriculum.run()
+            self.assertEqual([summary['level'] for summary in history], ['one_player', 'one_v_one'])
+            self.assertTrue(all(1 <= summary['episodes'] <= 2 for summary in history))
+            self.assertEqual(len(glob.glob(os.path.join(checkpoint_dir, '*.ckpt'))), 2)
+
+    def test_resumes_every_level(self):
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            def run(max_episodes, **train_kwargs):
+                curriculum = Curriculum(levels=['one_player', 'one_v_one'], max_episodes=max_episodes,
+                                        checkpoint_dir=checkpoint_dir, seed=0, max_timesteps=20, checkpoint_every=2,
+                                        **train_kwargs)
+                with mock.patch('builtins.print') as printed:
+                    history = curriculum.run()
+                # one FieldEnv.train per level
+                self.assertEqual(sum('Total training time' in str(call) for call in printed.call_args_list), 2)
+                return history
+
+            run(3, save_models=True)
+            for level in ['one_player', 'one_v_one']:
+                header, _ = read_checkpoint(os.path.join(checkpoint_dir, 'RAM_{}.ckpt'.format(level)))
+                self.assertEqual(header['episode'], 3)
+            history = run(5, save_models=True, load_saved=True)
+            self.assertEqual([summary['episodes'] for summary in history], [5, 5])
+            self.assertTrue(all(summary['steps'] > 0 for summary in history))
+            resumed = run(5, load_saved=True)  # nothing is left to train, the summaries come from the checkpoints
+            self.assertEqual(resumed, history)
+
+    def test_restores_levels_that_advanced(self):
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            def run(**train_kwargs):
+                # every level advances after its first episode
+                curriculum = Curriculum(levels=['one_player', 'one_v_one'], win_rate=None, episode_length=20,
+                                        window=1, max_episodes=5, checkpoint_dir=checkpoint_dir, seed=0,
+                                        max_timesteps=20, **train_kwargs)
+                with mock.patch('builtins.print') as printed:
+                    history = curriculum.run()
+                return history, sum('Total training time' in str(call) for call in printed.call_args_list)
+
+            history, trainings = run(save_models=True)
+            self.assertEqual((trainings, [summary['episodes'] for summary in history]), (2, [1, 1]))
+            self.assertTrue(all(summary['advanced'] for summary in history))
+            resumed, trainings = run(save_models=True, load_saved=True)
+            self.assertEqual((trainings, resumed), (0, history))
+
+
+class TestLeague(unittest.TestCase):
+    def test_mirror_swaps_the_sides(self):
+        ram = OlympiaRAM(training_level='two_v_two', seed=0, memory_size=1, frame_stack=2)
+        codes = OlympiaRGB(training_level='two_v_two', seed=0, memory_size=1, observation='codes')
+        rgb = OlympiaRGB(training_level='two_v_two', seed=0, memory_size=1)
+        for actions in np.random.default_rng(0).integers(0, 17, size=(50, 4)):
+            states = [env.step(*actions)[0] for env in (ram, codes, rgb)]
+        mirrored = [Mirror(env)(state) for env, state in zip((ram, codes, rgb), states)]
+        for env, state, mirror in zip((ram, codes, rgb), states, mirrored):
+            np.testing.assert_array_equal(Mirror(env)(mirror), state)
+        np.testing.assert_array_equal(COLORS[mirrored[1][0, ..., 0]], mirrored[2][0])
+        # the team the mirrored state is shown to comes first and stands on the cells of team 0
+        positions = mirrored[0][0, 10:].reshape(-1, 2)
+        self.assertEqual([mirrored[1][0, x, y, 0] & 12 for x, y in positions[1:]], [4, 4, 8, 8])
+        self.assertEqual(sorted(MIRRORED_ACTIONS[MIRRORED_ACTIONS]), list(range(17)))
+
+    def test_only_the_learning_team_trains(self):
+        env = OlympiaRAM(shape=(15, 9), training_level='one_v_one', seed=0, memory_size=100)
+        league = League(env, snapshot_every=2, seed=0)
+        learner, opponent = env.get_agents()
+        with mock.patch('builtins.print') as printed:
+            scores = league.train(4, batch_size=4, max_timesteps=20)
+        self.assertEqual(sum('Total training time' in str(call) for call in printed.call_args_list), 1)
+        self.assertEqual(len(scores), 4)
+        self.assertEqual([game['score'] for game in league.history], scores)
+        with self.assertRaises(ValueError):
+            league.train(1, save_models=True)
+        self.assertEqual((len(opponent.memory), opponent._replays), (0, 0))
+        self.assertGreater(learner._replays, 0)
+        self.assertEqual(len(league.snapshots), 3)
+        for weights, snapshot_weights in zip(opponent.model.get_weights(), league.snapshots[-1]['weights'][0]):
+            self.assertFalse(np.array_equal(weights, snapshot_weights))  # the opponent played an older snapshot
+        total = league.rating + sum(snapshot['rating'] for snapshot in league.snapshots)
+        scores = league.evaluate(games=2, n_workers=0, max_timesteps=20)
+        self.assertEqual(scores.shape, (3, 3))
+        self.assertAlmostEqual(league.rating + sum(snapshot['rating'] for snapshot in league.snapshots), total)
+
+
+class TestCheckpoint(unittest.TestCase):
+    def test_resumes_exactly(self):
+        kwargs = {'batch_size': 5, 'max_timesteps': 15, 'prioritized_replay': True, 'n_step': 2,
+                  'target_sync_every': 4}
+        with tempfile.TemporaryDirectory() as tmp_dir, mock.patch('builtins.print'):
+            path = os.path.join(tmp_dir, 'run.ckpt')
+            uninterrupted = OlympiaRAM(shape=(15, 9), training_level='one_v_one', seed=0, memory_size=40)
+            stopped = OlympiaRAM(shape=(15, 9), training_level='one_v_one', seed=0, memory_size=40)
+            for agent, other in zip(stopped.get_agents(), uninterrupted.get_agents()):
+                agent.set_weights(other.model.get_weights())  # Keras initializes the weights unseeded
+            uninterrupted.train(4, **kwargs)
+            stopped.train(2, save_models=True, checkpoint_path=path, **kwargs)
+            header, arrays = read_checkpoint(path)
+            self.assertEqual(header['episode'], 2)
+            self.assertTrue(all(isinstance(array, np.memmap) for array in arrays if array.size))
+            resumed = OlympiaRAM(shape=(15, 9), training_level='one_v_one', seed=5, memory_size=40)
+            times, _ = resumed.train(4, load_saved=True, checkpoint_path=path, **kwargs)
+            self.assertEqual(len(times), 2)
+        for expected, agent in zip(uninterrupted.get_agents(), resumed.get_agents()):
+            self.assertEqual(agent.epsilon, expected.epsilon)
+            np.testing.assert_array_equal(agent.memory.states, expected.memory.states)
+            # float32 matmuls can round differently in the last bit depending on how arrays are aligned
+            np.testing.assert_allclose(agent.memory._tree._tree, expected.memory._tree._tree, rtol=1e-6)
+            for weights, expected_weights in zip(agent.model.get_weights(), expected.model.get_weights()):
+                np.testing.assert_allclose(weights, expected_weights, rtol=1e-5, atol=1e-7)
+
+    def test_checkpointer_copies_the_new_slots(self):
+        for share_frames in [False, True]:
+            env = OlympiaRAM(shape=(15, 9), training_level='one_v_one', seed=0, memory_size=50,
+                             share_frames=share_frames)
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                path = os.path.join(tmp_dir, 'run.ckpt')
+                checkpointer = Checkpointer(env, path)
+                # a few new slots, none, wrapping around the ring and more than it holds
+                for seed, steps in enumerate([30, 10, 0, 25, 60]):
+                    for agent in env.get_agents():
+                        fill_memory(env, agent, steps, seed=seed)
+                    checkpointer.save()
+                    checkpointer.wait()
+                    _, expected = snapshot(env)
+                    _, arrays = read_checkpoint(path)
+                    self.assertEqual(len(arrays), len(expected))
+                    for array, expected_array in zip(arrays, expected):
+                        np.testing.assert_array_equal(array, expected_array)
+                    del arrays  # the memory maps keep the file open
+
+
+class TestOfflineDataset(unittest.TestCase):
+    def test_matches_the_replay_memories(self):
+        for env_class, kwargs in [(OlympiaRAM, {}), (OlympiaRGB, {'observation': 'egocentric'})]:
+            env = env_class(shape=(15, 9), training_level='one_v_one', seed=0, memory_size=1000, **kwargs)
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                path = os.path.join(tmp_dir, 'dataset')
+                writer = DatasetWriter(path, env, chunk_size=64)
+                # episodes cut short by max_timesteps, recorded by two calls of train, without replays
+                env.train(2, batch_size=10 ** 6, max_timesteps=60, policy=RandomPolicy(env.get_agents()),
+                          dataset=writer)
+                env.train(2, batch_size=10 ** 6, max_timesteps=60, policy=RandomPolicy(env.get_agents()),
+                          dataset=DatasetWriter(path, env))
+                dataset = OfflineDataset(path)
+                self.assertEqual(len(dataset.chunks), 4)
+                for i, agent in enumerate(env.get_agents()):
+                    memory = dataset.memory(i)
+                    self.assertEqual(len(memory), len(agent.memory))
+                    indices = np.arange(len(memory))
+                    for offline, online in zip(memory.n_step_transitions(indices, 3, 0.9),
+                                               agent.memory.n_step_transitions(indices, 3, 0.9)):
+                        np.testing.assert_array_equal(offline, online)
+                online_memory = env.get_agents()[0].memory
+                train_offline(env, dataset, updates=2, batch_size=8, agents=[0])
+                self.assertIs(env.get_agents()[0].memory, online_memory)
+                self.assertEqual(env.get_agents()[0]._replays, 2)
+                del dataset
+
+
+class TestReplayMemory(unittest.TestCase):
+    def test_shared_frames_match_separate_frames(self):
+        env = OlympiaRGB(shape=(15, 9), seed=0)
+        separate = ReplayMemory(50, env.state_size, np.uint8)
+        shared = ReplayMemory(50, env.state_size, np.uint8, share_frames=True)
+        state = env.reset().copy()
+        start = True
+        for t, action in enumerate(np.random.default_rng(0).integers(0, 17, size=200)):
+            next_state, rewards, done, _ = env.step(action)
+            separate.append(state, action, rewards[0], next_state, done, start=start)
+            shared.append(state, action, rewards[0], next_state, done, start=start)
+            start = done or t % 40 == 39  # episodes are cut short every 40 steps
+            state = (env.reset() if start else next_state).copy()
+        self.assertLess(shared.nbytes, 0.6 * separate.nbytes)
+        # the last step of an episode cut short keeps its next frame in a slot of its own, only the newest
+        # transition has no next frame yet
+        order = (shared._index + np.arange(50)) % 50
+        valid = order[shared._valid[order]]
+        self.assertEqual(shared._valid.sum(), 50 - 2)
+        self.assertFalse(shared._valid[(shared._index - 1) % 50])
+        order = (separate._index + np.arange(50)) % 50
+        for got, expected in zip(shared.transitions(valid), separate.transitions(order[-len(valid) - 1:-1])):
+            np.testing.assert_array_equal(got, expected)
+        self.assertEqual(shared.sample(32)[0].shape, (32, *env.state_size))
+
+    def test_n_step_returns(self):
+        # episodes of 4 steps ending in a goal, 3 steps cut short and 2 steps still running
+        episodes = [(4, True), (3, False), (2, False)]
+        for share_frames in [False, True]:
+            memory = ReplayMemory(16, (2,), np.int16, share_frames=share_frames)
+            for e, (length, ends) in enumerate(episodes):
+                for t in range(length):
+                    memory.append(np.array([[e, t]]), 0, 10 * e + t, np.array([[e, t + 1]]), ends and t == length - 1,
+                                  start=t == 0)
+            # the next state of the cut short episode takes slot 7 when frames are shared
+            indices = [0, 1, 2, 3, 4, 5, 6, 8] if share_frames else np.arange(8)
+            _, _, returns, next_states, dones, discounts = memory.n_step_transitions(np.array(indices), 3, 0.5)
+            expected = [(0 + .5 + .25 * 2, .125, [0, 3]), (1 + .5 * 2 + .25 * 3, .125, None),
+                        (2 + .5 * 3, .25, None), (3, .5, None), (10 + .5 * 11 + .25 * 12, .125, [1, 3]),
+                        (11 + .5 * 12, .25, [1, 3]), (12, .5, [1, 3])]
+            if share_frames:
+                # the frame after the newest step is never stored, windows stop before reaching it
+                expected.append((20, .5, [2, 1]))
+            else:
+                expected.append((20 + .5 * 21, .25, [2, 2]))
+            expected_returns, expected_discounts, expected_next_states = zip(*expected)
+            np.testing.assert_allclose(returns, expected_returns)
+            np.testing.assert_allclose(discounts, expected_discounts)
+            np.testing.assert_array_equal(dones[:4], [False, True, True, True])
+            bootstrapped = ~dones  # the next state of a window ending in a goal is never looked at
+            np.testing.assert_array_equal(next_states[bootstrapped],
+                                          [state for state in expected_next_states if state is not None])
+            # two episodes with the same observations are still two episodes
+            memory = ReplayMemory(4, (2,), np.int16, share_frames=share_frames)
+            for _ in range(2):
+                memory.append(np.array([[0, 0]]), 0, 1, np.array([[0, 0]]), False, start=True)
+            self.assertFalse(memory._continues[0])
+            self.assertEqual(memory.n_step_transitions(np.array([0]), 3, 0.5)[2][0], 1)
+
+    def test_extend_matches_append(self):
+        rng = np.random.default_rng(0)
+        n = 60
+        states = rng.integers(0, 100, size=(n + 1, 2)).astype(np.int16)
+        dones = rng.random(n) < 0.1
+        starts = np.roll(dones, 1) | (rng.random(n) < 0.1)  # some episodes are cut short
+        starts[0] = True
+        next_states = states[1:].copy()
+        for memory_class in [ReplayMemory, PrioritizedReplayMemory]:
+            for share_frames in [False, True]:
+                appended = memory_class(32, (2,), np.int16, share_frames=share_frames)
+                extended = memory_class(32, (2,), np.int16, share_frames=share_frames)
+                for k in range(n):
+                    appended.append(states[k:k + 1], k % 17, k, next_states[k:k + 1], dones[k], start=starts[k])
+                # blocks of different sizes, the last one larger than the memory
+                for block in np.split(np.arange(n), [1, 7, 20, 21]):
+                    extended.extend(states[block], block % 17, block, next_states[block], dones[block], starts[block])
+                for name, value in vars(appended).items():
+                    if isinstance(value, np.ndarray):
+                        np.testing.assert_array_equal(getattr(extended, name), value)
+                self.assertEqual((extended._index, extended._size), (appended._index, appended._size))
+                if memory_class is PrioritizedReplayMemory:
+                    np.testing.assert_array_equal(extended._tree._tree, appended._tree._tree)
+
+
+class TestPrioritizedReplay(unittest.TestCase):
+    def test_sum_tree(self):
+        tree = SumTree(5)
+        tree.update(np.arange(5), [1., 2., 3., 4., 0.])
+        self.assertEqual(tree.total, 10.)
+        np.testing.assert_array_equal(tree.find([0., 0.5, 1., 2.9, 3., 9.9]), [0, 0, 1, 1, 2, 3])
+        tree.update([1, 1, 4], [0., 0., 5.])
+        self.assertEqual(tree.total, 13.)
+        np.testing.assert_array_equal(tree.find([0.5, 1.5, 12.]), [0, 2, 4])
+
+    def test_sampling_follows_td_errors(self):
+        memory = PrioritizedReplayMemory(100, (2,), np.int16, alpha=1.)
+        for i in range(100):
+            memory.append(np.array([[i, i]]), 0, -1, np.array([[i, i]]), False)
+        memory.update_priorities(np.arange(100), np.where(np.arange(100) == 7, 100., 0.))
+        memory.np_random = np.random.default_rng(0)
+        indices = memory.sample_indices(1000)
+        self.assertGreater((indices == 7).mean(), 0.9)
+        weights = memory.importance_weights(indices)
+        self.assertEqual(weights.max(), 1.)
+        self.assertLess(weights[indices == 7].max(), weights[indices != 7].min())
+
+    def test_never_samples_empty_slots(self):
+        for share_frames in [False, True]:
+            memory = PrioritizedReplayMemory(100, (2,), np.int16, share_frames=share_frames)
+            for i in range(10):
+                memory.append(np.array([[i, i]]), 0, -1, np.array([[i + 1, i + 1]]), False)
+            # draws that rounding carries up to the total priority
+            memory.np_random = mock.Mock(random=np.ones)
+            indices = memory.sample_indices(4)
+            self.assertEqual(indices[-1], 8 if share_frames else 9)  # the newest shared frame awaits its next state
+            self.assertTrue(np.isfinite(memory.importance_weights(indices)).all())
+
+    def test_replay_weights_use_sampling_probabilities(self):
+        env = OlympiaRAM(shape=(15, 9), seed=0)
+        agent = env.get_agents()[0]
+        agent.prioritize_replay()
+        fill_memory(env, agent, 30, seed=0)
+        memory = agent.memory
+        memory.update_priorities(np.arange(len(memory)), np.arange(len(memory), dtype=np.float64))
+        memory.np_random = np.random.default_rng(0)
+        indices = memory.sample_indices(10)
+        beta = memory.beta
+        expected = memory.importance_weights(indices)
+        memory.np_random = np.random.default_rng(0)
+        memory.beta -= memory.beta_increment  # sampled again, with the beta of the first draw
+        with mock.patch.object(agent.model, 'train_on_batch') as train_on_batch:
+            agent.replay(10)
+        self.assertEqual(memory.beta, beta)
+        np.testing.assert_allclose(train_on_batch.call_args[1]['sample_weight'], expected)
+        self.assertFalse(np.allclose(memory.importance_weights(indices), expected))  # the priorities changed
+
+
+class TestParallelTrainer(unittest.TestCase):
+    def test_collects_and_shuts_down(self):
+        env = OlympiaRAM(shape=(15, 9), training_level='one_v_one', seed=0)
+        with ParallelTrainer(env, n_workers=2, slots=64, seed=1) as trainer:
+            trainer.train(200, learn=False)
+            replays = env.get_agents()[0]._replays
+            collected = len(env.get_agents()[0].memory)
+            trainer.train(100, batch_size=4, replay_ratio=0.5)
+            collected = len(env.get_agents()[0].memory) - collected
+            # half an update per transition, however many arrived in each round
+            self.assertLessEqual(abs(env.get_agents()[0]._replays - replays - collected / 2), 1)
+            workers = trainer._workers
+            names = [buffer.name for buffer in trainer._buffers]
+        for agent in env.get_agents():
+            self.assertGreaterEqual(len(agent.memory), 200)
+        self.assertFalse(any(worker.is_alive() for worker in workers))
+        for name in names:
+            with self.assertRaises(FileNotFoundError):
+                shared_memory.SharedMemory(name=name)
+
+
 if __name__ == '__main__':
     unittest.main()